@@ -1,105 +1,497 @@
 import os
 import json
+import re
+import threading
 import time
-import torch
-import cv2
-import requests
-import google.generativeai as genai
-from flask import Flask, request, render_template, session, redirect, url_for, Response, jsonify
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from flask import Flask, request, render_template, session, redirect, url_for, Response, jsonify, stream_with_context, g
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit, join_room
-from torchvision import transforms
-from PIL import Image
 from dotenv import load_dotenv
-import torch.nn as nn
-import gdown 
-url="https://drive.google.com/uc?id=1w0mSk2-OZHFrMDYgSa2JSesF3JXHh0Jx"
-output=os.path.join("model", "skin_disease_model.pth")
-os.makedirs(os.path.dirname(output), exist_ok=True)
-gdown.download(url, output, quiet=False)
+from artifacts import Artifact, fetch_model
+import lazy
+from lazy import LazyResource
+from llm_cache import LLMCache
+from live_inference import LiveInferenceHub
+from llm_client import FakeBackend, GeminiBackend, LLMClient
+import metrics
+from image_hash import dhash, frame_dhash, thumbnail, thumbnail_mse
+from places_client import PlacesClient
+from prefetch import SpeculativePrefetcher, normalize_disease
+import retrieval
+from preprocessing import IMAGE_EXTENSIONS, MAX_UPLOAD_BYTES, ImagePreprocessor, ImageRejected, ImageTooLarge
+from result_cache import PerceptualCache
+from signaling import FanoutStats, create_client_manager
+from session_store import MemorySessionStore, ServerSessionInterface, SQLiteSessionStore, TieredSessionStore
+
+# torch, OpenCV, the Gemini SDK, the model and the webcam are loaded on first use
+# (or by warm_up(), see WARM_UP below) so importing this module stays cheap;
+# `python -m benchmarks.import_profile` reports where import time goes.
 
 
 # ------------------- Setup -------------------
 load_dotenv()
 
+# ------------------- Metrics -------------------
+# Latency / error / in-flight series per pipeline stage, scraped from /metrics.
+STAGES = metrics.StageMetrics("adermis_stage")
+HTTP_SECONDS = metrics.histogram("adermis_http_request_seconds", "Time to produce a response (streamed bodies excluded).",
+                                 ["endpoint", "method", "status"])
+HTTP_IN_FLIGHT = metrics.gauge("adermis_http_requests_in_flight", "Requests currently being handled.")
+CNN_FORWARD_SECONDS = metrics.histogram("adermis_cnn_forward_seconds", "Batched CNN forward pass latency.")
+CNN_BATCH_SIZE = metrics.histogram("adermis_cnn_batch_size", "Images per CNN forward pass.",
+                                   buckets=(1, 2, 4, 8, 16, 32, 64))
+CNN_QUEUE_DEPTH = metrics.gauge("adermis_cnn_queue_depth", "Images waiting for a CNN batch.")
+MODEL_LOAD_SECONDS = metrics.gauge("adermis_model_load_seconds", "Time taken to fetch and load the CNN weights.", ["phase"])
+PREDICTION_CACHE_LOOKUPS = metrics.counter("adermis_prediction_cache_lookups_total",
+                                           "Prediction cache lookups by outcome.", ["result"])
+SIGNAL_FANOUT = metrics.histogram("adermis_socketio_fanout", "Local recipients per delivered Socket.IO emit.",
+                                  buckets=(0, 1, 2, 4, 8, 16, 32, 64, 128))
+SIGNAL_MESSAGES = metrics.counter("adermis_socketio_messages_total",
+                                  "Socket.IO emits published and delivered by this worker.", ["direction"])
+RESOURCE_LOAD_SECONDS = metrics.gauge("adermis_resource_load_seconds", "Time taken to build a lazily loaded resource.",
+                                      ["resource"])
+
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}})
 app.secret_key = os.getenv("SECRET_KEY", "supersecretkey")  # For session management
+# Whole request body, so a batch upload or archive is refused (413) before it is spooled.
+app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_REQUEST_BYTES", str(200 * 1024 * 1024)))
+
+# SESSION_BACKEND: "sqlite" (default) keeps sessions in a file shared by all workers,
+# behind a per-process LRU; "memory" is the LRU alone (single process); "cookie" is
+# Flask's signed cookie. Server-side sessions put only an opaque id in the cookie.
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite")
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(24 * 3600)))
+if SESSION_BACKEND != "cookie":
+    session_store = MemorySessionStore(SESSION_TTL, max_entries=int(os.getenv("SESSION_MAX_ENTRIES", "10000")))
+    if SESSION_BACKEND == "sqlite":
+        session_store = TieredSessionStore(session_store, SQLiteSessionStore(
+            os.getenv("SESSION_PATH", os.path.join("cache", "sessions.sqlite3")), SESSION_TTL))
+    app.session_interface = ServerSessionInterface(session_store)
+
+# SIGNALING_QUEUE relays room events (join/signal) between workers and nodes: unset
+# keeps rooms in this process; local://host:port uses `python signaling.py broker`
+# (both sides need the same SIGNALING_AUTHKEY); redis:// and amqp:// URLs use
+# python-socketio's Redis/Kombu managers.
+signaling_fanout = FanoutStats(on_deliver=lambda recipients: SIGNAL_FANOUT.labels().observe(recipients))
+SIGNAL_MESSAGES.labels("published").set_function(lambda: signaling_fanout.published)
+SIGNAL_MESSAGES.labels("delivered").set_function(lambda: signaling_fanout.recipients)
+socketio = SocketIO(app, cors_allowed_origins="*",
+                    client_manager=create_client_manager(os.getenv("SIGNALING_QUEUE"), signaling_fanout))
 
-socketio = SocketIO(app, cors_allowed_origins="*")
+# LLM_BACKEND=fake answers locally (tests, benchmarks) instead of calling Gemini.
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+GEMINI_MODEL = "gemini-2.0-flash"
+if LLM_BACKEND != "fake":
+    # Load Google Gemini API Key (checked at boot; the SDK itself is imported on first use)
+    GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
+    if not GEMINI_API_KEY:
+        raise ValueError("❌ Google Gemini API Key is missing! Set 'GOOGLE_API_KEY' in your .env file.")
+
+# Gemini responses are cached on local disk (shared by all workers) keyed on
+# model + normalized prompt. LLM_CACHE=0 turns the cache off.
+llm_cache = LLMCache(
+    os.getenv("LLM_CACHE_PATH", os.path.join("cache", "llm_cache.sqlite3")),
+    ttl_seconds=float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600))),
+    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000")),
+) if os.getenv("LLM_CACHE", "1") == "1" else None
+
+# Every Gemini call shares one client: per-call deadline, concurrency cap and
+# token-bucket rate limit, jittered retries within a retry budget, optional hedging.
+def build_llm_client():
+    if LLM_BACKEND == "fake":
+        backend = FakeBackend(latency=float(os.getenv("LLM_FAKE_LATENCY", "0")))
+    else:
+        backend = GeminiBackend(GEMINI_API_KEY)
+    return LLMClient(
+        backend,
+        cache=llm_cache,
+        default_model=GEMINI_MODEL,
+        timeout=float(os.getenv("LLM_TIMEOUT", "30")),
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+        rate_per_sec=float(os.getenv("LLM_RATE_PER_SEC", "5")),
+        burst=int(os.getenv("LLM_BURST", "10")),
+        max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "3")),
+        hedge_after=float(os.getenv("LLM_HEDGE_AFTER")) if os.getenv("LLM_HEDGE_AFTER") else None,
+        stream_chunk_timeout=float(os.getenv("LLM_STREAM_CHUNK_TIMEOUT", "10")),
+    )
 
-# Load Google Gemini API Key
-GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("❌ Google Gemini API Key is missing! Set 'GOOGLE_API_KEY' in your .env file.")
-genai.configure(api_key=GEMINI_API_KEY)
+llm_client = LazyResource("llm_client", build_llm_client)
 
 # Google Maps API key for clinics lookup
 MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
+places_client = PlacesClient(
+    MAPS_API_KEY,
+    base_url=os.getenv("MAPS_API_BASE", "https://maps.googleapis.com/maps/api"),
+    max_workers=int(os.getenv("MAPS_MAX_WORKERS", "8")),
+    cache_ttl=float(os.getenv("MAPS_CACHE_TTL", "3600")),
+)
 
-# ------------------- CNN Model Definition -------------------
-class SkinDiseaseCNN(nn.Module):
-    def __init__(self, num_classes=11):
-        super(SkinDiseaseCNN, self).__init__()
-        self.conv_layers = nn.Sequential(
-            nn.Conv2d(3, 32, kernel_size=3, stride=1, padding=1),
-            nn.ReLU(),
-            nn.MaxPool2d(kernel_size=2, stride=2),
-            nn.Conv2d(32, 64, kernel_size=3, stride=1, padding=1),
-            nn.ReLU(),
-            nn.MaxPool2d(kernel_size=2, stride=2),
-            nn.Conv2d(64, 128, kernel_size=3, stride=1, padding=1),
-            nn.ReLU(),
-            nn.MaxPool2d(kernel_size=2, stride=2)
-        )
-        self.fc_layers = nn.Sequential(
-            nn.Flatten(),
-            nn.Linear(128 * 28 * 28, 512),
-            nn.ReLU(),
-            nn.Dropout(0.5),
-            nn.Linear(512, num_classes)
-        )
+# ------------------- CNN Model -------------------
+# MODEL_BACKEND selects fp32 (default), bf16 or int8 inference; see quantize_model.py.
+# MODEL_WEIGHTS_MODE=preload|mmap shares the weights across gunicorn workers; see shared_weights.py.
+# The weights come from artifacts.fetch_model (MODEL_URL, MODEL_SHA256, MODEL_OFFLINE).
+MODEL_WEIGHTS_MODE = os.getenv("MODEL_WEIGHTS_MODE", "private")
+CNNModel = namedtuple("CNNModel", ["model", "device", "artifact"])
+
+def load_cnn():
+    import torch
+
+    if INFERENCE_POOL:
+        # The replicas hold the weights; this process only needs their checksum.
+        pool = inference_batcher.get()
+        return CNNModel(None, torch.device("cpu"), Artifact(None, pool.model_sha256))
 
-    def forward(self, x):
-        x = self.conv_layers(x)
-        x = self.fc_layers(x)
-        return x
+    from skin_model import load_model
+
+    fetch_started = time.perf_counter()
+    artifact = fetch_model()
+    MODEL_LOAD_SECONDS.labels("fetch").set(time.perf_counter() - fetch_started)
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    load_started = time.perf_counter()
+    model = load_model(
+        artifact.path,
+        device,
+        backend=os.getenv("MODEL_BACKEND", "fp32"),
+        num_classes=11,
+        weights_mode=MODEL_WEIGHTS_MODE,
+    )
+    MODEL_LOAD_SECONDS.labels("load").set(time.perf_counter() - load_started)
+    return CNNModel(model, device, artifact)
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model = SkinDiseaseCNN(num_classes=11)
-model_path = os.path.join("model", "skin_disease_model.pth")
-model.load_state_dict(torch.load(model_path, map_location=device))
-model.to(device)
-model.eval()
+cnn = LazyResource("cnn", load_cnn)
 
 # ------------------- Image Preprocessing -------------------
+image_preprocessor = ImagePreprocessor()
+
 def preprocess_image(image):
-    transform = transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])
-    ])
-    img = Image.open(image).convert("RGB")
-    return transform(img).unsqueeze(0).to(device)
-
-# ------------------- Class Labels -------------------
-CLASS_NAMES = [
-    "Unknown", "Eczema", "Warts", "Melanoma", "Atopic Dermatitis", 
-    "BCC", "Melanocytic Nevi", "BKL", "Psoriasis", "Seborrheic Keratoses", "Tinea"
-]
+    device = cnn.get().device
+    with STAGES.track("decode"):
+        if isinstance(image, np.ndarray):
+            # In-memory OpenCV frame (BGR); no temp file.
+            return image_preprocessor.from_array(image, bgr=True).to(device)
+        return image_preprocessor(image).to(device)
+
+# ------------------- Prediction Cache -------------------
+# A re-upload of a photo reuses the stored prediction when the dHash of the decoded
+# 224x224 image matches AND a 32x32 thumbnail is within PREDICTION_CACHE_MAX_MSE of
+# the stored one, so a hash collision between two patients' photos is never served.
+# PREDICTION_CACHE_DISTANCE>0 (opt-in) also matches re-compressed/resized copies.
+# PREDICTION_CACHE_SIZE=0 turns the cache off.
+PREDICTION_CACHE_MAX_MSE = float(os.getenv("PREDICTION_CACHE_MAX_MSE", "2.0"))
+prediction_cache = PerceptualCache(
+    max_entries=int(os.getenv("PREDICTION_CACHE_SIZE", "1024")),
+    max_distance=int(os.getenv("PREDICTION_CACHE_DISTANCE", "0")),
+    same_image=lambda stored, new: thumbnail_mse(stored, new) <= PREDICTION_CACHE_MAX_MSE,
+)
+for _result in ("hits", "near_hits", "misses"):
+    PREDICTION_CACHE_LOOKUPS.labels(_result).set_function(lambda k=_result: getattr(prediction_cache, k))
+
+# ------------------- Batched Inference Queue -------------------
+# Concurrent requests share forward passes. Larger batches / longer waits favour
+# throughput, smaller ones favour p99 latency (see /api/inference/stats).
+def record_cnn_batch(batch_size, seconds, error):
+    CNN_FORWARD_SECONDS.labels().observe(seconds)
+    CNN_BATCH_SIZE.labels().observe(batch_size)
+
+# INFERENCE_POOL=<socket dir> sends images to the core-pinned model replicas started
+# by `python inference_pool.py` instead of running the model in this worker.
+INFERENCE_POOL = os.getenv("INFERENCE_POOL")
+
+def build_inference_batcher():
+    if INFERENCE_POOL:
+        from inference_pool import InferencePoolClient
+
+        pool = InferencePoolClient(
+            INFERENCE_POOL,
+            slots=int(os.getenv("INFERENCE_POOL_SLOTS", "16")),
+            timeout=float(os.getenv("INFERENCE_POOL_TIMEOUT", "30")),
+        )
+        CNN_QUEUE_DEPTH.labels().set_function(pool.queue_depth)
+        return pool
+
+    from batching import InferenceBatcher
+    from skin_model import CLASS_NAMES
+
+    batcher = InferenceBatcher(
+        cnn.get().model,
+        CLASS_NAMES,
+        max_batch_size=int(os.getenv("INFERENCE_MAX_BATCH", "8")),
+        max_wait_ms=float(os.getenv("INFERENCE_MAX_WAIT_MS", "5")),
+        on_batch=record_cnn_batch,
+    )
+    CNN_QUEUE_DEPTH.labels().set_function(batcher.queue_depth)
+    return batcher
+
+inference_batcher = LazyResource("inference_batcher", build_inference_batcher)
+
+# ------------------- Per-Client Live AR -------------------
+# Browsers stream downscaled JPEG frames over Socket.IO; only the newest frame per
+# client is kept and one worker scores every client's frame together.
+LIVE_MAX_FRAME_BYTES = int(os.getenv("LIVE_MAX_FRAME_BYTES", str(512 * 1024)))
+
+def build_live_hub():
+    return LiveInferenceHub(
+        preprocess_image,
+        inference_batcher.get(),
+        max_clients=int(os.getenv("LIVE_MAX_CLIENTS", "256")),
+        # Frames within LIVE_CHANGE_THRESHOLD dHash bits of the last scored one are not re-scored.
+        change_threshold=int(os.getenv("LIVE_CHANGE_THRESHOLD", "5")),
+        refresh_seconds=float(os.getenv("LIVE_REFRESH_SECONDS", "10")),
+        ema_alpha=float(os.getenv("LIVE_EMA_ALPHA", "0.4")),
+    )
+
+live_hub = LazyResource("live_hub", build_live_hub)
+
+# ------------------- Server Webcam -------------------
+# Only the single-user /live_ar page uses it; never opened by warm_up().
+def open_camera():
+    import cv2
+    return cv2.VideoCapture(0)
+
+camera = LazyResource("camera", open_camera, warm=False)
+
+# ------------------- Warm-Up -------------------
+# WARM_UP=background (default) loads the model and LLM client in a thread of each
+# serving process: started by gunicorn's post_worker_init hook (gunicorn.conf.py),
+# or by the first request, so importing the app (CLI commands, scripts, a
+# preloading gunicorn master) never starts it. "import" is the explicit opt-in to
+# load them before the import returns (implied by MODEL_WEIGHTS_MODE=preload, so
+# the preloaded master shares them); "lazy" leaves each to the first request that
+# needs it.
+WARM_UP = "import" if MODEL_WEIGHTS_MODE == "preload" else os.getenv("WARM_UP", "background")
+
+def warm_up():
+    """Load every warmable resource now; returns seconds per resource."""
+    return lazy.warm_up()
+
+_warm_up_pid = None
+_warm_up_lock = threading.Lock()
+
+def start_background_warm_up():
+    """Start the WARM_UP=background thread, once per process; a no-op for other modes."""
+    global _warm_up_pid
+    if WARM_UP != "background" or _warm_up_pid == os.getpid():
+        return
+    with _warm_up_lock:
+        if _warm_up_pid == os.getpid():
+            return
+        _warm_up_pid = os.getpid()
+
+    def _background_warm_up():
+        try:
+            warm_up()
+        except Exception as exc:
+            # The first request that needs the resource retries and surfaces the error.
+            app.logger.warning("background warm-up failed: %s", exc)
+    threading.Thread(target=_background_warm_up, name="warm-up", daemon=True).start()
+
+# Servers without the gunicorn hook (flask run, socketio.run) start it on their first request.
+app.before_request(start_background_warm_up)
+
+for _resource in (llm_client, cnn, inference_batcher, live_hub, camera):
+    RESOURCE_LOAD_SECONDS.labels(_resource.name).set_function(lambda r=_resource: r.load_seconds or 0.0)
 
 # ------------------- Prediction Helper Functions -------------------
-def predict_disease_from_image(image):
-    img_tensor = preprocess_image(image)
-    with torch.no_grad():
-        outputs = model(img_tensor)
-        probabilities = torch.nn.functional.softmax(outputs, dim=1)
-        confidence, predicted_idx = torch.max(probabilities, 1)
-        predicted_class = predicted_idx.item()
-    disease = CLASS_NAMES[predicted_class] if 0 <= predicted_class < len(CLASS_NAMES) else "Unknown Disease"
-    return {"disease": disease, "score": round(confidence.item(), 2)}
-
-def predict_disease_from_text(description):
+def generate_text(prompt, model_name=GEMINI_MODEL, cacheable=None, timeout=None):
+    with STAGES.track("gemini"):
+        return llm_client.get().generate(prompt, model_name, timeout=timeout, cacheable=cacheable)
+
+def is_json(text):
+    try:
+        json.loads(text)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+TREATMENT_UNAVAILABLE = "⚠️ Unable to fetch treatment details. Please consult a dermatologist."
+
+# TREATMENT_SOURCE: "llm" (default) asks Gemini; "grounded" adds retrieved guide
+# excerpts to the Gemini prompt; "retrieval" and "digest" build the plan from the
+# shipped FAISS indexes (or the precomputed per-class digest) with no LLM call.
+TREATMENT_SOURCE = os.getenv("TREATMENT_SOURCE", "llm")
+
+def local_treatment_plan(final_disease):
+    if TREATMENT_SOURCE not in ("retrieval", "digest"):
+        return None
+    try:
+        return retrieval.treatment_plan(final_disease, use_digest=TREATMENT_SOURCE == "digest")
+    except Exception:
+        return None
+
+_PARENTHESES = re.compile(r"\(.*?\)")
+_DISEASE_NAMES = None
+
+def canonical_disease(name):
+    """The guide name of the CNN class that `name` spells, or `name` itself.
+
+    The final step's free-text answer ("basal cell carcinoma (BCC)", "Eczema.")
+    is mapped onto one name per class, so treatment prompts, and their LLM
+    cache entries, are shared with prefetched plans and `warm-llm-cache`.
+    """
+    global _DISEASE_NAMES
+    if _DISEASE_NAMES is None:
+        from skin_model import CLASS_NAMES
+
+        names = {}
+        for label in CLASS_NAMES:
+            full = retrieval.DISEASE_ALIASES.get(label, label)
+            for spelling in (label, full, _PARENTHESES.sub("", full)):
+                names[normalize_disease(spelling)] = full
+        _DISEASE_NAMES = names
+    for spelling in (name, _PARENTHESES.sub("", name)):
+        match = _DISEASE_NAMES.get(normalize_disease(spelling))
+        if match:
+            return match
+    return name
+
+def treatment_prompt_for(final_disease):
+    final_disease = canonical_disease(final_disease)
+    context = None
+    if TREATMENT_SOURCE == "grounded":
+        try:
+            context = retrieval.retrieved_context(final_disease)
+        except Exception:
+            context = None
+    return build_treatment_prompt(final_disease, context)
+
+def treatment_deadline():
+    """The one LLM_TIMEOUT a final step gets, shared by the prefetch wait and the fallback call."""
+    return time.monotonic() + float(os.getenv("LLM_TIMEOUT", "30"))
+
+def generate_treatment_plan(final_disease, prefetch_id=None):
+    local_plan = local_treatment_plan(final_disease)
+    if local_plan:
+        return local_plan
+    deadline = treatment_deadline()
+    prefetched = take_prefetched_plan(prefetch_id, final_disease, deadline)
+    if prefetched:
+        return prefetched
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return TREATMENT_UNAVAILABLE
+    try:
+        return generate_text(treatment_prompt_for(final_disease), timeout=remaining).strip()
+    except Exception:
+        return TREATMENT_UNAVAILABLE
+
+# While the user answers follow-up questions, plans for the PREFETCH_TOP_K best
+# candidates are generated in the background (PREFETCH_CONCURRENCY at a time) and
+# served if the final diagnosis is one of them. PREFETCH=0 turns this off.
+PREFETCH = os.getenv("PREFETCH", "1") == "1"
+PREFETCH_TOP_K = int(os.getenv("PREFETCH_TOP_K", "2"))
+
+def speculative_treatment_plan(disease):
+    plan = generate_text(treatment_prompt_for(disease)).strip()
+    if not plan:
+        raise ValueError(f"empty treatment plan for {disease}")
+    return plan
+
+treatment_prefetcher = SpeculativePrefetcher(
+    speculative_treatment_plan,
+    max_concurrency=int(os.getenv("PREFETCH_CONCURRENCY", "2")),
+    max_pending=int(os.getenv("PREFETCH_MAX_PENDING", "8")),
+    # CNN labels ("BCC") and Gemini's final answer ("Basal Cell Carcinoma (BCC)") meet on one name.
+    key=lambda disease: normalize_disease(canonical_disease(disease)),
+    # Never kept longer than the session that holds the token.
+    ttl_seconds=min(float(os.getenv("PREFETCH_TTL", "1800")), SESSION_TTL),
+)
+
+def start_treatment_prefetch(predictions):
+    """Start plans for the top candidates; returns the token to pass back with the final step."""
+    if not PREFETCH or TREATMENT_SOURCE in ("retrieval", "digest"):
+        return None
+    def score(prediction):
+        try:
+            return float(prediction.get("score") or 0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    ranked = sorted((p for p in predictions if isinstance(p, dict) and p.get("disease")), key=score, reverse=True)
+    return treatment_prefetcher.prefetch([p["disease"] for p in ranked[:PREFETCH_TOP_K]])
+
+def take_prefetched_plan(prefetch_id, final_disease, deadline):
+    if not prefetch_id:
+        return None
+    # A plan being generated is waited for until `deadline`; one still queued is cancelled.
+    return treatment_prefetcher.take(prefetch_id, final_disease, timeout=max(0.0, deadline - time.monotonic()))
+
+def stream_text(prompt, model_name=GEMINI_MODEL, timeout=None):
+    """Yield the response in chunks as Gemini produces them (a cached response is one chunk)."""
+    with STAGES.track("gemini_stream"):
+        yield from llm_client.get().stream(prompt, model_name, timeout=timeout)
+
+def build_final_disease_prompt(predictions, user_answers):
+    return f"""
+    Based on these AI predictions:
+    {json.dumps(predictions, indent=2)}
+    And user responses:
+    {json.dumps(user_answers, indent=2)}
+    Determine the final skin disease.
+    Return ONLY the final disease name in plain text.
+    """
+
+def build_treatment_prompt(final_disease, context=None):
+    reference = f"""
+Use these excerpts from our dermatology and remedies guides where they are relevant:
+{context}
+""" if context else ""
+    return f"""
+You are a medical assistant. Provide a structured and easy-to-understand treatment plan for the following skin condition:
+
+**Disease:** {final_disease}
+{reference}
+Respond using this exact format. Each section should have **2–3 short bullet points**. Keep the explanations **simple, practical, and relevant for a general audience**.
+
+**Diagnosis:** [Short explanation of the disease and how it's usually identified]
+
+**Symptoms:**
+• [Common symptom 1]
+• [Common symptom 2]
+• [Common symptom 3]
+
+**Causes:**
+• [Major cause or risk factor]
+• [Another common contributing factor]
+
+**Treatments (Ordered):**
+• Ayurvedic Solutions: [1–2 natural treatments with brief benefits]
+• Home Remedies: [1–2 things people can try at home for relief]
+• Non-Prescription Medications: [1–2 OTC products with when to use them]
+• Prescription Medications: [1–2 doctor-prescribed options and their purpose]
+
+**When to See a Doctor:**
+• [Early warning sign]
+• [Progression or worsening symptom]
+"""
+
+def predict_disease_from_image(image, timeout=None):
+    model = cnn.get()
+    with STAGES.track("decode"):
+        if isinstance(image, np.ndarray):
+            rgb = image_preprocessor.resize_array(image)[..., ::-1]
+            signature = frame_dhash(rgb)
+        else:
+            img = image_preprocessor.decode(image)
+            rgb, signature = np.asarray(img), dhash(img)
+        fingerprint = thumbnail(rgb)
+    # Keyed on the model checksum too: new weights never see old predictions.
+    cached = prediction_cache.get(signature, model.artifact.sha256, fingerprint)
+    if cached is not None:
+        return cached
+    with STAGES.track("cnn"):
+        img_tensor = image_preprocessor.new_batch(1)
+        image_preprocessor.normalize_into(rgb, img_tensor[0])
+        prediction = inference_batcher.get().submit(img_tensor.to(model.device), timeout=timeout)
+    prediction_cache.put(signature, prediction, model.artifact.sha256, fingerprint)
+    return prediction
+
+def predict_disease_from_text(description, timeout=None):
     prompt = f"""
     You are a medical expert. Predict the top 5 possible skin diseases based on this description:
     '{description}'
@@ -109,54 +501,140 @@ def predict_disease_from_text(description):
         {{"disease": "Another Disease", "score": 0.6}}
     ]
     """
-    response = genai.GenerativeModel("gemini-2.0-flash").generate_content(prompt).text
+    # A reply that is not JSON is not cached, so the next identical description asks again.
+    response = generate_text(prompt, cacheable=is_json, timeout=timeout)
     try:
         return json.loads(response)
     except json.JSONDecodeError:
         return []
 
-def generate_followup_questions(predictions):
+def generate_followup_questions(predictions, timeout=None):
     prompt = f"""
     Given these possible skin diseases based on text and image inputs:
     {json.dumps(predictions, indent=2)}
     Generate 3-5 follow-up medical questions to refine the final diagnosis.
     Return ONLY plain text questions separated by new lines.
     """
-    response = genai.GenerativeModel("gemini-2.0-flash").generate_content(prompt).text
+    response = generate_text(prompt, timeout=timeout)
     questions = response.strip().split("\n")
     return [q for q in questions if q.strip() != ""]
 
+# ------------------- Concurrent Diagnosis Stages -------------------
+# The Gemini text prediction and the CNN run side by side and join before the
+# follow-up questions. Each stage has its own deadline (seconds); a stage that
+# misses it is dropped from the response instead of failing the request.
+#
+# The deadline covers the work, not a cold start: the resources a stage needs
+# are loaded before its clock starts (see /api/ready for a warm-up probe). It is
+# also passed down to the Gemini call and the CNN queue, so a stage that misses
+# it returns soon after instead of holding an executor thread until its call
+# ends. Every request needs at most two threads at a time; STAGE_WORKERS bounds
+# how many requests run their stages at once.
+STAGE_TIMEOUTS = {
+    "text": float(os.getenv("TEXT_STAGE_TIMEOUT", "15")),
+    "image": float(os.getenv("IMAGE_STAGE_TIMEOUT", "10")),
+    "followup": float(os.getenv("FOLLOWUP_STAGE_TIMEOUT", "15")),
+}
+stage_executor = ThreadPoolExecutor(max_workers=int(os.getenv("STAGE_WORKERS", "32")), thread_name_prefix="stage")
+
+def _timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+def _load_stage_resources(*resources):
+    for resource in resources:
+        try:
+            resource.get()
+        except Exception:
+            # The stage calls get() again, fails within its deadline and is reported as degraded.
+            pass
+
+def _await_stage(stage, future, started, timings, degraded):
+    remaining = max(0.0, STAGE_TIMEOUTS[stage] - (time.perf_counter() - started))
+    try:
+        result, timings[stage] = future.result(timeout=remaining)
+        return result
+    except ImageRejected:
+        raise
+    except Exception:
+        # Still queued: never started, so it never takes a thread.
+        future.cancel()
+        timings[stage] = time.perf_counter() - started
+        degraded.append(stage)
+        return None
+
+def run_diagnosis_stages(text_description, image_file):
+    """Return (predictions, followup_questions, timings, degraded_stages)."""
+    timings, degraded = {}, []
+    _load_stage_resources(*([cnn, inference_batcher] if image_file else []), llm_client)
+    started = time.perf_counter()
+    text_future = (stage_executor.submit(_timed, predict_disease_from_text, text_description,
+                                         timeout=STAGE_TIMEOUTS["text"]) if text_description else None)
+    image_future = (stage_executor.submit(_timed, predict_disease_from_image, image_file,
+                                          timeout=STAGE_TIMEOUTS["image"]) if image_file else None)
+
+    final_predictions, image_prediction = [], None
+    if image_future:
+        image_prediction = _await_stage("image", image_future, started, timings, degraded)
+    if text_future:
+        final_predictions.extend(_await_stage("text", text_future, started, timings, degraded) or [])
+    if image_prediction:
+        final_predictions.append(image_prediction)
+
+    followup_started = time.perf_counter()
+    followup_future = stage_executor.submit(_timed, generate_followup_questions, final_predictions,
+                                            timeout=STAGE_TIMEOUTS["followup"])
+    followup_questions = _await_stage("followup", followup_future, followup_started, timings, degraded) or []
+    return final_predictions, followup_questions, timings, degraded
+
+def stage_timing_headers(timings, degraded):
+    headers = {"Server-Timing": ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())}
+    if degraded:
+        headers["X-Degraded-Stages"] = ",".join(degraded)
+    return headers
+
 # ------------------- Global Variables for Live AR -------------------
+# The server-camera stream hands a frame to live_hub every LIVE_AR_INTERVAL seconds;
+# the hub's worker scores it (only if the scene changed) and publishes the smoothed
+# last_prediction, so the stream never waits for the model.
 LIVE_AR_MODE = False
+LIVE_AR_INTERVAL = float(os.getenv("LIVE_AR_INTERVAL", "0.5"))
 last_update_time = time.time()
 last_prediction = None
 
-# ------------------- Webcam Initialization -------------------
-camera = cv2.VideoCapture(0)
+def publish_camera_prediction(payload):
+    global last_prediction
+    if "error" not in payload:
+        last_prediction = payload
 
 def generate_frames():
-    global last_update_time, last_prediction, LIVE_AR_MODE
+    global last_update_time
+    import cv2
+
+    camera_capture = camera.get()
     while True:
-        success, frame = camera.read()
-        if not success:
-            break
-        if LIVE_AR_MODE and (time.time() - last_update_time > 3):
-            temp_path = f"temp_frame_{int(time.time()*1000)}.jpg"
-            cv2.imwrite(temp_path, frame)
-            last_prediction = predict_disease_from_image(temp_path)
-            os.remove(temp_path)
-            last_update_time = time.time()
-        
-        if last_prediction:
-            text = f"{last_prediction['disease']} ({last_prediction['score']})"
-            cv2.putText(frame, text, (10, 40), cv2.FONT_HERSHEY_SIMPLEX,
-                        1, (0, 255, 0), 2, cv2.LINE_AA)
-        if LIVE_AR_MODE and "followup_questions" in session and session["followup_questions"]:
-            questions = session["followup_questions"]
-            cv2.putText(frame, questions[0], (10, 80), cv2.FONT_HERSHEY_SIMPLEX,
-                        0.7, (255, 0, 0), 2, cv2.LINE_AA)
-        ret, buffer = cv2.imencode('.jpg', frame)
-        frame = buffer.tobytes()
+        # Per-frame capture/annotate/encode time; the wait for the client to read it is excluded.
+        with STAGES.track("frame"):
+            success, frame = camera_capture.read()
+            if not success:
+                STAGES.errors.labels("frame").inc()
+                break
+            if LIVE_AR_MODE and (time.time() - last_update_time > LIVE_AR_INTERVAL):
+                # A copy, because the overlay below draws on this frame.
+                live_hub.get().push("camera", frame.copy(), publish_camera_prediction)
+                last_update_time = time.time()
+
+            if last_prediction:
+                text = f"{last_prediction['disease']} ({last_prediction['score']})"
+                cv2.putText(frame, text, (10, 40), cv2.FONT_HERSHEY_SIMPLEX,
+                            1, (0, 255, 0), 2, cv2.LINE_AA)
+            if LIVE_AR_MODE and "followup_questions" in session and session["followup_questions"]:
+                questions = session["followup_questions"]
+                cv2.putText(frame, questions[0], (10, 80), cv2.FONT_HERSHEY_SIMPLEX,
+                            0.7, (255, 0, 0), 2, cv2.LINE_AA)
+            ret, buffer = cv2.imencode('.jpg', frame)
+            frame = buffer.tobytes()
         yield (b'--frame\r\n'
                b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
 
@@ -164,78 +642,135 @@ def generate_frames():
 #  API Endpoints
 # ------------------------------------------------------------------------------
 
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    HTTP_IN_FLIGHT.labels().inc()
+
+@app.after_request
+def record_request_metrics(response):
+    HTTP_SECONDS.labels(request.endpoint or "unmatched", request.method, response.status_code).observe(
+        time.perf_counter() - g.request_started)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    if "request_started" in g:
+        HTTP_IN_FLIGHT.labels().dec()
+
+@app.errorhandler(ImageRejected)
+def image_rejected(error):
+    return jsonify({"error": str(error)}), 413 if isinstance(error, ImageTooLarge) else 400
+
 @app.route("/api/analyze", methods=["POST"])
 def analyze():
     text_description = request.form.get("description")
     image_file = request.files.get("image")
-    
-    final_predictions = []
-
-    if text_description:
-        text_predictions = predict_disease_from_text(text_description)
-        final_predictions.extend(text_predictions)
-
-    if image_file:
-        image_prediction = predict_disease_from_image(image_file)
-        final_predictions.append(image_prediction)
 
-    followup_questions = generate_followup_questions(final_predictions)
+    final_predictions, followup_questions, timings, degraded = run_diagnosis_stages(text_description, image_file)
 
-    return jsonify({
+    response = jsonify({
         "predictions": final_predictions,
-        "followup_questions": followup_questions
+        "followup_questions": followup_questions,
+        # Send back with /api/final-diagnosis to pick up the plans prefetched meanwhile.
+        "prefetch_id": start_treatment_prefetch(final_predictions),
     })
+    response.headers.update(stage_timing_headers(timings, degraded))
+    return response
 
-@app.route("/api/final-diagnosis", methods=["POST"])
-def final_diagnosis_api():
-    data = request.json
-    predictions = data.get("predictions", [])
-    user_answers = data.get("user_answers", {})
+# ------------- Bulk Image Analysis ----------------
+MAX_BATCH_IMAGES = int(os.getenv("MAX_BATCH_IMAGES", "100"))
 
-    prompt = f"""
-    Based on these AI predictions:
-    {json.dumps(predictions, indent=2)}
-    And user responses:
-    {json.dumps(user_answers, indent=2)}
-    Determine the final skin disease.
-    Return ONLY the final disease name in plain text.
+def iter_batch_images():
+    """Yield (filename, file object) for every uploaded image and every image inside an uploaded zip.
+
+    A zip member whose header declares more than MAX_UPLOAD_BYTES is yielded as
+    an ImageTooLarge instead, without decompressing it. (Reads are capped at that
+    size as well, for members whose header understates it.)
     """
-    
-    final_disease = genai.GenerativeModel("gemini-2.0-flash").generate_content(prompt).text.strip()
+    for image_file in request.files.getlist("images"):
+        yield image_file.filename, image_file
+    archive = request.files.get("archive")
+    if archive:
+        with zipfile.ZipFile(archive.stream) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                if info.file_size > MAX_UPLOAD_BYTES:
+                    yield info.filename, ImageTooLarge(
+                        f"Image exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit")
+                    continue
+                with zf.open(info) as member:
+                    yield info.filename, member
 
-    treatment_prompt = f"""
-You are a medical assistant. Provide a structured and easy-to-understand treatment plan for the following skin condition:
+@app.route("/api/analyze/batch", methods=["POST"])
+def analyze_batch():
+    """Score many images and stream one NDJSON line per image as soon as it is ready.
 
-**Disease:** {final_disease}
+    Images are sent as repeated `images` multipart fields and/or one `archive` zip.
+    With `followup=true`, a final line carries follow-up questions generated once
+    for the whole batch.
+    """
+    want_followup = request.form.get("followup", "false").lower() in ("1", "true", "yes")
+    batcher = inference_batcher.get()
+    timeout = STAGE_TIMEOUTS["image"]
 
-Respond using this exact format. Each section should have **2–3 short bullet points**. Keep the explanations **simple, practical, and relevant for a general audience**.
+    def generate():
+        pending, predictions = [], []
 
-**Diagnosis:** [Short explanation of the disease and how it's usually identified]
+        def line(index, filename, handle):
+            try:
+                result = {"index": index, "filename": filename, **handle.wait(timeout)}
+                predictions.append({"disease": result["disease"], "score": result["score"]})
+            except TimeoutError:
+                result = {"index": index, "filename": filename, "error": f"Inference took longer than {timeout:g}s"}
+            except Exception as exc:
+                result = {"index": index, "filename": filename, "error": str(exc)}
+            return json.dumps(result) + "\n"
 
-**Symptoms:**
-• [Common symptom 1]
-• [Common symptom 2]
-• [Common symptom 3]
+        def submit(chunk):
+            # A full chunk is queued at once so it is scored in one forward pass
+            # while the next chunk is being decoded.
+            for index, filename, tensor in chunk:
+                pending.append((index, filename, batcher.submit_async(tensor)))
+            chunk.clear()
 
-**Causes:**
-• [Major cause or risk factor]
-• [Another common contributing factor]
+        chunk = []
+        try:
+            for index, (filename, source) in enumerate(iter_batch_images()):
+                if index >= MAX_BATCH_IMAGES:
+                    yield json.dumps({"error": f"Only the first {MAX_BATCH_IMAGES} images were scored"}) + "\n"
+                    break
+                try:
+                    if isinstance(source, ImageRejected):
+                        raise source
+                    chunk.append((index, filename, preprocess_image(source)))
+                except ImageRejected as exc:
+                    yield json.dumps({"index": index, "filename": filename, "error": str(exc)}) + "\n"
+                if len(chunk) >= batcher.max_batch_size:
+                    submit(chunk)
+                while pending and pending[0][2].done.is_set():
+                    yield line(*pending.pop(0))
+        except zipfile.BadZipFile:
+            yield json.dumps({"error": "archive is not a valid zip file"}) + "\n"
+        submit(chunk)
+        while pending:
+            yield line(*pending.pop(0))
 
-**Treatments (Ordered):**
-• Ayurvedic Solutions: [1–2 natural treatments with brief benefits]
-• Home Remedies: [1–2 things people can try at home for relief]
-• Non-Prescription Medications: [1–2 OTC products with when to use them]
-• Prescription Medications: [1–2 doctor-prescribed options and their purpose]
+        if want_followup and predictions:
+            yield json.dumps({"followup_questions": generate_followup_questions(predictions)}) + "\n"
 
-**When to See a Doctor:**
-• [Early warning sign]
-• [Progression or worsening symptom]
-"""
-    
-    try:
-        treatment_response = genai.GenerativeModel("gemini-2.0-flash").generate_content(treatment_prompt).text.strip()
-    except Exception:
-        treatment_response = "⚠️ Unable to fetch treatment details. Please consult a dermatologist."
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+@app.route("/api/final-diagnosis", methods=["POST"])
+def final_diagnosis_api():
+    data = request.json
+    predictions = data.get("predictions", [])
+    user_answers = data.get("user_answers", {})
+
+    final_disease = generate_text(build_final_disease_prompt(predictions, user_answers)).strip()
+
+    treatment_response = generate_treatment_plan(final_disease, data.get("prefetch_id"))
     
     return jsonify({
         "final_disease": final_disease,
@@ -243,25 +778,82 @@ Respond using this exact format. Each section should have **2–3 short bullet p
     })
 
 
+# ------------- Streaming Final Diagnosis (Server-Sent Events) ----------------
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_treatment_events(final_disease, prefetch_id=None):
+    yield sse_event("final_disease", {"final_disease": final_disease})
+    deadline = treatment_deadline()
+    ready_plan = local_treatment_plan(final_disease) or take_prefetched_plan(prefetch_id, final_disease, deadline)
+    if ready_plan:
+        yield sse_event("treatment", {"text": ready_plan})
+        yield sse_event("done", {})
+        return
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        yield sse_event("treatment", {"text": TREATMENT_UNAVAILABLE})
+        yield sse_event("done", {})
+        return
+    try:
+        for chunk in stream_text(treatment_prompt_for(final_disease), timeout=remaining):
+            yield sse_event("treatment", {"text": chunk})
+    except Exception:
+        yield sse_event("treatment", {"text": TREATMENT_UNAVAILABLE})
+    yield sse_event("done", {})
+
+def sse_response(events):
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route("/api/final-diagnosis/stream", methods=["POST"])
+def final_diagnosis_stream_api():
+    data = request.json
+    predictions = data.get("predictions", [])
+    user_answers = data.get("user_answers", {})
+    prefetch_id = data.get("prefetch_id")
+
+    def events():
+        # Open the stream right away; the first real event follows as soon as Gemini names the disease.
+        yield ": connected\n\n"
+        try:
+            final_disease = generate_text(build_final_disease_prompt(predictions, user_answers)).strip()
+        except Exception as exc:
+            yield sse_event("error", {"error": str(exc)})
+            return
+        yield from stream_treatment_events(final_disease, prefetch_id)
+
+    return sse_response(events())
+
 # ------------- Modified Clinics Lookup Endpoint ----------------
 @app.route("/api/find_clinics", methods=["POST"])
 def find_clinics():
-    data = request.json
+    data = request.get_json(silent=True) or {}
     user_location = data.get("location")
-    range_km = data.get("range", 20)
-    radius = range_km * 1000
+    try:
+        radius = float(data.get("range", 20)) * 1000
+    except (TypeError, ValueError):
+        return jsonify({"error": "range must be a number of kilometres"}), 400
 
     # Convert location string to coordinates if needed
     if isinstance(user_location, str):
-        geocode_url = f"https://maps.googleapis.com/maps/api/geocode/json?address={user_location}&key={MAPS_API_KEY}"
-        geocode_response = requests.get(geocode_url)
-        geocode_data = geocode_response.json()
-        if geocode_data.get("status") != "OK":
+        with STAGES.track("maps_geocode"):
+            coords = places_client.geocode(user_location)
+        if coords is None:
             return jsonify({"error": "Unable to geocode location"}), 400
-        location = geocode_data["results"][0]["geometry"]["location"]
-        lat, lng = location["lat"], location["lng"]
+        lat, lng = coords
+    elif isinstance(user_location, dict):
+        try:
+            lat, lng = float(user_location["lat"]), float(user_location["lng"])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"error": "location needs numeric lat and lng"}), 400
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return jsonify({"error": "location is out of range"}), 400
     else:
-        lat, lng = user_location.get("lat"), user_location.get("lng")
+        return jsonify({"error": "location must be an address or {lat, lng}"}), 400
     
     # Define hospital categories and their keywords
     categories = {
@@ -270,36 +862,8 @@ def find_clinics():
         "Private": "skin private hospital"
     }
     
-    clinics = []
-    for category, keyword in categories.items():
-        places_url = (
-            f"https://maps.googleapis.com/maps/api/place/nearbysearch/json?"
-            f"location={lat},{lng}&radius={radius}&type=hospital&keyword={keyword}&key={MAPS_API_KEY}"
-        )
-        places_response = requests.get(places_url)
-        places_data = places_response.json()
-        
-        for place in places_data.get("results", []):
-            place_id = place.get("place_id")
-            details_url = (
-                f"https://maps.googleapis.com/maps/api/place/details/json?"
-                f"place_id={place_id}&fields=name,formatted_address,formatted_phone_number,opening_hours,website,rating&key={MAPS_API_KEY}"
-            )
-            details_response = requests.get(details_url)
-            details_data = details_response.json().get("result", {})
-            
-            clinic = {
-                "category": category,
-                "name": place.get("name"),
-                "place_id": place.get("place_id"),
-                "address": details_data.get("formatted_address"),
-                "phone": details_data.get("formatted_phone_number"),
-                "website": details_data.get("website"),
-                "rating": place.get("rating"),
-                "location": place.get("geometry", {}).get("location", {}),
-                "hours": details_data.get("opening_hours", {}).get("weekday_text", [])
-            }
-            clinics.append(clinic)
+    with STAGES.track("maps_places"):
+        clinics = places_client.find_clinics(lat, lng, radius, categories)
     
     # Sort clinics by category order: NGO, Government, then Private
     sorted_order = ["NGO", "Government", "Private"]
@@ -307,6 +871,67 @@ def find_clinics():
     
     return jsonify({"clinics": clinics})
 
+@app.route("/api/find_clinics/stats", methods=["GET"])
+def find_clinics_stats():
+    return jsonify(places_client.stats())
+
+@app.route("/api/signaling/stats", methods=["GET"])
+def signaling_stats():
+    return jsonify(signaling_fanout.stats())
+
+@app.route("/api/prefetch/stats", methods=["GET"])
+def prefetch_stats():
+    return jsonify(treatment_prefetcher.stats())
+
+@app.route("/api/inference/stats", methods=["GET"])
+def inference_stats():
+    batcher = inference_batcher.peek()
+    return jsonify(batcher.stats() if batcher is not None else {"loaded": False})
+
+@app.route("/api/inference/cache/stats", methods=["GET"])
+def prediction_cache_stats():
+    return jsonify(prediction_cache.stats())
+
+@app.route("/api/inference/memory", methods=["GET"])
+def inference_memory():
+    from shared_weights import memory_report
+
+    report = memory_report()
+    report["weights_mode"] = MODEL_WEIGHTS_MODE
+    report["inference_pool"] = INFERENCE_POOL
+    return jsonify(report)
+
+@app.route("/api/live/stats", methods=["GET"])
+def live_stats():
+    hub = live_hub.peek()
+    return jsonify(hub.stats() if hub is not None else {"loaded": False})
+
+@app.route("/api/llm/stats", methods=["GET"])
+def llm_stats():
+    client = llm_client.peek()
+    return jsonify(client.stats() if client is not None else {"loaded": False})
+
+@app.route("/api/llm/cache/stats", methods=["GET"])
+def llm_cache_stats():
+    return jsonify(llm_cache.stats() if llm_cache is not None else {"enabled": False})
+
+@app.route("/api/session/stats", methods=["GET"])
+def session_stats():
+    if SESSION_BACKEND == "cookie":
+        return jsonify({"backend": "cookie"})
+    return jsonify({"backend": SESSION_BACKEND, **session_store.stats()})
+
+@app.route("/api/ready", methods=["GET"])
+def ready():
+    """200 once the warmable resources are loaded (for health checks), 503 before."""
+    resources = lazy.status()
+    warm = all(r.loaded for r in (llm_client, cnn, inference_batcher, live_hub))
+    return jsonify({"ready": warm, "warm_up": WARM_UP, "resources": resources}), 200 if warm else 503
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route("/api/health_chat", methods=["POST"])
 def health_chat():
     data = request.json
@@ -329,7 +954,7 @@ Return your response in **plain text** only.
 """
     
     try:
-        response = genai.GenerativeModel("gemini-2.0-flash").generate_content(prompt).text.strip()
+        response = generate_text(prompt).strip()
         return jsonify({"response": response})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -344,6 +969,8 @@ def on_join(data):
     else:
         emit("error", {"message": "Room name not provided"})
 
+# signalData may be JSON or binary (ArrayBuffer); binary data travels as a Socket.IO
+# attachment and crosses SIGNALING_QUEUE without re-encoding.
 @socketio.on("signal")
 def on_signal(data):
     room = data.get("room")
@@ -353,26 +980,54 @@ def on_signal(data):
     else:
         emit("error", {"message": "Missing room or signalData"})
 
+# Live AR protocol: emit "live_frame" with a binary JPEG (ArrayBuffer/Blob), as often
+# as you like; "live_prediction" events come back with {disease, score, seq, ms}, where
+# seq is the frame number (frames superseded before scoring are skipped).
+# "live_stop" or disconnecting ends the session.
+def emit_live_prediction(sid):
+    def send(payload):
+        socketio.emit("live_prediction", payload, to=sid)
+    return send
+
+@socketio.on("live_frame")
+def on_live_frame(data):
+    if not isinstance(data, (bytes, bytearray)) or not data:
+        emit("live_error", {"error": "Send each frame as a binary JPEG"})
+        return
+    if len(data) > LIVE_MAX_FRAME_BYTES:
+        emit("live_error", {"error": f"Frame exceeds {LIVE_MAX_FRAME_BYTES // 1024} KB; downscale before sending"})
+        return
+    if not live_hub.get().push(request.sid, bytes(data), emit_live_prediction(request.sid)):
+        emit("live_error", {"error": "Live mode is at capacity, try again shortly"})
+
+@socketio.on("live_stop")
+def on_live_stop():
+    hub = live_hub.peek()
+    if hub is not None:
+        hub.remove(request.sid)
+
+@socketio.on("disconnect")
+def on_disconnect():
+    # peek(): a plain disconnect must not load the model.
+    hub = live_hub.peek()
+    if hub is not None:
+        hub.remove(request.sid)
+
 # ------------------- Webpage Rendering Endpoints -------------------
 @app.route("/", methods=["GET", "POST"])
 def index():
     if request.method == "POST":
         text_description = request.form.get("description")
         image_file = request.files.get("image")
-        final_predictions = []
-        
-        if text_description:
-            text_predictions = predict_disease_from_text(text_description)
-            final_predictions.extend(text_predictions)
-        
-        if image_file:
-            image_prediction = predict_disease_from_image(image_file)
-            final_predictions.append(image_prediction)
-        
+        final_predictions, followup_questions, timings, degraded = run_diagnosis_stages(text_description, image_file)
+
         session["predictions"] = final_predictions
-        session["followup_questions"] = generate_followup_questions(final_predictions)
+        session["followup_questions"] = followup_questions
         session["detection_mode"] = "Image/Text"
-        return redirect(url_for("followup"))
+        session["prefetch_id"] = start_treatment_prefetch(final_predictions)
+        response = redirect(url_for("followup"))
+        response.headers.update(stage_timing_headers(timings, degraded))
+        return response
     
     return render_template("index.html")
 
@@ -394,49 +1049,10 @@ def final_diagnosis_page():
         return redirect(url_for("index"))
     
     # Step 1: Ask Gemini to determine the final disease
-    prompt = f"""
-    Based on these AI predictions:
-    {json.dumps(session["predictions"], indent=2)}
-    And user responses:
-    {json.dumps(session["user_answers"], indent=2)}
-    Determine the final skin disease. Return ONLY the final disease name in plain text.
-    """
-    final_disease = genai.GenerativeModel("gemini-2.0-flash").generate_content(prompt).text.strip()
-
-    # Step 2: Ask Gemini to return a concise, structured treatment plan
-    treatment_prompt = f"""
-You are a medical assistant. Provide a structured and easy-to-understand treatment plan for the following skin condition:
-
-**Disease:** {final_disease}
-
-Respond using this exact format. Each section should have **2–3 short bullet points**. Keep the explanations **simple, practical, and relevant for a general audience**.
-
-**Diagnosis:** [Short explanation of the disease and how it's usually identified]
-
-**Symptoms:**
-• [Common symptom 1]
-• [Common symptom 2]
-• [Common symptom 3]
-
-**Causes:**
-• [Major cause or risk factor]
-• [Another common contributing factor]
-
-**Treatments (Ordered):**
-• Ayurvedic Solutions: [1–2 natural treatments with brief benefits]
-• Home Remedies: [1–2 things people can try at home for relief]
-• Non-Prescription Medications: [1–2 OTC products with when to use them]
-• Prescription Medications: [1–2 doctor-prescribed options and their purpose]
+    final_disease = generate_text(build_final_disease_prompt(session["predictions"], session["user_answers"])).strip()
 
-**When to See a Doctor:**
-• [Early warning sign]
-• [Progression or worsening symptom]
-"""
-    
-    try:
-        treatment_response = genai.GenerativeModel("gemini-2.0-flash").generate_content(treatment_prompt).text.strip()
-    except Exception:
-        treatment_response = "⚠️ Unable to fetch treatment details. Please consult a dermatologist."
+    # Step 2: Build a concise, structured treatment plan (Gemini or local retrieval)
+    treatment_response = generate_treatment_plan(final_disease, session.pop("prefetch_id", None))
 
     # Store and render
     session["final_disease"] = final_disease
@@ -451,7 +1067,7 @@ Respond using this exact format. Each section should have **2–3 short bullet p
 def treatment():
     final_disease = session.get("final_disease", "Unknown")
     treatment_prompt = f"Provide structured diagnosis and treatment for {final_disease} in a bullet-point format."
-    treatment_plan = genai.GenerativeModel("gemini-2.0-flash").generate_content(treatment_prompt).text
+    treatment_plan = generate_text(treatment_prompt)
     return render_template("treatment.html", final_disease=final_disease, treatment=treatment_plan)
 
 @app.route("/live_ar", methods=["GET", "POST"])
@@ -466,22 +1082,58 @@ def live_ar():
 
 @app.route("/capture", methods=["POST"])
 def capture():
-    success, frame = camera.read()
+    success, frame = camera.get().read()
     if success:
-        capture_filename = f"static/captured_skin_{int(time.time()*1000)}.jpg"
-        cv2.imwrite(capture_filename, frame)
-        session['captured_image'] = capture_filename
-        image_prediction = predict_disease_from_image(capture_filename)
-        os.remove(capture_filename)
+        image_prediction = predict_disease_from_image(frame)
         session["predictions"] = [image_prediction]
         session["followup_questions"] = generate_followup_questions([image_prediction])
         session["detection_mode"] = "Live AR"
+        session["prefetch_id"] = start_treatment_prefetch([image_prediction])
         return jsonify({"success": True, "redirect_url": url_for("followup")})
     return jsonify({"success": False})
 
 @app.route("/video_feed")
 def video_feed():
-    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    # stream_with_context: the overlay reads the session while the stream is open.
+    return Response(stream_with_context(generate_frames()), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+# ------------------- CLI Commands -------------------
+@app.cli.command("warm-llm-cache")
+def warm_llm_cache():
+    """Pre-generate treatment plans for every CNN class (flask --app app warm-llm-cache)."""
+    if llm_cache is None:
+        print("LLM cache is disabled (LLM_CACHE=0)")
+        return
+    from skin_model import CLASS_NAMES
+
+    # Warmed under the canonical names that final diagnoses are mapped onto (canonical_disease).
+    for disease in (canonical_disease(label) for label in CLASS_NAMES if label != "Unknown"):
+        prompt = treatment_prompt_for(disease)
+        if llm_cache.contains(GEMINI_MODEL, prompt):
+            print(f"cached   {disease}")
+            continue
+        try:
+            if not generate_text(prompt).strip():
+                raise ValueError("empty response, not cached")
+            print(f"warmed   {disease}")
+        except Exception as exc:
+            print(f"failed   {disease}: {exc}")
+
+@app.cli.command("fetch-model")
+def fetch_model_command():
+    """Download the model weights into the local cache (flask --app app fetch-model); builds use python artifacts.py."""
+    artifact = fetch_model()
+    print(f"{artifact.path} sha256 {artifact.sha256}")
+
+@app.cli.command("warm-up")
+def warm_up_command():
+    """Load the model and LLM client and report how long each took (flask --app app warm-up)."""
+    for name, seconds in warm_up().items():
+        print(f"{name:20} {seconds:.3f}s")
+
+# ------------------- Warm-Up at Import -------------------
+if WARM_UP == "import":
+    warm_up()
 
 # ------------------- Main Entry Point -------------------
 if __name__ == "__main__":
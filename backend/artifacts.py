@@ -0,0 +1,172 @@
+"""Content-addressed local cache for model artifacts.
+
+Downloaded files are stored once per checksum under ``<cache_dir>/sha256/<hex>`` and
+the stable path the app loads from (e.g. ``model/skin_disease_model.pth``) is a
+symlink to the current blob. A warm boot only stats the link and the blob; the
+file is downloaded only when it is missing or the expected checksum changes.
+
+    python artifacts.py      # fetch the CNN weights, e.g. at build time
+
+The command imports nothing from the app, so it needs no API keys and creates
+no caches.
+"""
+import fcntl
+import hashlib
+import json
+import os
+from collections import namedtuple
+from contextlib import contextmanager
+
+Artifact = namedtuple("Artifact", ["path", "sha256"])
+
+MODEL_URL = os.getenv("MODEL_URL", "https://drive.google.com/uc?id=1w0mSk2-OZHFrMDYgSa2JSesF3JXHh0Jx")
+MODEL_PATH = os.path.join("model", "skin_disease_model.pth")
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+class ArtifactUnavailable(RuntimeError):
+    pass
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def _file_lock(lock_path):
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# ------------------- Blob Verification -------------------
+def _stamp(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _verified(blob_path, sha256):
+    """True if the blob holds `sha256`; the full hash is only recomputed when the file changed."""
+    if not os.path.exists(blob_path):
+        return False
+    stamp_path = blob_path + ".verified"
+    try:
+        with open(stamp_path) as f:
+            if json.load(f) == _stamp(blob_path):
+                return True
+    except (OSError, ValueError):
+        pass
+    if sha256_file(blob_path) != sha256:
+        return False
+    _record_verified(blob_path)
+    return True
+
+
+def _record_verified(blob_path):
+    with open(blob_path + ".verified", "w") as f:
+        json.dump(_stamp(blob_path), f)
+
+
+def _current_blob(path):
+    """Return (blob_path, sha256) that the stable path points at, if it is a cache link."""
+    if not os.path.islink(path):
+        return None, None
+    target = os.path.realpath(path)
+    return target, os.path.basename(target)
+
+
+def _link(path, blob_path):
+    tmp_link = f"{path}.link.{os.getpid()}"
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(os.path.relpath(blob_path, os.path.dirname(os.path.abspath(path))), tmp_link)
+    os.replace(tmp_link, path)
+
+
+# ------------------- Public API -------------------
+def ensure_artifact(url, path, sha256=None, cache_dir=None, offline=False, downloader=None):
+    """Make `path` point at a verified copy of the artifact and return Artifact(path, sha256).
+
+    * `sha256` pins the expected content; a different cached file triggers a fresh download.
+      Without it, whatever is already cached is accepted.
+    * `offline=True` never touches the network and fails if the cache cannot satisfy the request.
+    * Concurrent workers serialise on a lock file, so only one of them downloads.
+    """
+    cache_dir = cache_dir or os.path.join(os.path.dirname(path) or ".", ".cache")
+    blob_dir = os.path.join(cache_dir, "sha256")
+    os.makedirs(blob_dir, exist_ok=True)
+    sha256 = sha256.lower() if sha256 else None
+
+    # Fast path: stable link already points at the right, unchanged blob.
+    blob_path, current = _current_blob(path)
+    if current and (sha256 is None or current == sha256) and _verified(blob_path, current):
+        return Artifact(path, current)
+
+    with _file_lock(os.path.join(cache_dir, ".lock")):
+        blob_path, current = _current_blob(path)
+        if current and (sha256 is None or current == sha256) and _verified(blob_path, current):
+            return Artifact(path, current)
+
+        if sha256 and _verified(os.path.join(blob_dir, sha256), sha256):
+            _link(path, os.path.join(blob_dir, sha256))
+            return Artifact(path, sha256)
+
+        # A plain file left by an older deploy: adopt it into the cache if it matches.
+        if os.path.isfile(path) and not os.path.islink(path):
+            digest = sha256_file(path)
+            if sha256 is None or digest == sha256:
+                blob_path = os.path.join(blob_dir, digest)
+                os.replace(path, blob_path)
+                _record_verified(blob_path)
+                _link(path, blob_path)
+                return Artifact(path, digest)
+
+        if offline:
+            raise ArtifactUnavailable(
+                f"{path} is not in the local cache"
+                + (f" with sha256 {sha256}" if sha256 else "")
+                + " and offline mode is enabled"
+            )
+
+        if downloader is None:
+            import gdown
+            downloader = lambda src, dst: gdown.download(src, dst, quiet=False)
+        tmp_path = os.path.join(blob_dir, f".download.{os.getpid()}")
+        try:
+            if not downloader(url, tmp_path) or not os.path.exists(tmp_path):
+                raise ArtifactUnavailable(f"Download of {url} failed")
+            digest = sha256_file(tmp_path)
+            if sha256 and digest != sha256:
+                raise ArtifactUnavailable(f"Downloaded {url} has sha256 {digest}, expected {sha256}")
+            blob_path = os.path.join(blob_dir, digest)
+            os.replace(tmp_path, blob_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        _record_verified(blob_path)
+        _link(path, blob_path)
+        return Artifact(path, digest)
+
+
+def fetch_model(path=MODEL_PATH):
+    # The model is fetched into a checksum-keyed local cache only when it is missing
+    # or MODEL_SHA256 changes. MODEL_OFFLINE=1 boots from the cache without network.
+    return ensure_artifact(
+        MODEL_URL,
+        path,
+        sha256=os.getenv("MODEL_SHA256"),
+        offline=os.getenv("MODEL_OFFLINE", "0") == "1",
+    )
+
+
+if __name__ == "__main__":
+    artifact = fetch_model()
+    print(f"{artifact.path} sha256 {artifact.sha256}")
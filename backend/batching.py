@@ -0,0 +1,175 @@
+import os
+import threading
+import time
+from collections import deque
+
+import torch
+
+
+# ------------------- Pending Request -------------------
+class _PendingPrediction:
+    __slots__ = ("tensor", "enqueued_at", "result", "probabilities", "error", "done")
+
+    def __init__(self, tensor):
+        self.tensor = tensor
+        self.enqueued_at = time.perf_counter()
+        self.result = None
+        self.probabilities = None  # full softmax row, for callers that smooth across frames
+        self.error = None
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        if not self.done.wait(timeout):
+            raise TimeoutError("Inference did not complete in time")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def _percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+# ------------------- Micro-Batching Inference Queue -------------------
+class InferenceBatcher:
+    """Collect image tensors from concurrent callers and score them in one forward pass.
+
+    A batch is closed as soon as it holds `max_batch_size` tensors or the oldest
+    tensor has waited `max_wait_ms`, whichever comes first. Raising the batch size
+    or the wait improves throughput; lowering them improves tail latency.
+    """
+
+    def __init__(self, model, class_names, max_batch_size=8, max_wait_ms=5.0, stats_window=1024, on_batch=None):
+        self.model = model
+        self.class_names = class_names
+        # Optional on_batch(batch_size, forward_seconds, error) hook, e.g. for metrics.
+        self.on_batch = on_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.stats_window = stats_window
+        self._start_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._errors = 0
+        self._batch_sizes = deque(maxlen=self.stats_window)
+        self._queue_waits = deque(maxlen=self.stats_window)
+        self._latencies = deque(maxlen=self.stats_window)
+        self._worker = None
+        self._pid = os.getpid()
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so with a preloaded gunicorn app each
+        # worker process starts its own batching thread on first use.
+        if self._worker is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._start_lock = threading.Lock()
+                self._reset()
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+                self._worker.start()
+
+    def submit_async(self, img_tensor):
+        """Queue a preprocessed (1, C, H, W) tensor; call .wait() on the returned handle for the result."""
+        self._ensure_worker()
+        pending = _PendingPrediction(img_tensor)
+        with self._cond:
+            self._queue.append(pending)
+            self._cond.notify()
+        return pending
+
+    def submit(self, img_tensor, timeout=None):
+        """Queue a preprocessed (1, C, H, W) tensor and block until its prediction is ready."""
+        return self.submit_async(img_tensor).wait(timeout)
+
+    def _collect_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = self._queue[0].enqueued_at + self.max_wait
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            count = min(len(self._queue), self.max_batch_size)
+            return [self._queue.popleft() for _ in range(count)]
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started = time.perf_counter()
+            try:
+                inputs = torch.cat([p.tensor for p in batch], dim=0)
+                with torch.no_grad():
+                    outputs = self.model(inputs)
+                    probabilities = torch.nn.functional.softmax(outputs.float(), dim=1)
+                    confidences, predicted = torch.max(probabilities, 1)
+                rows = probabilities.tolist()
+                for pending, idx, confidence, row in zip(batch, predicted.tolist(), confidences.tolist(), rows):
+                    disease = self.class_names[idx] if 0 <= idx < len(self.class_names) else "Unknown Disease"
+                    pending.result = {"disease": disease, "score": round(confidence, 2)}
+                    pending.probabilities = row
+            except Exception as exc:
+                for pending in batch:
+                    pending.error = exc
+            finished = time.perf_counter()
+            if self.on_batch is not None:
+                try:
+                    self.on_batch(len(batch), finished - started, batch[0].error)
+                except Exception:
+                    pass  # never let a hook stall the waiting requests
+
+            with self._stats_lock:
+                self._requests += len(batch)
+                self._batches += 1
+                if batch[0].error is not None:
+                    self._errors += len(batch)
+                self._batch_sizes.append(len(batch))
+                for pending in batch:
+                    self._queue_waits.append(started - pending.enqueued_at)
+                    self._latencies.append(finished - pending.enqueued_at)
+
+            for pending in batch:
+                pending.done.set()
+
+    def queue_depth(self):
+        return len(self._queue)
+
+    def stats(self):
+        with self._stats_lock:
+            batch_sizes = list(self._batch_sizes)
+            queue_waits = list(self._queue_waits)
+            latencies = list(self._latencies)
+            requests, batches, errors = self._requests, self._batches, self._errors
+        with self._cond:
+            queue_depth = len(self._queue)
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "requests": requests,
+            "batches": batches,
+            "errors": errors,
+            "queue_depth": queue_depth,
+            "mean_batch_size": round(sum(batch_sizes) / len(batch_sizes), 2) if batch_sizes else 0.0,
+            "queue_wait_ms": {
+                "p50": round(_percentile(queue_waits, 50) * 1000.0, 3),
+                "p99": round(_percentile(queue_waits, 99) * 1000.0, 3),
+            },
+            "latency_ms": {
+                "p50": round(_percentile(latencies, 50) * 1000.0, 3),
+                "p95": round(_percentile(latencies, 95) * 1000.0, 3),
+                "p99": round(_percentile(latencies, 99) * 1000.0, 3),
+            },
+        }
@@ -0,0 +1,105 @@
+"""Offline stand-ins used by the benchmarks: a local Google Maps server and a random-weight model."""
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class _MapsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        time.sleep(self.server.latency)
+        self.server.count(url.path)
+        if url.path.endswith("/geocode/json"):
+            if self.server.geocode_status != "OK":
+                body = {"status": self.server.geocode_status, "results": []}
+            else:
+                body = {"status": "OK", "results": [{"geometry": {"location": {"lat": 18.52, "lng": 73.85}}}]}
+        elif url.path.endswith("/place/nearbysearch/json"):
+            keyword = params.get("keyword", "").strip().replace(" ", "-")
+            body = {"status": "OK", "results": [
+                {"place_id": f"{keyword}-{i}", "name": f"{keyword} clinic {i}", "rating": 4.0,
+                 "geometry": {"location": {"lat": 18.52 + i / 1000, "lng": 73.85}}}
+                for i in range(self.server.places_per_search)
+            ]}
+        elif url.path.endswith("/place/details/json"):
+            body = {"status": "OK", "result": {
+                "formatted_address": f"{params.get('place_id')} street", "formatted_phone_number": "+91 00000 00000",
+                "website": "https://example.org", "opening_hours": {"weekday_text": ["Monday: 9 AM - 5 PM"]},
+            }}
+        else:
+            body = {"status": "NOT_FOUND"}
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class MapsStandIn:
+    """Local HTTP server answering geocode / nearbysearch / details like the Maps API.
+
+        with MapsStandIn(latency=0.05) as maps:
+            os.environ["MAPS_API_BASE"] = maps.base_url
+
+    Set `geocode_status` (e.g. "ZERO_RESULTS") to make every geocode fail.
+    """
+
+    def __init__(self, latency=0.0, places_per_search=20, geocode_status="OK"):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _MapsHandler)
+        self.server.daemon_threads = True
+        self.server.latency = latency
+        self.server.places_per_search = places_per_search
+        self.server.geocode_status = geocode_status
+        self.requests = {}
+        lock = threading.Lock()
+
+        def count(path):
+            with lock:
+                self.requests[path] = self.requests.get(path, 0) + 1
+
+        self.server.count = count
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def geocode_status(self):
+        return self.server.geocode_status
+
+    @geocode_status.setter
+    def geocode_status(self, status):
+        self.server.geocode_status = status
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/maps/api"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def write_random_model(workdir, seed=0):
+    """Save a randomly initialised SkinDiseaseCNN where app.py expects the trained weights."""
+    import torch
+
+    from skin_model import SkinDiseaseCNN
+
+    torch.manual_seed(seed)
+    path = os.path.join(workdir, "model", "skin_disease_model.pth")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    torch.save(SkinDiseaseCNN(num_classes=11).state_dict(), path)
+    return path
@@ -0,0 +1,108 @@
+"""Where does `import app` spend its time? (worker boot / Render cold start)
+
+    python -m benchmarks.import_profile [--top 25] [--warm-up] [--json out.json]
+
+Runs `python -X importtime -c "import app"` in a fresh interpreter (LLM_BACKEND=fake,
+WARM_UP=lazy, so nothing is loaded that a first request would load) and reports
+the wall time of the import plus the modules with the largest cumulative import
+time. --warm-up then times app.warm_up() per resource in a second fresh process,
+which needs the model weights (model/skin_disease_model.pth, or network access).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WARM_UP_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter() - started
+print(json.dumps({"import_s": round(imported, 3), "warm_up_s": app.warm_up()}))
+"""
+
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault("LLM_BACKEND", "fake")
+    env["WARM_UP"] = "lazy"
+    return env
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us)] from -X importtime output, top-level imports last."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|", 2))
+        rows.append((name, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def profile_import():
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=BACKEND_DIR, env=child_env(), capture_output=True, text=True,
+    )
+    wall_s = time.perf_counter() - started
+    rows = parse_importtime(proc.stderr)
+    if proc.returncode != 0:
+        errors = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")]
+        raise SystemExit("import app failed:\n" + "\n".join(errors[-20:]))
+    return {
+        "wall_s": round(wall_s, 3),
+        "modules": len(rows),
+        "total_self_s": round(sum(r[1] for r in rows) / 1e6, 3),
+        # Nested names are indented by -X importtime; keep the raw name for grouping.
+        "top": [{"module": name.strip(), "depth": (len(name) - len(name.lstrip())) // 2,
+                 "self_ms": round(self_us / 1000.0, 1), "cumulative_ms": round(cum_us / 1000.0, 1)}
+                for name, self_us, cum_us in sorted(rows, key=lambda r: r[2], reverse=True)],
+        "heavy_loaded": sorted({name.strip().split(".")[0] for name, _, _ in rows}
+                               & {"torch", "torchvision", "cv2", "google", "gdown", "numpy", "PIL"}),
+    }
+
+
+def profile_warm_up():
+    proc = subprocess.run([sys.executable, "-c", WARM_UP_SCRIPT], cwd=BACKEND_DIR, env=child_env(),
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit("warm-up failed:\n" + proc.stderr[-2000:])
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=25, help="modules to list")
+    parser.add_argument("--warm-up", action="store_true", help="also time app.warm_up() per resource")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    report = profile_import()
+    print(f"import app: {report['wall_s']:.3f}s wall, {report['modules']} modules, "
+          f"{report['total_self_s']:.3f}s in module bodies")
+    print(f"heavy packages imported: {', '.join(report['heavy_loaded']) or 'none'}")
+    print(f"top {args.top} by cumulative import time (ms)")
+    for row in report["top"][:args.top]:
+        print(f"  {row['cumulative_ms']:9.1f}  self {row['self_ms']:8.1f}  {'  ' * row['depth']}{row['module']}")
+
+    if args.warm_up:
+        report["warm_up"] = profile_warm_up()
+        print("warm-up (s)")
+        for name, seconds in report["warm_up"]["warm_up_s"].items():
+            print(f"  {name:20} {seconds:.3f}")
+
+    if args.json:
+        report["top"] = report["top"][:args.top]
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
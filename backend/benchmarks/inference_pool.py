@@ -0,0 +1,167 @@
+"""Smoke run and throughput benchmark of the out-of-process inference pool.
+
+    python -m benchmarks.inference_pool [--replicas 1 2 --threads 2 --clients 8 --requests 400]
+
+For each replica count, writes a random-weight SkinDiseaseCNN (benchmarks/fakes.py)
+to a temporary directory, starts `python inference_pool.py` on it, connects an
+InferencePoolClient the way a web worker does (reading the pool's authkey) and
+sends --requests preprocessed tensors from --clients threads. Checks that the
+socket directory is private and that every request got one of CLASS_NAMES back,
+then reports images per second and latency percentiles. The same load through an
+in-process InferenceBatcher is measured first as the baseline.
+"""
+import argparse
+import json
+import os
+import stat
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+
+def wait_for_replicas(socket_dir, replicas, process, timeout=120.0):
+    from inference_pool import authkey_path, replica_address
+
+    paths = [replica_address(socket_dir, index) for index in range(replicas)] + [authkey_path(socket_dir)]
+    deadline = time.monotonic() + timeout
+    while not all(os.path.exists(path) for path in paths):
+        if process.poll() is not None:
+            raise SystemExit(f"inference pool exited with status {process.returncode}")
+        if time.monotonic() > deadline:
+            raise SystemExit(f"inference pool not listening in {socket_dir} after {timeout}s")
+        time.sleep(0.1)
+
+
+def run_load(submit, class_names, clients, requests):
+    """Send `requests` tensors from `clients` threads; returns (elapsed seconds, latencies in ms)."""
+    import torch
+
+    latencies, errors, lock = [], [], threading.Lock()
+    per_client = [requests // clients + (i < requests % clients) for i in range(clients)]
+
+    def client(count, seed):
+        generator = torch.Generator().manual_seed(seed)
+        for _ in range(count):
+            tensor = torch.rand((1, 3, 224, 224), generator=generator) * 2 - 1
+            started = time.perf_counter()
+            try:
+                prediction = submit(tensor)
+                if prediction["disease"] not in class_names:
+                    raise ValueError(f"unexpected prediction {prediction!r}")
+            except Exception as exc:
+                with lock:
+                    errors.append(repr(exc))
+                continue
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000.0)
+
+    threads = [threading.Thread(target=client, args=(count, seed)) for seed, count in enumerate(per_client)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise SystemExit(f"{len(errors)} of {requests} requests failed, first: {errors[0]}")
+    return time.perf_counter() - started, latencies
+
+
+def summarize(label, elapsed, latencies):
+    ordered = sorted(latencies)
+    return {
+        "label": label,
+        "requests": len(ordered),
+        "images_per_s": round(len(ordered) / elapsed, 1),
+        "p50_ms": round(statistics.median(ordered), 2),
+        "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))], 2),
+        "max_ms": round(ordered[-1], 2),
+    }
+
+
+def run_baseline(model_path, args):
+    import torch
+
+    from batching import InferenceBatcher
+    from skin_model import CLASS_NAMES, load_model
+
+    model = load_model(model_path, torch.device("cpu"), backend=args.backend, num_classes=len(CLASS_NAMES))
+    batcher = InferenceBatcher(model, CLASS_NAMES, max_batch_size=args.max_batch, max_wait_ms=args.max_wait_ms)
+    batcher.submit(torch.zeros((1, 3, 224, 224)))
+    elapsed, latencies = run_load(batcher.submit, CLASS_NAMES, args.clients, args.requests)
+    return summarize("in-process", elapsed, latencies)
+
+
+def run_pool(replicas, model_path, workdir, args):
+    from inference_pool import InferencePoolClient
+    from skin_model import CLASS_NAMES
+
+    socket_dir = os.path.join(workdir, f"pool-{replicas}")
+    threads = args.threads or max(1, (os.cpu_count() or 2) // replicas)
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "inference_pool.py"), "--socket-dir", socket_dir,
+         "--replicas", str(replicas), "--threads", str(threads), "--model", model_path, "--backend", args.backend,
+         "--max-batch", str(args.max_batch), "--max-wait-ms", str(args.max_wait_ms)],
+        cwd=workdir, stdout=subprocess.DEVNULL,
+        env={k: v for k, v in os.environ.items() if k not in ("MODEL_URL", "MODEL_SHA256")})
+    try:
+        wait_for_replicas(socket_dir, replicas, process)
+        mode = stat.S_IMODE(os.stat(socket_dir).st_mode)
+        if mode != 0o700:
+            raise SystemExit(f"socket directory {socket_dir} has mode {mode:o}, expected 700")
+        client = InferencePoolClient(socket_dir, slots=args.clients, timeout=60.0)
+        try:
+            if len(client.stats()["replicas"]) != replicas:
+                raise SystemExit(f"expected {replicas} replicas in {socket_dir}")
+            elapsed, latencies = run_load(client.submit, CLASS_NAMES, args.clients, args.requests)
+        finally:
+            client.close()
+    finally:
+        process.terminate()
+        process.wait()
+    return dict(summarize(f"pool x{replicas}", elapsed, latencies), replicas=replicas, threads=threads)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replicas", type=int, nargs="+", default=[1, 2], help="replica counts to compare")
+    parser.add_argument("--threads", type=int, help="torch threads per replica (default: cores / replicas)")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent submitting threads")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--backend", default="fp32", help="fp32, bf16 or int8")
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--output", help="results file (default: benchmarks/results/inference-pool-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    from benchmarks.fakes import write_random_model
+
+    rounds = []
+
+    def report(result):
+        rounds.append(result)
+        print(f"{result['label']:>12} {result['images_per_s']:>9.1f} {result['p50_ms']:>8.2f} "
+              f"{result['p95_ms']:>8.2f} {result['max_ms']:>8.2f}", flush=True)
+
+    print(f"{'path':>12} {'images/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    with tempfile.TemporaryDirectory(prefix="adermis-pool-") as workdir:
+        model_path = write_random_model(workdir)
+        report(run_baseline(model_path, args))
+        for replicas in args.replicas:
+            report(run_pool(replicas, model_path, workdir, args))
+
+    output = os.path.abspath(args.output or os.path.join(
+        RESULTS_DIR, f"inference-pool-{time.strftime('%Y%m%d-%H%M%S')}.json"))
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "config": vars(args), "rounds": rounds}, f, indent=2)
+    print(f"wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""End-to-end benchmark of the diagnosis pipeline, without network access.
+
+    python -m benchmarks.pipeline [--llm-latency 0.3 --maps-latency 0.05 --concurrency 8 --requests 200]
+    python -m benchmarks.pipeline --compare benchmarks/results/pipeline-20250101-120000.json
+
+app.py is imported inside a scratch directory holding a randomly initialised
+SkinDiseaseCNN, with Gemini replaced by llm_client.FakeBackend and the Maps API
+by a local stand-in server (benchmarks/fakes.py). The LLM, Maps and prediction
+caches are off unless --caches is given, so every request pays for its backends.
+
+Reports per-stage microbenchmarks (decode, preprocess, forward pass, JSON
+parse) and a concurrent load run of /api/analyze, /api/final-diagnosis,
+/api/find_clinics and predict_disease_from_image (throughput, p50/p95/p99).
+Results are written as JSON; --compare prints the change against an earlier run.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(q / 100.0 * (len(sorted_values) - 1))))]
+
+
+def summarize(samples_ms):
+    ordered = sorted(samples_ms)
+    return {
+        "n": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+        "min_ms": round(ordered[0], 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50), 3),
+        "p95_ms": round(percentile(ordered, 95), 3),
+        "p99_ms": round(percentile(ordered, 99), 3),
+    }
+
+
+# ------------------- Environment -------------------
+def load_app(workdir, args, maps_base_url):
+    """Import app.py against the offline stand-ins; returns the module."""
+    from benchmarks.fakes import write_random_model
+
+    write_random_model(workdir)
+    settings = {
+        "MODEL_OFFLINE": "1",
+        # Resources are loaded by an explicit app.warm_up() so import and warm-up are timed apart.
+        "WARM_UP": "lazy",
+        "LLM_BACKEND": "fake",
+        "LLM_FAKE_LATENCY": str(args.llm_latency),
+        "LLM_CACHE_PATH": os.path.join(workdir, "cache", "llm_cache.sqlite3"),
+        "GOOGLE_MAPS_API_KEY": "benchmark",
+        "MAPS_API_BASE": maps_base_url,
+        # Admission control is sized for the free Gemini tier; don't let it shape the numbers.
+        "LLM_RATE_PER_SEC": "100000",
+        "LLM_BURST": "100000",
+        "LLM_MAX_CONCURRENCY": str(max(8, args.concurrency * 4)),
+    }
+    if not args.caches:
+        settings.update({"LLM_CACHE": "0", "MAPS_CACHE_TTL": "0", "PREDICTION_CACHE_SIZE": "0"})
+    for key, value in settings.items():
+        os.environ.setdefault(key, value)
+
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    os.chdir(workdir)  # app.py resolves model/ and cache/ relative to the working directory
+    import app
+    return app
+
+
+# ------------------- Microbenchmarks -------------------
+def time_calls(fn, repeat, warmup=3):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000.0)
+    return summarize(samples)
+
+
+def run_microbenchmarks(app, jpeg, repeat):
+    import torch
+
+    from llm_client import FakeBackend
+
+    preprocessor = app.image_preprocessor
+    decoded = preprocessor.decode(jpeg)
+    single = preprocessor.new_batch(1)
+    cnn = app.cnn.get()
+    batch_size = app.inference_batcher.get().max_batch_size
+    batch = preprocessor.new_batch(batch_size).to(cnn.device)
+    llm_json = FakeBackend.default_response("Return JSON format:")
+
+    def forward(inputs):
+        with torch.inference_mode():
+            cnn.model(inputs)
+
+    results = {
+        "decode": time_calls(lambda: preprocessor.decode(jpeg), repeat),
+        "normalize": time_calls(lambda: preprocessor.normalize_into(decoded, single[0]), repeat),
+        "preprocess": time_calls(lambda: preprocessor(jpeg, out=single), repeat),
+        "forward_batch1": time_calls(lambda: forward(single.to(cnn.device)), repeat),
+        f"forward_batch{batch_size}": time_calls(lambda: forward(batch), repeat),
+        "json_parse": time_calls(lambda: json.loads(llm_json), repeat * 10),
+        "predict_disease_from_image": time_calls(lambda: app.predict_disease_from_image(io.BytesIO(jpeg)), repeat),
+    }
+    results[f"forward_batch{batch_size}"]["per_image_ms"] = round(
+        results[f"forward_batch{batch_size}"]["mean_ms"] / batch_size, 3)
+    return results
+
+
+# ------------------- Load Generator -------------------
+def scenarios(app, jpeg):
+    """name -> callable(client) returning an HTTP status code."""
+    diagnosis_body = {
+        "predictions": [{"disease": "Eczema", "score": 0.8}, {"disease": "Psoriasis", "score": 0.6}],
+        "user_answers": {"How long have you had the symptoms?": "Two weeks"},
+    }
+
+    def analyze(client):
+        data = {"description": "Itchy red patches on both elbows", "image": (io.BytesIO(jpeg), "lesion.jpg")}
+        return client.post("/api/analyze", data=data, content_type="multipart/form-data").status_code
+
+    def final_diagnosis(client):
+        return client.post("/api/final-diagnosis", json=diagnosis_body).status_code
+
+    def find_clinics(client):
+        return client.post("/api/find_clinics", json={"location": {"lat": 18.52, "lng": 73.85}, "range": 5}).status_code
+
+    def predict_image(client):
+        app.predict_disease_from_image(io.BytesIO(jpeg))
+        return 200
+
+    return {
+        "/api/analyze": analyze,
+        "/api/final-diagnosis": final_diagnosis,
+        "/api/find_clinics": find_clinics,
+        "predict_disease_from_image": predict_image,
+    }
+
+
+def run_load(app, call, total, concurrency):
+    """Issue `total` calls from `concurrency` threads as fast as they complete."""
+    local = threading.local()
+
+    def one(_):
+        # One test client per worker thread, like one keep-alive connection per user.
+        if not hasattr(local, "client"):
+            local.client = app.app.test_client()
+        client = local.client
+        started = time.perf_counter()
+        try:
+            status = call(client)
+        except Exception:
+            status = None
+        return (time.perf_counter() - started) * 1000.0, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    errors = sum(1 for _, status in outcomes if status is None or status >= 400)
+    result = summarize([ms for ms, _ in outcomes])
+    result.update({
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "errors": errors,
+    })
+    return result
+
+
+# ------------------- Results -------------------
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous):
+    for section in ("micro", "load"):
+        for name, now in current.get(section, {}).items():
+            before = previous.get(section, {}).get(name)
+            if not before:
+                continue
+            deltas = []
+            for key in ("p50_ms", "p99_ms", "throughput_rps"):
+                if before.get(key):
+                    deltas.append(f"{key} {before[key]:.2f} -> {now[key]:.2f} ({(now[key] / before[key] - 1) * 100:+.1f}%)")
+            print(f"  {section:5} {name:30} " + "  ".join(deltas))
+
+
+def print_report(results):
+    print("microbenchmarks (ms)")
+    for name, stats in results["micro"].items():
+        print(f"  {name:30} p50 {stats['p50_ms']:9.3f}  p95 {stats['p95_ms']:9.3f}  p99 {stats['p99_ms']:9.3f}")
+    print(f"load (concurrency {results['config']['concurrency']}, {results['config']['requests']} requests each)")
+    for name, stats in results["load"].items():
+        print(f"  {name:30} {stats['throughput_rps']:8.1f} req/s  p50 {stats['p50_ms']:8.1f}  "
+              f"p95 {stats['p95_ms']:8.1f}  p99 {stats['p99_ms']:8.1f} ms  errors {stats['errors']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds per fake Gemini call")
+    parser.add_argument("--maps-latency", type=float, default=0.05, help="seconds per stand-in Maps call")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="requests per load scenario")
+    parser.add_argument("--repeat", type=int, default=30, help="iterations per microbenchmark")
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--caches", action="store_true", help="keep the LLM, Maps and prediction caches on")
+    parser.add_argument("--scenario", action="append", help="only run these load scenarios (repeatable)")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/pipeline-<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output or os.path.join(
+        RESULTS_DIR, time.strftime("pipeline-%Y%m%d-%H%M%S.json")))
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+    from benchmarks.fakes import MapsStandIn
+    from benchmarks.preprocess import synthetic_jpeg
+
+    jpeg = synthetic_jpeg(args.width, args.height)
+    with tempfile.TemporaryDirectory(prefix="adermis-bench-") as workdir, \
+            MapsStandIn(latency=args.maps_latency) as maps:
+        started = time.perf_counter()
+        app = load_app(workdir, args, maps.base_url)
+        import_s = time.perf_counter() - started
+        warm_up_s = app.warm_up()
+
+        micro = run_microbenchmarks(app, jpeg, args.repeat)
+        load = {}
+        for name, call in scenarios(app, jpeg).items():
+            if args.scenario and name not in args.scenario:
+                continue
+            call(app.app.test_client())  # warm up
+            load[name] = run_load(app, call, args.requests, args.concurrency)
+
+        import torch
+        results = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": git_commit(),
+            "platform": {"python": platform.python_version(), "torch": torch.__version__,
+                         "machine": platform.machine(), "cpus": os.cpu_count(),
+                         "torch_threads": torch.get_num_threads()},
+            "config": dict(vars(args), image_bytes=len(jpeg), app_import_s=round(import_s, 3),
+                           warm_up_s=warm_up_s,
+                           model_backend=os.getenv("MODEL_BACKEND", "fp32")),
+            "micro": micro,
+            "load": load,
+            "stats": {"inference": app.inference_batcher.get().stats(), "llm": app.llm_client.get().stats(),
+                      "maps": app.places_client.stats(),
+                      "prediction_cache": app.prediction_cache.stats(), "maps_server_requests": dict(maps.requests)},
+        }
+
+    print_report(results)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"wrote {output}")
+    if previous:
+        print(f"compared with {args.compare} ({previous.get('git_commit')})")
+        compare(results, previous)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Micro-benchmark: legacy torchvision preprocessing vs. preprocessing.ImagePreprocessor.
+
+    python -m benchmarks.preprocess [--width 4032 --height 3024 --repeat 20] [image ...]
+
+Without image arguments a synthetic phone-sized JPEG is generated in memory.
+Reports per-image latency of both paths and the difference between the model
+inputs they produce. Exits non-zero if the mean absolute difference for any
+image exceeds --tolerance (normalized units; inputs span [-1, 1]).
+"""
+import argparse
+import io
+import statistics
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision import transforms
+
+from preprocessing import ImagePreprocessor
+
+
+def legacy_preprocess(image):
+    # The pre-existing app.py path: pipeline rebuilt per call, full-resolution decode.
+    transform = transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])
+    ])
+    img = Image.open(image).convert("RGB")
+    return transform(img).unsqueeze(0)
+
+
+def synthetic_jpeg(width, height, quality=90):
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    rgb = np.stack([
+        128 + 90 * np.sin(x / 97.0) * np.cos(y / 131.0),
+        128 + 70 * np.cos((x + y) / 211.0),
+        128 + 60 * np.sin(y / 53.0),
+    ], axis=-1)
+    rgb += np.random.default_rng(0).normal(0, 12, rgb.shape)
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8)).save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def time_path(fn, payload, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(io.BytesIO(payload))
+        samples.append((time.perf_counter() - started) * 1000.0)
+    return statistics.median(samples), min(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="largest mean absolute input difference accepted per image")
+    args = parser.parse_args(argv)
+
+    payloads = [(path, open(path, "rb").read()) for path in args.images]
+    if not payloads:
+        payloads = [(f"synthetic {args.width}x{args.height} JPEG", synthetic_jpeg(args.width, args.height))]
+
+    preprocessor = ImagePreprocessor()
+    out = torch.empty((1, 3, 224, 224))
+    drifted = []
+    for name, payload in payloads:
+        legacy_median, legacy_min = time_path(legacy_preprocess, payload, args.repeat)
+        fast_median, fast_min = time_path(lambda f: preprocessor(f, out=out), payload, args.repeat)
+        diff = (legacy_preprocess(io.BytesIO(payload)) - preprocessor(io.BytesIO(payload))).abs()
+        print(name)
+        print(f"  legacy: median {legacy_median:.2f} ms  min {legacy_min:.2f} ms")
+        print(f"  fast:   median {fast_median:.2f} ms  min {fast_min:.2f} ms  ({legacy_median / fast_median:.1f}x)")
+        print(f"  input difference: max {diff.max().item():.4f}  mean {diff.mean().item():.4f} (normalized units)")
+        if diff.mean().item() > args.tolerance:
+            drifted.append(name)
+    if drifted:
+        raise SystemExit(f"fast path drifted beyond mean difference {args.tolerance} on: {', '.join(drifted)}")
+
+
+if __name__ == "__main__":
+    main()
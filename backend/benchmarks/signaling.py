@@ -0,0 +1,173 @@
+"""Load test of Socket.IO room signaling relayed between workers by the local broker.
+
+    python -m benchmarks.signaling [--workers 1 2 4 --rooms 16 --clients-per-room 4 --messages 200]
+
+For each worker count, starts `python signaling.py broker` and that many app
+processes (socketio.run, SIGNALING_QUEUE=local://...), then connects
+rooms x clients-per-room python-socketio clients from several client
+processes. A room's clients are spread over different workers, so every
+delivery beyond the sender's own worker has gone through the broker. Each
+client sends --messages binary `signal` events to its room. The test reports
+sent and delivered messages per second and the share of expected deliveries
+that arrived. Needs python-socketio's client (`pip install "python-socketio[client]"`).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+WORKER_SCRIPT = """
+import sys
+import app
+app.socketio.run(app.app, host="127.0.0.1", port=int(sys.argv[1]), allow_unsafe_werkzeug=True)
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit(f"nothing listening on port {port} after {timeout}s")
+
+
+def start_cluster(workers, workdir):
+    broker_port = free_port()
+    authkey = os.environ.get("SIGNALING_AUTHKEY") or os.urandom(16).hex()
+    processes = [subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, "signaling.py"), "broker",
+                                   "--port", str(broker_port), "--stats-every", "0"],
+                                  env=dict(os.environ, SIGNALING_AUTHKEY=authkey), stdout=subprocess.DEVNULL)]
+    wait_for_port(broker_port)
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, SIGNALING_QUEUE=f"local://127.0.0.1:{broker_port}",
+               SIGNALING_AUTHKEY=authkey, LLM_BACKEND="fake", WARM_UP="lazy", SESSION_BACKEND="memory",
+               LLM_CACHE="0")
+    ports = [free_port() for _ in range(workers)]
+    for port in ports:
+        processes.append(subprocess.Popen([sys.executable, "-c", WORKER_SCRIPT, str(port)], cwd=workdir, env=env,
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    for port in ports:
+        wait_for_port(port)
+    return processes, ports
+
+
+# ------------------- Client Processes -------------------
+def run_clients(specs, args, barrier, results):
+    """specs: [(room, port)]; one python-socketio client per spec."""
+    import socketio
+
+    payload = os.urandom(args.payload_bytes)
+    expected = (args.clients_per_room - 1) * args.messages
+    clients, received = [], [0] * len(specs)
+    for index, (room, port) in enumerate(specs):
+        client = socketio.Client(reconnection=False)
+
+        def on_signal(data, index=index):
+            received[index] += 1
+
+        client.on("signal", on_signal)
+        client.connect(f"http://127.0.0.1:{port}", wait_timeout=10)
+        client.emit("join", {"room": room})
+        clients.append((client, room))
+
+    time.sleep(0.5)  # let every join land before anyone sends
+    barrier.wait()
+    started = time.time()
+    for _ in range(args.messages):
+        for client, room in clients:
+            client.emit("signal", {"room": room, "signalData": payload})
+    sent_at = time.time()
+    deadline = time.monotonic() + args.timeout
+    while sum(received) < expected * len(specs) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    finished = time.time()
+    for client, _ in clients:
+        client.disconnect()
+    results.put({"started": started, "sent_at": sent_at, "finished": finished,
+                 "sent": args.messages * len(specs), "received": sum(received),
+                 "expected": expected * len(specs)})
+
+
+def run_round(workers, args):
+    with tempfile.TemporaryDirectory(prefix="adermis-signaling-") as workdir:
+        processes, ports = start_cluster(workers, workdir)
+        try:
+            specs = [(f"room-{r}", ports[(r + c) % workers])
+                     for r in range(args.rooms) for c in range(args.clients_per_room)]
+            groups = [specs[i::args.client_procs] for i in range(args.client_procs)]
+            groups = [g for g in groups if g]
+            barrier, results = multiprocessing.Barrier(len(groups)), multiprocessing.Queue()
+            procs = [multiprocessing.Process(target=run_clients, args=(g, args, barrier, results)) for g in groups]
+            for proc in procs:
+                proc.start()
+            reports = [results.get(timeout=args.timeout + 60) for _ in procs]
+            for proc in procs:
+                proc.join()
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait()
+
+    started = min(r["started"] for r in reports)
+    sent = sum(r["sent"] for r in reports)
+    received = sum(r["received"] for r in reports)
+    expected = sum(r["expected"] for r in reports)
+    elapsed = max(r["finished"] for r in reports) - started
+    return {
+        "workers": workers,
+        "clients": len(specs),
+        "sent": sent,
+        "received": received,
+        "delivered_ratio": round(received / expected, 4) if expected else 0.0,
+        "sent_per_s": round(sent / (max(r["sent_at"] for r in reports) - started), 1),
+        "delivered_per_s": round(received / elapsed, 1),
+        "elapsed_s": round(elapsed, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="app worker counts to compare")
+    parser.add_argument("--rooms", type=int, default=16)
+    parser.add_argument("--clients-per-room", type=int, default=4)
+    parser.add_argument("--messages", type=int, default=200, help="signals sent by each client")
+    parser.add_argument("--payload-bytes", type=int, default=512, help="binary signalData size")
+    parser.add_argument("--client-procs", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for deliveries")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/signaling-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    rounds = []
+    print(f"{'workers':>7} {'clients':>7} {'sent/s':>10} {'delivered/s':>12} {'delivered':>10}")
+    for workers in args.workers:
+        result = run_round(workers, args)
+        rounds.append(result)
+        print(f"{result['workers']:>7} {result['clients']:>7} {result['sent_per_s']:>10.1f} "
+              f"{result['delivered_per_s']:>12.1f} {result['delivered_ratio']:>10.1%}", flush=True)
+
+    output = os.path.abspath(args.output or os.path.join(
+        RESULTS_DIR, f"signaling-{time.strftime('%Y%m%d-%H%M%S')}.json"))
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "config": vars(args), "rounds": rounds}, f, indent=2)
+    print(f"wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Append-only, memory-mappable store for retrieval chunk text.
+
+A corpus is two files next to its FAISS index:
+
+* ``<corpus>_chunks.bin``: every chunk's UTF-8 text, back to back
+* ``<corpus>_chunks.idx``: little-endian uint64 offsets, one more than there are chunks
+
+Opening a store maps both files; a chunk is decoded only when it is read, so
+loading costs nothing like unpickling the whole list did. Chunk i belongs to
+vector i of the index.
+
+``<corpus>_generation.json`` stamps a matching pair: the SHA-256 of the index
+and of both store files, written by ingest.py after each change. A reader
+refuses an index and store that do not match their stamp, e.g. while a
+rebuild is moving its files into place.
+"""
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+
+_OFFSET_DTYPE = np.dtype("<u8")
+
+
+def store_paths(index_dir, corpus):
+    base = os.path.join(index_dir, f"{corpus}_chunks")
+    return base + ".bin", base + ".idx"
+
+
+class ChunkStore:
+    def __init__(self, index_dir, corpus):
+        self.bin_path, self.idx_path = store_paths(index_dir, corpus)
+        self._offsets = np.memmap(self.idx_path, dtype=_OFFSET_DTYPE, mode="r")
+        size = os.path.getsize(self.bin_path)
+        self._data = np.memmap(self.bin_path, dtype=np.uint8, mode="r") if size else np.zeros(0, np.uint8)
+
+    @staticmethod
+    def exists(index_dir, corpus):
+        return all(os.path.exists(p) for p in store_paths(index_dir, corpus))
+
+    def __len__(self):
+        return max(len(self._offsets) - 1, 0)
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return self._data[start:end].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+def append_chunks(index_dir, corpus, texts):
+    """Append texts to the store and return the ids they were given.
+
+    The text file is appended in place (bytes past the last offset are ignored),
+    then the offset file is swapped in atomically, so readers never see a
+    partially written chunk.
+    """
+    bin_path, idx_path = store_paths(index_dir, corpus)
+    offsets = np.fromfile(idx_path, dtype=_OFFSET_DTYPE) if os.path.exists(idx_path) else np.zeros(1, _OFFSET_DTYPE)
+    first_id = len(offsets) - 1
+
+    new_offsets = []
+    with open(bin_path, "ab") as f:
+        f.truncate(int(offsets[-1]))
+        position = int(offsets[-1])
+        for text in texts:
+            encoded = text.encode("utf-8")
+            f.write(encoded)
+            position += len(encoded)
+            new_offsets.append(position)
+        f.flush()
+        os.fsync(f.fileno())
+
+    tmp_path = f"{idx_path}.tmp.{os.getpid()}"
+    np.concatenate([offsets, np.asarray(new_offsets, dtype=_OFFSET_DTYPE)]).tofile(tmp_path)
+    os.replace(tmp_path, idx_path)
+    return list(range(first_id, first_id + len(new_offsets)))
+
+
+def truncate_chunks(index_dir, corpus, count):
+    """Keep only the first `count` chunks."""
+    _, idx_path = store_paths(index_dir, corpus)
+    offsets = np.fromfile(idx_path, dtype=_OFFSET_DTYPE)
+    if len(offsets) - 1 <= count:
+        return
+    tmp_path = f"{idx_path}.tmp.{os.getpid()}"
+    offsets[:count + 1].tofile(tmp_path)
+    os.replace(tmp_path, idx_path)
+
+
+def migrate_pickle(index_dir, corpus):
+    """Convert a legacy <corpus>_chunks.pkl list into the mapped store (ids unchanged)."""
+    with open(os.path.join(index_dir, f"{corpus}_chunks.pkl"), "rb") as f:
+        texts = pickle.load(f)
+    for path in store_paths(index_dir, corpus):
+        if os.path.exists(path):
+            os.remove(path)
+    append_chunks(index_dir, corpus, texts)
+    return len(texts)
+
+
+# ------------------- Generation Stamp -------------------
+def generation_path(index_dir, corpus):
+    return os.path.join(index_dir, f"{corpus}_generation.json")
+
+
+def _generation_files(index_dir, corpus):
+    return (os.path.join(index_dir, f"{corpus}_index.faiss"),) + store_paths(index_dir, corpus)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_generation(index_dir, corpus):
+    """Stamp the index and chunk store currently in `index_dir` as one generation."""
+    stamp = {os.path.basename(p): _sha256(p) for p in _generation_files(index_dir, corpus)}
+    path = generation_path(index_dir, corpus)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump(stamp, f, indent=2)
+    os.replace(tmp_path, path)
+    return stamp
+
+
+def check_generation(index_dir, corpus):
+    """The corpus's stamp, or None if it has none (legacy pickle layout).
+
+    Raises ValueError if the index or chunk store on disk is not the stamped one.
+    """
+    try:
+        with open(generation_path(index_dir, corpus)) as f:
+            stamp = json.load(f)
+    except FileNotFoundError:
+        return None
+    for path in _generation_files(index_dir, corpus):
+        name = os.path.basename(path)
+        if not os.path.exists(path) or stamp.get(name) != _sha256(path):
+            raise ValueError(f"{name} does not match {os.path.basename(generation_path(index_dir, corpus))}; "
+                             "an ingest is in progress or was interrupted")
+    return stamp
+
+
+def load_chunks(index_dir, corpus):
+    """Mapped store if present, otherwise the legacy pickle."""
+    if ChunkStore.exists(index_dir, corpus):
+        return ChunkStore(index_dir, corpus)
+    with open(os.path.join(index_dir, f"{corpus}_chunks.pkl"), "rb") as f:
+        return pickle.load(f)
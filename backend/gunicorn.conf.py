@@ -0,0 +1,31 @@
+import os
+
+# With MODEL_WEIGHTS_MODE=preload the app (and the model) is imported once in the
+# master and forked workers share the weight pages copy-on-write.
+preload_app = os.getenv("MODEL_WEIGHTS_MODE") == "preload" or os.getenv("GUNICORN_PRELOAD") == "1"
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        from shared_weights import prepare_for_fork
+
+        prepare_for_fork()
+
+
+def post_worker_init(worker):
+    # The worker has loaded the app: start WARM_UP=background here rather than in the master.
+    from app import start_background_warm_up
+
+    start_background_warm_up()
+
+    # Imported here so the master (without preload) never imports torch.
+    from shared_weights import memory_report
+
+    report = memory_report()
+    worker.log.info(
+        "worker %s memory: rss=%s MB shared=%s MB private=%s MB",
+        report["pid"],
+        report.get("rss_mb", report.get("vmrss_mb")),
+        round(report.get("shared_clean_mb", 0) + report.get("shared_dirty_mb", 0), 1),
+        round(report.get("private_clean_mb", 0) + report.get("private_dirty_mb", 0), 1),
+    )
@@ -5,11 +5,10 @@ import warnings
 import streamlit as st
 from dotenv import load_dotenv
 import torch
-import torch.nn as nn
-from torchvision import transforms
-from PIL import Image
 import google.generativeai as genai
 import re
+from skin_model import load_model
+from preprocessing import ImagePreprocessor
 
 # ------------------- Streamlit & Core Setup -------------------
 st.set_page_config(
@@ -24,62 +23,29 @@ warnings.filterwarnings("ignore")
 load_dotenv()
 
 # ------------------- Load Trained Model -------------------
-class SkinDiseaseCNN(nn.Module):
-    def __init__(self, num_classes=11):
-        super(SkinDiseaseCNN, self).__init__()
-        self.conv_layers = nn.Sequential(
-            nn.Conv2d(3, 32, kernel_size=3, stride=1, padding=1),
-            nn.ReLU(),
-            nn.MaxPool2d(kernel_size=2, stride=2),
-            nn.Conv2d(32, 64, kernel_size=3, stride=1, padding=1),
-            nn.ReLU(),
-            nn.MaxPool2d(kernel_size=2, stride=2),
-            nn.Conv2d(64, 128, kernel_size=3, stride=1, padding=1),
-            nn.ReLU(),
-            nn.MaxPool2d(kernel_size=2, stride=2)
-        )
-        self.fc_layers = nn.Sequential(
-            nn.Flatten(),
-            nn.Linear(128 * 28 * 28, 512),
-            nn.ReLU(),
-            nn.Dropout(0.5),
-            nn.Linear(512, num_classes)
-        )
-
-    def forward(self, x):
-        x = self.conv_layers(x)
-        x = self.fc_layers(x)
-        return x
-
 @st.cache_resource
-def load_trained_model(model_path="skin_disease_model.pth", num_classes=11):
-    """Load the trained model with saved weights."""
+def load_trained_model(model_path="skin_disease_model.pth", num_classes=11, backend=None):
+    """Load the trained model with saved weights on the selected inference backend."""
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     
     if not os.path.exists(model_path):
         st.error(f"Model file '{model_path}' not found. Please upload it.")
         st.stop()
 
-    model = SkinDiseaseCNN(num_classes=num_classes)
-    model.load_state_dict(torch.load(model_path, map_location=device))
-    model.to(device)
-    model.eval()
-    
+    backend = backend or os.getenv("MODEL_BACKEND", "fp32")
+    model = load_model(model_path, device, backend=backend, num_classes=num_classes)
+
     return model, device
 
 # Load model
 model, device = load_trained_model()
 
 # ------------------- Image Preprocessing -------------------
+image_preprocessor = ImagePreprocessor()
+
 def preprocess_image(image):
     """Preprocess the uploaded image before passing it to the model."""
-    transform = transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])
-    ])
-    img = Image.open(image).convert("RGB")
-    return transform(img).unsqueeze(0).to(device)
+    return image_preprocessor(image).to(device)
 
 # ------------------- Class Labels -------------------
 CLASS_NAMES = [
@@ -0,0 +1,49 @@
+"""Perceptual (difference) hashes for telling whether two images show the same scene.
+
+dHash: shrink to 9x8 grayscale and record, per row, whether each pixel is
+brighter than its right-hand neighbour. Similar images give hashes a few bits
+apart; the Hamming distance between two hashes measures how much changed.
+"""
+import io
+
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8
+
+
+def dhash(img, hash_size=HASH_SIZE):
+    """64-bit (for hash_size=8) difference hash of a PIL image."""
+    small = np.asarray(img.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def frame_dhash(frame, hash_size=HASH_SIZE):
+    """dHash of JPEG/PNG bytes or an HxWx3 uint8 ndarray, decoding as little as possible."""
+    if isinstance(frame, np.ndarray):
+        img = Image.fromarray(np.ascontiguousarray(frame))
+        factor = min(img.size) // (hash_size * 4)
+        if factor >= 2:
+            img = img.reduce(factor)
+        # Channel order only shifts the gray weights slightly; good enough to detect change.
+        return dhash(img, hash_size)
+    img = Image.open(io.BytesIO(frame))
+    img.draft("L", (hash_size * 4, hash_size * 4))
+    return dhash(img, hash_size)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def thumbnail(rgb, size=32):
+    """Block-averaged size x size copy of an HxWx3 uint8 image (H, W multiples of size), as float32."""
+    array = np.asarray(rgb, dtype=np.float32)
+    height, width = array.shape[:2]
+    return array.reshape(size, height // size, size, width // size, -1).mean(axis=(1, 3))
+
+
+def thumbnail_mse(a, b):
+    """Mean squared error between two thumbnails (0-255 scale)."""
+    return float(np.mean(np.square(a - b)))
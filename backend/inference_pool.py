@@ -0,0 +1,472 @@
+"""Out-of-process SkinDiseaseCNN replicas, pinned to cores, fed over shared memory.
+
+    python inference_pool.py --replicas 2 --threads 4 --cpus 0-7 --socket-dir /tmp/adermis-pool
+    INFERENCE_POOL=/tmp/adermis-pool gunicorn app:app
+
+Each replica is a separate process restricted (sched_setaffinity) to its own
+set of cores, with torch limited to that many intra-op threads, so replicas
+never oversubscribe the CPU and web workers keep the remaining cores for
+request handling. A replica runs the usual InferenceBatcher, so requests from
+every web worker share its forward passes, and listens on its own Unix socket
+`<socket-dir>/replica-<n>.sock`.
+
+A web worker (InferencePoolClient) opens one connection per replica and one
+shared-memory block per connection with `slots` input tensors. To score an
+image it copies the preprocessed tensor into a free slot and sends only the
+slot number; the replica scores a tensor view of that slot in place and
+replies with the prediction. Tensors are never pickled. The client has the
+InferenceBatcher interface (submit, submit_async, stats, ...), so app.py uses
+it in place of an in-process batcher. Web concurrency (gunicorn workers) and
+model throughput (replicas x threads) are then sized independently.
+
+The replicas read the weights the app fetched (model/skin_disease_model.pth);
+set MODEL_URL to let the pool download them itself.
+
+Messages on the sockets are pickled, so only the pool's own user may connect:
+the socket directory is created (or tightened) to mode 0700, and each pool run
+generates a random key, written to `<socket-dir>/authkey` (0600), that clients
+must prove they hold. Run the web workers as the same user as the pool.
+
+`python -m benchmarks.inference_pool` is a smoke run and throughput benchmark.
+"""
+import argparse
+import atexit
+import glob
+import itertools
+import os
+import queue
+import signal
+import threading
+import time
+from multiprocessing import connection, get_context, resource_tracker, shared_memory
+
+import numpy as np
+
+from artifacts import ensure_artifact
+
+INPUT_SHAPE = (1, 3, 224, 224)
+AUTHKEY_BYTES = 32
+
+
+def replica_address(socket_dir, index):
+    return os.path.join(socket_dir, f"replica-{index}.sock")
+
+
+def authkey_path(socket_dir):
+    return os.path.join(socket_dir, "authkey")
+
+
+def prepare_socket_dir(socket_dir):
+    """Create `socket_dir` private to this user (0700) and write a new random authkey (0600) into it."""
+    os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+    os.chmod(socket_dir, 0o700)  # an existing directory, or one makedirs' umask loosened
+    authkey = os.urandom(AUTHKEY_BYTES)
+    path = authkey_path(socket_dir)
+    if os.path.exists(path):
+        os.unlink(path)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(authkey)
+    return authkey
+
+
+def read_authkey(socket_dir):
+    with open(authkey_path(socket_dir), "rb") as f:
+        return f.read()
+
+
+def parse_cpus(spec):
+    """"0-3,8,10-11" -> [0, 1, 2, 3, 8, 10, 11]"""
+    cpus = []
+    for part in spec.split(","):
+        low, _, high = part.strip().partition("-")
+        cpus.extend(range(int(low), int(high or low) + 1))
+    return cpus
+
+
+def assign_cores(cpus, replicas, threads):
+    """Give each replica its own `threads` cores, reusing cores only when there are too few."""
+    return [[cpus[(i * threads + j) % len(cpus)] for j in range(threads)] for i in range(replicas)]
+
+
+# Nothing at module level may import torch (batching.py does): a spawned replica
+# imports this module before _run_replica sets its thread count and affinity.
+
+
+class _PoolPrediction:
+    """Handle for one pool request, with InferenceBatcher's pending-prediction interface."""
+
+    __slots__ = ("result", "probabilities", "error", "done")
+
+    def __init__(self):
+        self.result = None
+        self.probabilities = None
+        self.error = None
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        if not self.done.wait(timeout):
+            raise TimeoutError("Inference did not complete in time")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+# ------------------- Replica Process -------------------
+def _attach(name):
+    shm = shared_memory.SharedMemory(name=name)
+    # The client owns the block; without this the replica's resource tracker
+    # would unlink it when the replica exits (Python < 3.13 has no track=False).
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def _serve_connection(conn, batcher, info, timeout):
+    import torch
+
+    replies = queue.Queue()
+    shm = inputs = None
+
+    def reply():
+        while True:
+            item = replies.get()
+            if item is None:
+                return
+            request_id, pending = item
+            try:
+                if pending is None:
+                    conn.send((request_id, None, dict(batcher.stats(), **info), None))
+                    continue
+                try:
+                    # No timeout: the slot may only be reused once the batcher has consumed it.
+                    result = pending.wait()
+                    conn.send((request_id, None, result, pending.probabilities))
+                except Exception as exc:
+                    conn.send((request_id, repr(exc), None, None))
+            except (OSError, EOFError):
+                return
+
+    replier = threading.Thread(target=reply, name="pool-reply", daemon=True)
+    replier.start()
+    try:
+        kind, name, slots = conn.recv()
+        if kind != "attach":
+            return
+        shm = _attach(name)
+        inputs = torch.frombuffer(shm.buf, dtype=torch.float32, count=slots * int(np.prod(INPUT_SHAPE)))
+        inputs = inputs.view(slots, *INPUT_SHAPE)
+        conn.send(info)
+        while True:
+            message = conn.recv()
+            if message[0] == "infer":
+                _, request_id, slot = message
+                # A view of the client's slot; the batcher copies it into the batch.
+                replies.put((request_id, batcher.submit_async(inputs[slot])))
+            elif message[0] == "stats":
+                replies.put((message[1], None))
+    except (EOFError, OSError):
+        pass
+    finally:
+        replies.put(None)
+        replier.join(timeout)
+        inputs = None
+        if shm is not None:
+            try:
+                shm.close()
+            except BufferError:
+                pass  # a batch still holds the view; the mapping goes with the process
+        conn.close()
+
+
+def _run_replica(index, address, cores, threads, model_path, sha256, backend, max_batch_size, max_wait_ms,
+                 authkey, timeout):
+    # Before torch is imported, so OpenMP sizes its pool to this replica's cores.
+    os.environ["OMP_NUM_THREADS"] = os.environ["MKL_NUM_THREADS"] = str(threads)
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    import torch
+
+    from batching import InferenceBatcher
+    from skin_model import CLASS_NAMES, load_model
+
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    model = load_model(model_path, torch.device("cpu"), backend=backend, num_classes=len(CLASS_NAMES))
+    batcher = InferenceBatcher(model, CLASS_NAMES, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    batcher.submit(torch.zeros(INPUT_SHAPE))  # first forward pass allocates; keep it off a request
+
+    info = {
+        "replica": index,
+        "pid": os.getpid(),
+        "cores": sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None,
+        "threads": torch.get_num_threads(),
+        "backend": backend,
+        "sha256": sha256,
+        "class_names": list(CLASS_NAMES),
+        "max_batch_size": batcher.max_batch_size,
+    }
+    if os.path.exists(address):
+        os.unlink(address)
+    listener = connection.Listener(address, family="AF_UNIX", authkey=authkey)
+    print(f"replica {index} pid {info['pid']} cores {info['cores']} threads {info['threads']} on {address}",
+          flush=True)
+    while True:
+        try:
+            conn = listener.accept()
+        except connection.AuthenticationError:
+            continue
+        threading.Thread(target=_serve_connection, args=(conn, batcher, info, timeout),
+                         name="pool-connection", daemon=True).start()
+
+
+def serve(socket_dir, replicas, threads, cpus, model_path, sha256, backend, max_batch_size, max_wait_ms,
+          timeout=30.0):
+    for stale in glob.glob(replica_address(socket_dir, "*")):
+        os.unlink(stale)
+    authkey = prepare_socket_dir(socket_dir)
+    # spawn: every replica imports torch itself, after its affinity and thread count are set.
+    context = get_context("spawn")
+    processes = []
+    for index, cores in enumerate(assign_cores(cpus, replicas, threads)):
+        process = context.Process(
+            target=_run_replica,
+            args=(index, replica_address(socket_dir, index), cores, threads, model_path, sha256, backend,
+                  max_batch_size, max_wait_ms, authkey, timeout),
+            name=f"inference-replica-{index}",
+            daemon=True,
+        )
+        process.start()
+        processes.append(process)
+
+    def stop(signum, frame):
+        for process in processes:
+            process.terminate()
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for process in processes:
+        process.join()
+
+
+# ------------------- Web Worker Client -------------------
+class _ReplicaConnection:
+    def __init__(self, address, authkey, slots):
+        self.address = address
+        self.conn = connection.Client(address, family="AF_UNIX", authkey=authkey)
+        try:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * int(np.prod(INPUT_SHAPE)) * 4)
+        except BaseException:
+            self.conn.close()
+            raise
+        try:
+            self.inputs = np.ndarray((slots,) + INPUT_SHAPE, dtype=np.float32, buffer=self.shm.buf)
+            self.conn.send(("attach", self.shm.name, slots))
+            self.info = self.conn.recv()
+        except BaseException:
+            self.close()
+            raise
+        self.free = queue.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+        self.pending = {}  # request id -> (handle, slot)
+        self.alive = True
+        self._send_lock = threading.Lock()
+        threading.Thread(target=self._receive, name="pool-receive", daemon=True).start()
+
+    def send(self, request_id, handle, message, slot=None):
+        with self._send_lock:
+            if not self.alive:
+                raise ConnectionError(f"inference replica {self.address} is gone")
+            self.pending[request_id] = (handle, slot)
+            self.conn.send(message)
+
+    def _receive(self):
+        try:
+            while True:
+                request_id, error, result, probabilities = self.conn.recv()
+                handle, slot = self.pending.pop(request_id)
+                if slot is not None:
+                    self.free.put(slot)
+                if error is not None:
+                    handle.error = RuntimeError(f"inference replica error: {error}")
+                handle.result, handle.probabilities = result, probabilities
+                handle.done.set()
+        except (EOFError, OSError):
+            with self._send_lock:
+                self.alive = False
+                failed, self.pending = list(self.pending.values()), {}
+            for handle, _ in failed:
+                handle.error = ConnectionError(f"inference replica {self.address} closed the connection")
+                handle.done.set()
+
+    def close(self):
+        self.alive = False
+        self.inputs = None
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        finally:
+            self.shm.close()
+            self.shm.unlink()
+
+
+class InferencePoolClient:
+    """InferenceBatcher-compatible front end for the replicas under `socket_dir`."""
+
+    def __init__(self, socket_dir, slots=16, timeout=30.0, authkey=None, max_backoff=30.0):
+        self.socket_dir = socket_dir
+        self.slots = slots
+        self.timeout = timeout
+        # None: read <socket-dir>/authkey on every (re)connect, since a restarted pool has a new key.
+        self.authkey = authkey
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._connections = None
+        self._pid = None
+        self._ids = itertools.count()
+        self._requests = 0
+        self._errors = 0
+        self._reconnects = 0
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self._ensure_connected()
+
+    def _connect(self):
+        addresses = sorted(glob.glob(replica_address(self.socket_dir, "*")))
+        if not addresses:
+            raise ConnectionError(f"no inference replicas listening in {self.socket_dir}")
+        authkey = self.authkey or read_authkey(self.socket_dir)
+        connections, errors = [], []
+        for address in addresses:
+            try:
+                connections.append(_ReplicaConnection(address, authkey, self.slots))
+            except (OSError, EOFError, connection.AuthenticationError) as exc:
+                errors.append(f"{address}: {exc!r}")  # a replica still starting, or a stale socket
+        if not connections:
+            raise ConnectionError(f"no inference replica in {self.socket_dir} accepted: {'; '.join(errors)}")
+        info = connections[0].info
+        self.class_names = info["class_names"]
+        self.model_sha256 = info["sha256"]
+        self.max_batch_size = info["max_batch_size"]
+        return connections
+
+    def _ensure_connected(self):
+        """The live connections, reconnecting (with backoff) after a fork or once every replica is gone."""
+        connections = self._connections
+        if connections is not None and self._pid == os.getpid() and any(c.alive for c in connections):
+            return connections
+        with self._lock:
+            if self._pid != os.getpid():
+                # Connections and shared memory are per process: leave the parent's blocks alone.
+                self._connections, self._backoff, self._retry_at = None, 0.0, 0.0
+            elif self._connections is not None:
+                if any(c.alive for c in self._connections):
+                    return self._connections
+                for dead in self._connections:
+                    dead.close()
+                self._connections = None
+            now = time.monotonic()
+            if now < self._retry_at:
+                raise ConnectionError(f"inference pool in {self.socket_dir} unavailable, "
+                                      f"retrying in {self._retry_at - now:.1f}s")
+            try:
+                self._connections = self._connect()
+            except (OSError, EOFError, connection.AuthenticationError) as exc:
+                self._backoff = min(self.max_backoff, self._backoff * 2 or 0.5)
+                self._retry_at = now + self._backoff
+                raise ConnectionError(f"inference pool in {self.socket_dir} unavailable: {exc}") from exc
+            if self._pid == os.getpid():
+                self._reconnects += 1
+            else:
+                self._pid = os.getpid()
+                atexit.register(self.close)
+            self._backoff = 0.0
+        return self._connections
+
+    def submit_async(self, img_tensor):
+        """Copy a preprocessed (1, C, H, W) CPU tensor into a free slot of the least busy replica."""
+        live = [c for c in self._ensure_connected() if c.alive]
+        if not live:
+            raise ConnectionError(f"every inference replica in {self.socket_dir} is gone")
+        replica = max(live, key=lambda c: c.free.qsize())
+        try:
+            slot = replica.free.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError("No free inference slot in time") from None
+        np.copyto(replica.inputs[slot], np.asarray(img_tensor).reshape(INPUT_SHAPE))
+        handle = _PoolPrediction()
+        request_id = next(self._ids)
+        try:
+            replica.send(request_id, handle, ("infer", request_id, slot), slot)
+        except Exception:
+            replica.free.put(slot)
+            raise
+        self._requests += 1
+        return handle
+
+    def submit(self, img_tensor, timeout=None):
+        handle = self.submit_async(img_tensor)
+        try:
+            return handle.wait(timeout if timeout is not None else self.timeout)
+        except Exception:
+            self._errors += 1
+            raise
+
+    def queue_depth(self):
+        return sum(len(c.pending) for c in self._connections or ())
+
+    def stats(self):
+        replicas = []
+        for replica in self._ensure_connected():
+            handle = _PoolPrediction()
+            try:
+                request_id = next(self._ids)
+                replica.send(request_id, handle, ("stats", request_id))
+                replicas.append(handle.wait(self.timeout))
+            except Exception as exc:
+                replicas.append({"address": replica.address, "error": str(exc)})
+        return {
+            "pool": self.socket_dir,
+            "requests": self._requests,
+            "errors": self._errors,
+            "reconnects": self._reconnects,
+            "in_flight": self.queue_depth(),
+            "max_batch_size": self.max_batch_size,
+            "replicas": replicas,
+        }
+
+    def close(self):
+        if self._pid != os.getpid():
+            return
+        for replica in self._connections or ():
+            replica.close()
+        self._connections = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count()))
+    parser.add_argument("--socket-dir", default=os.getenv("INFERENCE_POOL", "/tmp/adermis-inference-pool"))
+    parser.add_argument("--replicas", type=int, default=1)
+    parser.add_argument("--threads", type=int, help="torch threads (and cores) per replica (default: cpus / replicas)")
+    parser.add_argument("--cpus", help="cores the replicas may use, e.g. 0-7 (default: all)")
+    parser.add_argument("--model", default=os.path.join("model", "skin_disease_model.pth"))
+    parser.add_argument("--backend", default=os.getenv("MODEL_BACKEND", "fp32"), help="fp32, bf16 or int8")
+    parser.add_argument("--max-batch", type=int, default=int(os.getenv("INFERENCE_MAX_BATCH", "8")))
+    parser.add_argument("--max-wait-ms", type=float, default=float(os.getenv("INFERENCE_MAX_WAIT_MS", "5")))
+    args = parser.parse_args(argv)
+
+    cpus = parse_cpus(args.cpus) if args.cpus else available
+    threads = args.threads or max(1, len(cpus) // args.replicas)
+    url = os.getenv("MODEL_URL")
+    artifact = ensure_artifact(url, args.model, sha256=os.getenv("MODEL_SHA256"),
+                               offline=url is None or os.getenv("MODEL_OFFLINE", "0") == "1")
+    serve(args.socket_dir, args.replicas, threads, cpus, artifact.path, artifact.sha256, args.backend,
+          args.max_batch, args.max_wait_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Incremental PDF ingestion into the retrieval corpora in pdfs/.
+
+    python ingest.py --corpus remedies pdfs/remedies5.pdf
+    python ingest.py --corpus skin_diseases pdfs/*.pdf --rebuild
+
+Pages are streamed with PyMuPDF and chunked in worker processes, and the
+chunks are embedded in batches while later pages are still being extracted.
+New vectors are appended to the existing FAISS index; only PDFs that are new
+(by content hash) are processed; use --mark-ingested once to record the PDFs the
+shipped indexes were built from. Chunk text goes into the memory-mappable
+chunk store (chunk_store.py); a legacy *_chunks.pkl is migrated on first run.
+
+--rebuild builds the new index and chunk store in a staging directory and
+moves them into place only once every PDF is in; the generation stamp moved
+last makes readers refuse the pair until both halves are new.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from chunk_store import (ChunkStore, append_chunks, generation_path, migrate_pickle, store_paths, truncate_chunks,
+                         write_generation)
+from retrieval import CORPORA, EMBEDDING_MODEL, INDEX_DIR
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ------------------- Extraction & Chunking -------------------
+def chunk_text(text, chunk_size=1000, overlap=100):
+    chunks, current, length, fresh = [], [], 0, 0
+    for word in text.split():
+        current.append(word)
+        length += len(word) + 1
+        fresh += 1
+        if length >= chunk_size:
+            chunks.append(" ".join(current))
+            # Carry the tail over so a sentence cut at the boundary keeps its context.
+            tail, tail_length = [], 0
+            for w in reversed(current):
+                tail_length += len(w) + 1
+                if tail_length > overlap:
+                    break
+                tail.insert(0, w)
+            current, length, fresh = tail, sum(len(w) + 1 for w in tail), 0
+    if fresh:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def extract_page_range(args):
+    """Worker: text of pages [start, end) of one PDF, chunked."""
+    import fitz
+
+    path, start, end, chunk_size, overlap = args
+    with fitz.open(path) as doc:
+        text = " ".join(doc[page].get_text() for page in range(start, end))
+    return chunk_text(text, chunk_size, overlap)
+
+
+def iter_chunks(paths, workers, pages_per_task, chunk_size, overlap):
+    import fitz
+
+    tasks = []
+    for path in paths:
+        with fitz.open(path) as doc:
+            page_count = doc.page_count
+        tasks += [(path, start, min(start + pages_per_task, page_count), chunk_size, overlap)
+                  for start in range(0, page_count, pages_per_task)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() preserves order, so chunk ids follow document order.
+        for chunks in pool.map(extract_page_range, tasks):
+            yield from chunks
+
+
+# ------------------- Index Maintenance -------------------
+def manifest_path(index_dir, corpus):
+    return os.path.join(index_dir, f"{corpus}_manifest.json")
+
+
+def load_manifest(index_dir, corpus):
+    try:
+        with open(manifest_path(index_dir, corpus)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"documents": {}}
+
+
+def save_manifest(index_dir, corpus, manifest):
+    path = manifest_path(index_dir, corpus)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def write_index(index, path):
+    import faiss
+
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def corpus_files(index_dir, corpus):
+    """Everything a rebuild replaces, in the order it is moved into place (the stamp last)."""
+    return (os.path.join(index_dir, f"{corpus}_index.faiss"), *store_paths(index_dir, corpus),
+            manifest_path(index_dir, corpus), generation_path(index_dir, corpus))
+
+
+def install_rebuild(staging_dir, index_dir, corpus):
+    for staged, live in zip(corpus_files(staging_dir, corpus), corpus_files(index_dir, corpus)):
+        os.replace(staged, live)
+
+
+def ingest(corpus, pdf_paths, index_dir=INDEX_DIR, rebuild=False, **kwargs):
+    if not rebuild:
+        return _ingest(corpus, pdf_paths, index_dir, rebuild=False, **kwargs)
+    # Same filesystem as index_dir, so the final moves are renames.
+    staging_dir = tempfile.mkdtemp(prefix=f".{corpus}-rebuild-", dir=index_dir)
+    try:
+        total = _ingest(corpus, pdf_paths, staging_dir, rebuild=True, **kwargs)
+        if os.path.exists(generation_path(staging_dir, corpus)):
+            install_rebuild(staging_dir, index_dir, corpus)
+            print(f"installed the rebuilt {corpus} index")
+        return total
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def _ingest(corpus, pdf_paths, index_dir, rebuild=False, batch_size=64, workers=None,
+            pages_per_task=8, chunk_size=1000, overlap=100, model_name=EMBEDDING_MODEL, mark_ingested=False):
+    import faiss
+    from sentence_transformers import SentenceTransformer
+
+    index_path = os.path.join(index_dir, f"{corpus}_index.faiss")
+    manifest = {"documents": {}} if rebuild else load_manifest(index_dir, corpus)
+
+    if rebuild:
+        # index_dir is an empty staging directory here.
+        index = None
+    else:
+        index = faiss.read_index(index_path) if os.path.exists(index_path) else None
+        if index is not None and not ChunkStore.exists(index_dir, corpus):
+            print(f"migrating {corpus}_chunks.pkl to the mapped chunk store")
+            migrate_pickle(index_dir, corpus)
+            write_generation(index_dir, corpus)
+        # Drop chunks stored by an interrupted run whose vectors never reached the index file.
+        if ChunkStore.exists(index_dir, corpus):
+            truncate_chunks(index_dir, corpus, index.ntotal if index is not None else 0)
+            if index is not None:
+                write_generation(index_dir, corpus)
+
+    pending = []
+    for path in pdf_paths:
+        name, digest = os.path.basename(path), file_sha256(path)
+        known = manifest["documents"].get(name)
+        if mark_ingested:
+            manifest["documents"][name] = {"sha256": digest, "first_id": None, "chunks": None}
+            print(f"marked   {name} as already in the index")
+        elif known and known["sha256"] == digest:
+            print(f"skip     {name} (already ingested)")
+        elif known:
+            print(f"changed  {name}: re-run with --rebuild to replace its vectors", file=sys.stderr)
+        else:
+            pending.append((path, name, digest))
+    if mark_ingested:
+        save_manifest(index_dir, corpus, manifest)
+    if not pending:
+        return 0
+
+    encoder = SentenceTransformer(model_name)
+    if index is None:
+        index = faiss.IndexFlatL2(encoder.get_sentence_embedding_dimension())
+
+    started, total = time.perf_counter(), 0
+    for path, name, digest in pending:
+        batch, first_id, count = [], None, 0
+        chunks = iter_chunks([path], workers, pages_per_task, chunk_size, overlap)
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                ids = _add_batch(index, encoder, index_dir, corpus, batch)
+                first_id = ids[0] if first_id is None else first_id
+                count += len(ids)
+                batch = []
+        if batch:
+            ids = _add_batch(index, encoder, index_dir, corpus, batch)
+            first_id = ids[0] if first_id is None else first_id
+            count += len(ids)
+        # The index file is replaced once per document, after its chunks are stored.
+        write_index(index, index_path)
+        write_generation(index_dir, corpus)
+        manifest["documents"][name] = {"sha256": digest, "first_id": first_id, "chunks": count}
+        save_manifest(index_dir, corpus, manifest)
+        total += count
+        print(f"ingested {name}: {count} chunks")
+
+    elapsed = time.perf_counter() - started
+    print(f"{total} chunks in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f} chunks/s); index holds {index.ntotal}")
+    return total
+
+
+def _add_batch(index, encoder, index_dir, corpus, texts):
+    vectors = np.ascontiguousarray(encoder.encode(texts, batch_size=len(texts), convert_to_numpy=True), dtype=np.float32)
+    ids = append_chunks(index_dir, corpus, texts)
+    index.add(vectors)
+    return ids
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="+")
+    parser.add_argument("--corpus", choices=CORPORA, required=True)
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--rebuild", action="store_true", help="drop the corpus and ingest the given PDFs from scratch")
+    parser.add_argument("--mark-ingested", action="store_true",
+                        help="record the PDFs as already indexed (e.g. the ones the shipped index was built from)")
+    parser.add_argument("--batch-size", type=int, default=64, help="chunks per embedding batch")
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes (default: CPU count)")
+    parser.add_argument("--pages-per-task", type=int, default=8)
+    parser.add_argument("--chunk-size", type=int, default=1000, help="approximate characters per chunk")
+    parser.add_argument("--overlap", type=int, default=100)
+    args = parser.parse_args(argv)
+    ingest(args.corpus, args.pdfs, args.index_dir, args.rebuild, batch_size=args.batch_size, workers=args.workers,
+           pages_per_task=args.pages_per_task, chunk_size=args.chunk_size, overlap=args.overlap,
+           mark_ingested=args.mark_ingested)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Resources that are built on first use instead of at import time.
+
+    cnn = LazyResource("cnn", load_cnn)
+    cnn.get()        # builds once (thread-safe); later calls return the same object
+    cnn.peek()       # the object if already built, else None; never builds
+    warm_up()        # build every resource registered with warm=True, now
+
+Importing app.py therefore costs only Flask and a few light modules; torch,
+OpenCV, the Gemini SDK, the model weights and the webcam are loaded by the
+first request that needs them, or ahead of time by warm_up().
+"""
+import threading
+import time
+
+_registry = []
+
+
+class LazyResource:
+    def __init__(self, name, factory, warm=True):
+        self.name = name
+        self.factory = factory
+        self.warm = warm
+        self.load_seconds = None
+        self.error = None
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def get(self):
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                started = time.perf_counter()
+                try:
+                    self._value = self.factory()
+                except Exception as exc:
+                    # Not cached: the next caller retries (e.g. after a transient download failure).
+                    self.error = repr(exc)
+                    raise
+                self.load_seconds = time.perf_counter() - started
+                self.error = None
+                self._loaded = True
+        return self._value
+
+    def peek(self):
+        return self._value if self._loaded else None
+
+
+def warm_up(names=None):
+    """Build the given resources (default: every one registered with warm=True); returns seconds per name."""
+    timings = {}
+    for resource in list(_registry):
+        if (names is None and resource.warm) or (names is not None and resource.name in names):
+            started = time.perf_counter()
+            resource.get()
+            timings[resource.name] = round(time.perf_counter() - started, 3)
+    return timings
+
+
+def status():
+    return {
+        resource.name: {"loaded": resource.loaded, "load_seconds": resource.load_seconds, "error": resource.error}
+        for resource in _registry
+    }
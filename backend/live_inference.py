@@ -0,0 +1,200 @@
+"""Per-client live AR predictions over Socket.IO.
+
+Each client sends downscaled JPEG frames as binary `live_frame` messages. The
+hub keeps only the newest frame per client: a frame that arrives while the
+previous one is still being scored replaces it, so a slow model never builds
+a backlog. One worker thread takes the newest frame of every client, decodes
+them and submits them together to the shared InferenceBatcher, so concurrent
+viewers share forward passes. Results go back through a per-client callback as
+a small dict instead of a re-encoded video stream.
+
+The server's own camera (app.generate_frames) uses the same hub with an
+in-memory OpenCV frame, so its MJPEG stream never waits for the model.
+
+A frame is only scored when the scene has changed: its dHash is compared with
+the one of the last scored frame, and within `change_threshold` bits it is
+skipped (unless the last score is older than `refresh_seconds`). Scored class
+probabilities are smoothed per client with an exponential moving average, so
+the label does not flicker between frames; a large jump in the hash (a new
+patch of skin) restarts the average.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from image_hash import frame_dhash, hamming
+
+log = logging.getLogger(__name__)
+
+
+class _LiveClient:
+    __slots__ = ("frame", "seq", "on_result", "received", "dropped", "skipped", "scored",
+                 "signature", "scored_at", "smoothed")
+
+    def __init__(self, on_result):
+        self.frame = None
+        self.seq = 0
+        self.on_result = on_result
+        self.received = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.scored = 0
+        self.signature = None  # dHash of the last scored frame
+        self.scored_at = 0.0
+        self.smoothed = None  # EMA of the class probabilities
+
+
+class LiveInferenceHub:
+    def __init__(self, preprocess, batcher, max_clients=256, timeout=10.0,
+                 change_threshold=5, reset_distance=20, refresh_seconds=10.0, ema_alpha=0.4):
+        # preprocess(frame) -> (1, C, H, W) tensor on the model's device
+        self.preprocess = preprocess
+        self.batcher = batcher
+        self.max_clients = max_clients
+        self.timeout = timeout
+        self.change_threshold = change_threshold
+        self.reset_distance = reset_distance
+        self.refresh_seconds = refresh_seconds
+        self.ema_alpha = ema_alpha
+        self._start_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._clients = OrderedDict()
+        self._cond = threading.Condition()
+        self._errors = 0
+        self._rounds = 0
+        self._worker = None
+        self._pid = os.getpid()
+
+    def _ensure_worker(self):
+        # Same fork handling as InferenceBatcher: one worker thread per process.
+        if self._worker is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._start_lock = threading.Lock()
+                self._reset()
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="live-inference", daemon=True)
+                self._worker.start()
+
+    # ------------------- Client API -------------------
+    def push(self, key, frame, on_result):
+        """Store `frame` as the newest one for `key`; returns False if the hub is full."""
+        self._ensure_worker()
+        with self._cond:
+            client = self._clients.get(key)
+            if client is None:
+                if len(self._clients) >= self.max_clients:
+                    return False
+                client = self._clients[key] = _LiveClient(on_result)
+            if client.frame is not None:
+                client.dropped += 1
+            client.frame = frame
+            client.seq += 1
+            client.received += 1
+            client.on_result = on_result
+            self._cond.notify()
+        return True
+
+    def remove(self, key):
+        with self._cond:
+            self._clients.pop(key, None)
+
+    # ------------------- Worker -------------------
+    def _take_frames(self):
+        with self._cond:
+            while not any(c.frame is not None for c in self._clients.values()):
+                self._cond.wait()
+            taken = []
+            for key, client in self._clients.items():
+                if client.frame is not None:
+                    taken.append((key, client, client.frame, client.seq))
+                    client.frame = None
+            return taken
+
+    def _changed(self, client, signature, now):
+        """Distance to the last scored frame, or None when the frame can be skipped."""
+        if client.signature is None:
+            return 64
+        distance = hamming(signature, client.signature)
+        if distance <= self.change_threshold and now - client.scored_at < self.refresh_seconds:
+            return None
+        return distance
+
+    def _smooth(self, client, probabilities, distance):
+        if client.smoothed is None or distance >= self.reset_distance:
+            client.smoothed = list(probabilities)
+        else:
+            a = self.ema_alpha
+            client.smoothed = [a * p + (1 - a) * s for p, s in zip(probabilities, client.smoothed)]
+        best = max(range(len(client.smoothed)), key=client.smoothed.__getitem__)
+        names = self.batcher.class_names
+        return (names[best] if best < len(names) else "Unknown Disease"), round(client.smoothed[best], 2)
+
+    def _run(self):
+        # The only worker for every client: nothing may end this loop.
+        while True:
+            try:
+                self._run_round()
+            except Exception:
+                self._errors += 1
+                log.exception("live inference round failed")
+
+    def _run_round(self):
+        taken = self._take_frames()
+        started = time.perf_counter()
+        now = time.monotonic()
+        submitted = []
+        for key, client, frame, seq in taken:
+            try:
+                signature = frame_dhash(frame)
+                distance = self._changed(client, signature, now)
+                if distance is None:
+                    client.skipped += 1
+                    continue
+                tensor = self.preprocess(frame)
+                # The batcher (or the inference pool client) can fail here too.
+                submitted.append((client, seq, signature, distance, self.batcher.submit_async(tensor)))
+            except Exception as exc:  # ImageRejected, ConnectionError, TimeoutError, ...
+                self._deliver(client, {"error": str(exc), "seq": seq})
+        for client, seq, signature, distance, pending in submitted:
+            try:
+                pending.wait(self.timeout)
+                disease, score = self._smooth(client, pending.probabilities, distance)
+            except Exception as exc:
+                self._deliver(client, {"error": str(exc), "seq": seq})
+                continue
+            client.scored += 1
+            client.signature, client.scored_at = signature, now
+            self._deliver(client, {
+                "disease": disease,
+                "score": score,
+                "seq": seq,
+                "ms": round((time.perf_counter() - started) * 1000.0, 1),
+            })
+        self._rounds += 1
+
+    def _deliver(self, client, payload):
+        if "error" in payload:
+            self._errors += 1
+        try:
+            client.on_result(payload)
+        except Exception:
+            self._errors += 1
+
+    def stats(self):
+        with self._cond:
+            clients = list(self._clients.values())
+        return {
+            "clients": len(clients),
+            "frames_received": sum(c.received for c in clients),
+            "frames_dropped": sum(c.dropped for c in clients),
+            "frames_skipped": sum(c.skipped for c in clients),
+            "frames_scored": sum(c.scored for c in clients),
+            "rounds": self._rounds,
+            "errors": self._errors,
+        }
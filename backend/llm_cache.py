@@ -0,0 +1,124 @@
+"""Persistent cache for LLM responses, shared by every worker on the box.
+
+Entries are keyed on the model name plus the whitespace-normalized prompt and
+stored in a local sqlite file with a TTL and a size-bounded LRU eviction.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Refreshing the LRU timestamp on every hit would turn reads into writes; once a minute is enough.
+_TOUCH_INTERVAL = 60.0
+
+
+def normalize_prompt(prompt):
+    return _WHITESPACE.sub(" ", prompt).strip()
+
+
+def cache_key(model_name, prompt):
+    return hashlib.sha256(f"{model_name}\n{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path, ttl_seconds=7 * 24 * 3600, max_entries=5000):
+        self.path = path
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, model TEXT NOT NULL, response TEXT NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed)")
+
+    def _connect(self):
+        # sqlite connections cannot be shared between threads (or across fork).
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _count(self, field, amount=1):
+        with self._stats_lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def get(self, model_name, prompt):
+        key = cache_key(model_name, prompt)
+        now = time.time()
+        try:
+            row = self._connect().execute(
+                "SELECT response, created, accessed FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self._count("misses")
+                return None
+            if now - row[2] > _TOUCH_INTERVAL:
+                self._connect().execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return row[0]
+
+    def put(self, model_name, prompt, response):
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, response, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (cache_key(model_name, prompt), model_name, response, now, now),
+            )
+            self._evict(conn, now)
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, conn, now):
+        expired = conn.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,)).rowcount
+        overflow = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed LIMIT ?)",
+                (overflow,),
+            )
+        evicted = max(expired, 0) + max(overflow, 0)
+        if evicted:
+            self._count("evictions", evicted)
+
+    def contains(self, model_name, prompt):
+        row = self._connect().execute(
+            "SELECT created FROM llm_cache WHERE key = ?", (cache_key(model_name, prompt),)
+        ).fetchone()
+        return row is not None and time.time() - row[0] <= self.ttl
+
+    def stats(self):
+        try:
+            entries = self._connect().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
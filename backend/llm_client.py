@@ -0,0 +1,382 @@
+"""Shared LLM client used for every Gemini call in app.py.
+
+One LLMClient per process provides:
+
+* per-call deadlines (the caller never waits longer than `timeout`), and a
+  per-chunk read timeout for streams
+* admission control: a concurrency cap plus a token-bucket rate limiter; a
+  call keeps its slot until its backend requests return, even past the
+  caller's deadline
+* retries with full-jitter backoff, bounded by a retry budget so a provider
+  outage cannot multiply traffic
+* optional hedged requests: a second attempt if the first has not answered
+  after `hedge_after` seconds, first success wins
+* the LLM response cache (llm_cache.py) in front of all of it
+
+Backends are pluggable: GeminiBackend talks to Google, FakeBackend answers
+locally with configurable latency for tests and benchmarks.
+"""
+import json
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+_END = object()
+
+
+class LLMError(RuntimeError):
+    pass
+
+
+class LLMTimeout(LLMError, TimeoutError):
+    pass
+
+
+class LLMOverloaded(LLMError):
+    """The call was not admitted before its deadline (concurrency or rate limit)."""
+
+
+# ------------------- Backends -------------------
+class GeminiBackend:
+    def __init__(self, api_key):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self._genai = genai
+        self._models = {}
+
+    def _model(self, model_name):
+        model = self._models.get(model_name)
+        if model is None:
+            model = self._models[model_name] = self._genai.GenerativeModel(model_name)
+        return model
+
+    def generate(self, model_name, prompt, timeout):
+        return self._model(model_name).generate_content(prompt, request_options={"timeout": timeout}).text
+
+    def stream(self, model_name, prompt, timeout):
+        for chunk in self._model(model_name).generate_content(prompt, stream=True, request_options={"timeout": timeout}):
+            if chunk.text:
+                yield chunk.text
+
+    def is_retryable(self, exc):
+        from google.api_core import exceptions
+
+        return isinstance(exc, (
+            exceptions.ResourceExhausted,
+            exceptions.ServiceUnavailable,
+            exceptions.InternalServerError,
+            exceptions.DeadlineExceeded,
+            ConnectionError,
+            TimeoutError,
+        ))
+
+
+class FakeBackend:
+    """Local stand-in for Gemini: canned answers shaped like the app's prompts, with simulated latency."""
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, responder=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.responder = responder or self.default_response
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def default_response(prompt):
+        if "Return JSON format" in prompt:
+            return json.dumps([{"disease": "Eczema", "score": 0.8}, {"disease": "Psoriasis", "score": 0.6}])
+        if "follow-up" in prompt:
+            return "How long have you had the symptoms?\nIs the area itchy?\nHas it spread recently?"
+        if "Determine the final skin disease" in prompt:
+            return "Eczema"
+        if "treatment plan" in prompt:
+            return ("**Diagnosis:** Clinical examination.\n\n**Symptoms:**\n• Itching\n• Redness\n\n"
+                    "**Causes:**\n• Genetics\n\n**Treatments (Ordered):**\n• Home Remedies: Moisturise\n\n"
+                    "**When to See a Doctor:**\n• Spreading rash")
+        return "This is a placeholder answer from the fake LLM backend."
+
+    def _delay(self):
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            fail = self._random.random() < self.failure_rate
+        time.sleep(delay)
+        if fail:
+            raise ConnectionError("fake backend failure")
+
+    def generate(self, model_name, prompt, timeout):
+        self._delay()
+        return self.responder(prompt)
+
+    def stream(self, model_name, prompt, timeout):
+        self._delay()
+        words = self.responder(prompt).split(" ")
+        for i, word in enumerate(words):
+            yield word if i == 0 else " " + word
+
+    def is_retryable(self, exc):
+        return isinstance(exc, (ConnectionError, TimeoutError))
+
+
+# ------------------- Admission Control -------------------
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(max(burst, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self, deadline):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait_for = (1 - self._tokens) / self.rate if self.rate > 0 else float("inf")
+            if now + wait_for > deadline:
+                return False
+            time.sleep(wait_for)
+
+
+class RetryBudget:
+    """Every call deposits `ratio` tokens; every retry or hedge spends one."""
+
+    def __init__(self, ratio=0.2, min_tokens=3, max_tokens=50):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = float(min_tokens)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class _Slot:
+    """One admitted call's concurrency slot: released once the caller and every backend request it started are done."""
+
+    def __init__(self, semaphore):
+        self._semaphore = semaphore
+        self._holders = 1  # the caller
+        self._lock = threading.Lock()
+
+    def hold(self, future):
+        with self._lock:
+            self._holders += 1
+        future.add_done_callback(lambda _: self.release())
+        return future
+
+    def release(self):
+        with self._lock:
+            self._holders -= 1
+            free = self._holders == 0
+        if free:
+            self._semaphore.release()
+
+
+# ------------------- Client -------------------
+class LLMClient:
+    def __init__(self, backend, cache=None, default_model="gemini-2.0-flash", timeout=30.0,
+                 max_concurrency=8, rate_per_sec=5.0, burst=10, max_attempts=3,
+                 retry_budget_ratio=0.2, backoff_base=0.25, backoff_cap=4.0, hedge_after=None,
+                 stream_chunk_timeout=10.0):
+        self.backend = backend
+        self.cache = cache
+        self.default_model = default_model
+        self.timeout = timeout
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge_after = hedge_after
+        self.stream_chunk_timeout = stream_chunk_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._bucket = TokenBucket(rate_per_sec, burst)
+        self._budget = RetryBudget(retry_budget_ratio)
+        # Attempts run here so the caller can stop waiting at its deadline. A call holds its slot
+        # until its requests return, so at most two (a hedged pair) run per slot.
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency * 2, thread_name_prefix="llm")
+        self._stats_lock = threading.Lock()
+        self._stats = {"calls": 0, "cache_hits": 0, "attempts": 0, "retries": 0, "hedges": 0,
+                       "timeouts": 0, "rejected": 0, "errors": 0}
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _admit(self, deadline):
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            self._count("rejected")
+            raise LLMOverloaded("Too many concurrent LLM calls")
+        if not self._bucket.acquire(deadline):
+            self._slots.release()
+            self._count("rejected")
+            raise LLMOverloaded("LLM rate limit reached")
+        return _Slot(self._slots)
+
+    def _backoff(self, attempt, deadline):
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+        if time.monotonic() + delay >= deadline:
+            return False
+        time.sleep(delay)
+        return True
+
+    def _attempt(self, slot, model_name, prompt, deadline):
+        """One logical attempt, hedged with a second request if the first is slow."""
+        remaining = deadline - time.monotonic()
+        self._count("attempts")
+        futures = {slot.hold(self._executor.submit(self.backend.generate, model_name, prompt, remaining))}
+        if self.hedge_after is not None and self.hedge_after < remaining:
+            done, _ = wait(futures, timeout=self.hedge_after)
+            if not done and self._bucket.try_acquire() and self._budget.withdraw():
+                self._count("hedges")
+                futures.add(slot.hold(self._executor.submit(
+                    self.backend.generate, model_name, prompt, deadline - time.monotonic())))
+        error = None
+        while futures:
+            done, futures = wait(futures, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise LLMTimeout(f"LLM call exceeded its {self.timeout:.1f}s deadline")
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    @staticmethod
+    def _cacheable(text, cacheable):
+        # An empty reply (a blocked or cut-off response) is never cached, whatever the caller says.
+        return bool(text and text.strip()) and (cacheable is None or cacheable(text))
+
+    def generate(self, prompt, model_name=None, timeout=None, cacheable=None):
+        """The response text; `cacheable(text) -> bool` keeps replies the caller cannot use out of the cache."""
+        model_name = model_name or self.default_model
+        self._count("calls")
+        if self.cache is not None:
+            cached = self.cache.get(model_name, prompt)
+            if cached is not None and self._cacheable(cached, cacheable):
+                self._count("cache_hits")
+                return cached
+
+        deadline = time.monotonic() + (timeout or self.timeout)
+        slot = self._admit(deadline)
+        self._budget.deposit()
+        try:
+            attempt = 0
+            while True:
+                try:
+                    text = self._attempt(slot, model_name, prompt, deadline)
+                    break
+                except LLMTimeout:
+                    self._count("timeouts")
+                    raise
+                except Exception as exc:
+                    attempt += 1
+                    retry = (attempt < self.max_attempts and self.backend.is_retryable(exc)
+                             and self._budget.withdraw() and self._backoff(attempt, deadline))
+                    if not retry:
+                        self._count("errors")
+                        raise
+                    self._count("retries")
+        finally:
+            slot.release()
+
+        if self.cache is not None and self._cacheable(text, cacheable):
+            self.cache.put(model_name, prompt, text)
+        return text
+
+    def stream(self, prompt, model_name=None, timeout=None, cacheable=None):
+        """Yield response chunks; a failure before the first chunk is retried like generate().
+
+        Only a stream the backend finished is cached: one that failed, timed out
+        or was closed by the caller part-way is not.
+        """
+        model_name = model_name or self.default_model
+        self._count("calls")
+        if self.cache is not None:
+            cached = self.cache.get(model_name, prompt)
+            if cached is not None and self._cacheable(cached, cacheable):
+                self._count("cache_hits")
+                yield cached
+                return
+
+        deadline = time.monotonic() + (timeout or self.timeout)
+        slot = self._admit(deadline)
+        self._budget.deposit()
+        chunks = []
+        completed = False
+        try:
+            attempt = 0
+            while True:
+                self._count("attempts")
+                try:
+                    for chunk in self._read_chunks(slot, model_name, prompt, deadline):
+                        chunks.append(chunk)
+                        yield chunk
+                        if time.monotonic() > deadline:
+                            self._count("timeouts")
+                            raise LLMTimeout(f"LLM stream exceeded its {self.timeout:.1f}s deadline")
+                    completed = True
+                    break
+                except LLMTimeout:
+                    raise
+                except Exception as exc:
+                    attempt += 1
+                    retry = (not chunks and attempt < self.max_attempts and self.backend.is_retryable(exc)
+                             and self._budget.withdraw() and self._backoff(attempt, deadline))
+                    if not retry:
+                        self._count("errors")
+                        raise
+                    self._count("retries")
+        finally:
+            slot.release()
+
+        text = "".join(chunks)
+        if completed and self.cache is not None and self._cacheable(text, cacheable):
+            self.cache.put(model_name, prompt, text)
+
+    def _read_chunks(self, slot, model_name, prompt, deadline):
+        """The backend stream, each chunk read on the executor and waited for at most stream_chunk_timeout."""
+        chunks = iter(self.backend.stream(model_name, prompt, max(0.0, deadline - time.monotonic())))
+        while True:
+            wait_for = deadline - time.monotonic()
+            if self.stream_chunk_timeout is not None:
+                wait_for = min(wait_for, self.stream_chunk_timeout)
+            future = slot.hold(self._executor.submit(next, chunks, _END))
+            done, _ = wait((future,), timeout=max(0.0, wait_for))
+            if not done:
+                self._count("timeouts")
+                raise LLMTimeout(f"LLM stream sent nothing for {wait_for:.1f}s")
+            chunk = future.result()
+            if chunk is _END:
+                return
+            yield chunk
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
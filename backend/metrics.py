@@ -0,0 +1,313 @@
+"""In-process metrics exposed in the Prometheus text format at /metrics.
+
+    DECODE_SECONDS = histogram("adermis_decode_seconds", "Image decode latency", ["source"])
+    with DECODE_SECONDS.labels(source="upload").time():
+        ...
+
+Counters, gauges and histograms are plain Python objects: an update is a dict
+lookup for the label set plus a few additions under a per-series lock, cheap
+enough for the per-frame and per-request hot paths. Gauges and counters can
+also be backed by a function that is read at scrape time (queue depths and
+cache sizes; totals a component already counts, such as cache hits).
+
+Unlabelled metrics have a single series, reached with `.labels()`. Each
+gunicorn worker keeps its own registry, so a scrape reports the worker that
+answered it.
+"""
+import math
+import threading
+import time
+from bisect import bisect_left
+
+# Latency buckets in seconds, from a cached LLM answer to a slow Gemini call.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + [f'{n}="{_escape(v)}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_label_text(self.labelnames, key, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+# ------------------- Counter -------------------
+class _CounterChild:
+    __slots__ = ("value", "function", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def set_function(self, function):
+        """Read the total from `function()` at scrape time, for counts an object already keeps."""
+        self.function = function
+
+    def get(self):
+        if self.function is not None:
+            try:
+                return float(self.function())
+            except Exception:
+                return math.nan
+        return self.value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _samples(self):
+        for key, child in list(self._children.items()):
+            yield "", key, (), child.get()
+
+
+# ------------------- Gauge -------------------
+class _GaugeChild:
+    __slots__ = ("value", "function", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = float(value)
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set_function(self, function):
+        """Read the value from `function()` at scrape time instead."""
+        self.function = function
+
+    def track_inprogress(self):
+        return _InProgress(self)
+
+    def get(self):
+        if self.function is not None:
+            try:
+                return float(self.function())
+            except Exception:
+                return math.nan
+        return self.value
+
+
+class _InProgress:
+    __slots__ = ("gauge",)
+
+    def __init__(self, gauge):
+        self.gauge = gauge
+
+    def __enter__(self):
+        self.gauge.inc()
+        return self
+
+    def __exit__(self, *exc):
+        self.gauge.dec()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def _samples(self):
+        for key, child in list(self._children.items()):
+            yield "", key, (), child.get()
+
+
+# ------------------- Histogram -------------------
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum", "_lock")
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.upper_bounds = tuple(sorted(float(b) for b in buckets if b != math.inf))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def _samples(self):
+        for key, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.upper_bounds + (math.inf,), counts):
+                cumulative += count
+                yield "_bucket", key, (("le", _format_value(bound)),), cumulative
+            yield "_sum", key, (), total
+            yield "_count", key, (), cumulative
+
+
+# ------------------- Registry -------------------
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Re-importing a module (e.g. the Flask reloader) returns the live series.
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"metric {metric.name} already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def counter(name, documentation, labelnames=(), registry=REGISTRY):
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=(), registry=REGISTRY):
+    return registry.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def render(registry=REGISTRY):
+    return registry.render()
+
+
+# ------------------- Stage Tracking -------------------
+class StageMetrics:
+    """Latency histogram, error counter and in-flight gauge for named pipeline stages.
+
+        STAGES = StageMetrics("adermis_stage")
+        with STAGES.track("gemini"):
+            ...
+    """
+
+    def __init__(self, prefix, buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.seconds = histogram(f"{prefix}_seconds", "Latency of a pipeline stage in seconds.",
+                                 ["stage"], buckets, registry)
+        self.errors = counter(f"{prefix}_errors_total", "Pipeline stage calls that raised.", ["stage"], registry)
+        self.in_flight = gauge(f"{prefix}_in_flight", "Pipeline stage calls currently running.", ["stage"], registry)
+
+    def track(self, stage):
+        return _StageTracker(self.seconds.labels(stage), self.errors.labels(stage), self.in_flight.labels(stage))
+
+
+class _StageTracker:
+    __slots__ = ("seconds", "errors", "in_flight", "started")
+
+    def __init__(self, seconds, errors, in_flight):
+        self.seconds, self.errors, self.in_flight = seconds, errors, in_flight
+
+    def __enter__(self):
+        self.in_flight.inc()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds.observe(time.perf_counter() - self.started)
+        self.in_flight.dec()
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+            self.errors.inc()
@@ -0,0 +1,176 @@
+"""Google Maps geocode / Places client used by /api/find_clinics.
+
+* One pooled keep-alive requests.Session instead of a new connection per call.
+* Nearby searches and Place Details lookups fan out on a bounded thread pool.
+* Geocode, nearby and details results are kept in TTL caches. Nearby results
+  are keyed by geohash cell + radius + keyword, so repeat searches from the
+  same neighbourhood never leave the process.
+
+MAPS_API_BASE points the client at another host (e.g. a local stand-in server).
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_BASE_URL = "https://maps.googleapis.com/maps/api"
+DETAIL_FIELDS = "name,formatted_address,formatted_phone_number,opening_hours,website,rating"
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(lat, lng, precision=6):
+    """Standard base32 geohash; precision 6 is a cell of roughly 1.2 km x 0.6 km."""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    bits, bit_count, even, result = 0, 0, True, []
+    while len(result) < precision:
+        value, bounds = (lng, lng_range) if even else (lat, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            bounds[0] = mid
+        else:
+            bounds[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            result.append(_GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+    return "".join(result)
+
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, ttl, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class PlacesClient:
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, max_workers=8, cache_ttl=3600,
+                 geohash_precision=6, timeout=10.0):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.geohash_precision = geohash_precision
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="places")
+        self.geocode_cache = TTLCache(cache_ttl)
+        self.nearby_cache = TTLCache(cache_ttl)
+        self.details_cache = TTLCache(cache_ttl, max_entries=4096)
+
+    def _get(self, endpoint, params):
+        response = self.session.get(
+            f"{self.base_url}/{endpoint}/json",
+            params={**params, "key": self.api_key},
+            timeout=self.timeout,
+        )
+        return response.json()
+
+    # ------------------- Lookups -------------------
+    def geocode(self, address):
+        """Return (lat, lng) for an address, or None if Google cannot geocode it."""
+        key = " ".join(address.lower().split())
+        cached = self.geocode_cache.get(key)
+        if cached is not None:
+            return cached
+        data = self._get("geocode", {"address": address})
+        if data.get("status") != "OK":
+            return None
+        location = data["results"][0]["geometry"]["location"]
+        coords = (location["lat"], location["lng"])
+        self.geocode_cache.put(key, coords)
+        return coords
+
+    def nearby(self, lat, lng, radius, keyword):
+        key = (geohash(lat, lng, self.geohash_precision), radius, keyword)
+        cached = self.nearby_cache.get(key)
+        if cached is not None:
+            return cached
+        data = self._get("place/nearbysearch", {
+            "location": f"{lat},{lng}",
+            "radius": radius,
+            "type": "hospital",
+            "keyword": keyword,
+        })
+        results = data.get("results", [])
+        if data.get("status") in ("OK", "ZERO_RESULTS"):
+            self.nearby_cache.put(key, results)
+        return results
+
+    def details(self, place_id):
+        cached = self.details_cache.get(place_id)
+        if cached is not None:
+            return cached
+        data = self._get("place/details", {"place_id": place_id, "fields": DETAIL_FIELDS})
+        result = data.get("result", {})
+        if data.get("status") == "OK":
+            self.details_cache.put(place_id, result)
+        return result
+
+    def find_clinics(self, lat, lng, radius, categories):
+        """Search every category and attach Place Details, all requests running concurrently."""
+        searches = {
+            category: self.executor.submit(self.nearby, lat, lng, radius, keyword)
+            for category, keyword in categories.items()
+        }
+        places = [(category, place) for category, future in searches.items() for place in future.result()]
+        details = [self.executor.submit(self.details, place.get("place_id")) for _, place in places]
+
+        clinics = []
+        for (category, place), future in zip(places, details):
+            details_data = future.result()
+            clinics.append({
+                "category": category,
+                "name": place.get("name"),
+                "place_id": place.get("place_id"),
+                "address": details_data.get("formatted_address"),
+                "phone": details_data.get("formatted_phone_number"),
+                "website": details_data.get("website"),
+                "rating": place.get("rating"),
+                "location": place.get("geometry", {}).get("location", {}),
+                "hours": details_data.get("opening_hours", {}).get("weekday_text", []),
+            })
+        return clinics
+
+    def stats(self):
+        return {
+            "geocode": self.geocode_cache.stats(),
+            "nearby": self.nearby_cache.stats(),
+            "details": self.details_cache.stats(),
+        }
@@ -0,0 +1,165 @@
+"""Speculative treatment plans, generated while the user answers follow-up questions.
+
+Once the first step returns its predictions, `prefetch(candidates)` starts
+generating treatment plans for the top candidate diseases in the background
+and returns a token for the session. When the final diagnosis is known,
+`take(token, disease)` returns the plan if the disease was one of the
+candidates. If that plan is being generated, take() waits for it, but no
+longer than the caller's timeout; if it has not started yet and no other
+session wants it, take() cancels it and returns None, so the caller makes
+the call itself instead of queueing behind other speculation. The token's
+other plans are dropped.
+
+Speculation never competes with real requests for long: at most
+`max_concurrency` plans are generated at a time, and new candidates are
+skipped (not queued) once `max_pending` plans are waiting. Sessions that
+never reach the final step have their plans discarded after `ttl_seconds`.
+Candidates shared by several sessions are generated once.
+
+The stash is per process. With the LLM response cache enabled, a prefetched
+plan also lands in the shared cache, so a final request served by another
+worker still gets it without calling Gemini.
+"""
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def normalize_disease(name):
+    return re.sub(r"[^a-z0-9]+", " ", str(name).lower()).strip()
+
+
+class SpeculativePrefetcher:
+    def __init__(self, generate, max_concurrency=2, max_pending=8, ttl_seconds=1800, max_sessions=1000,
+                 key=normalize_disease):
+        # generate(disease) -> plan text; runs on the prefetch threads
+        self.generate = generate
+        # key(disease) -> the name candidates and final answers are matched on
+        self.key = key
+        self.max_pending = max_pending
+        self.ttl = ttl_seconds
+        self.max_sessions = max_sessions
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="prefetch")
+        # Reentrant: cancelling a future under the lock runs its done-callback (_finished) at once.
+        self._lock = threading.RLock()
+        self._sessions = OrderedDict()  # token -> (created, {key(disease): future})
+        self._inflight = {}  # key(disease) -> future not finished yet
+        self._holders = {}  # future -> number of sessions referencing it
+        self.started = 0
+        self.skipped = 0
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+
+    def _expire(self, now):
+        while self._sessions:
+            token, (created, plans) = next(iter(self._sessions.items()))
+            if now - created < self.ttl and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[token]
+            self._discard(plans.values())
+
+    def _hold(self, future):
+        self._holders[future] = self._holders.get(future, 0) + 1
+
+    def _release(self, future):
+        """Drop one session's reference; True once no session references `future`."""
+        holders = self._holders.get(future, 1) - 1
+        if holders > 0:
+            self._holders[future] = holders
+            return False
+        self._holders.pop(future, None)
+        return True
+
+    def _discard(self, futures):
+        for future in futures:
+            if self._release(future):
+                # Not started yet: drop it. Running or done: the result is simply never used.
+                future.cancel()
+                self.discarded += 1
+
+    def _submit(self, disease, key):
+        future = self._inflight.get(key)
+        if future is not None:
+            return future
+        if len(self._inflight) >= self.max_pending:
+            self.skipped += 1
+            return None
+        future = self._executor.submit(self.generate, disease)
+        self._inflight[key] = future
+        future.add_done_callback(lambda f, k=key: self._finished(k, f))
+        self.started += 1
+        return future
+
+    def _finished(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def prefetch(self, candidates):
+        """Start plans for `candidates` (disease names, best first); returns the session's token."""
+        token = secrets.token_urlsafe(16)
+        keyed = [(self.key(disease), disease) for disease in candidates]  # outside the lock: key() may be slow
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            plans = {}
+            for key, disease in keyed:
+                if key and key not in plans:
+                    future = self._submit(disease, key)
+                    if future is not None:
+                        plans[key] = future
+                        self._hold(future)
+            self._sessions[token] = (now, plans)
+        return token
+
+    def take(self, token, disease, timeout=None):
+        """The prefetched plan for `disease`, or None; either way the token is used up.
+
+        `timeout` bounds the wait for a plan that is being generated; pass what
+        is left of the request's deadline.
+        """
+        key = self.key(disease)
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._sessions.pop(token, None) if token else None
+            plans = entry[1] if entry else {}
+            future = plans.pop(key, None)
+            self._discard(plans.values())
+            if future is None:
+                self.misses += 1
+                return None
+            sole = self._release(future)
+            if not future.running() and not future.done():
+                # Still queued behind other speculation: generating inline is faster.
+                # Left queued if another session holds it.
+                if sole and future.cancel():
+                    self.discarded += 1
+                self.misses += 1
+                return None
+        # Running or done: waiting beats a second Gemini call.
+        try:
+            plan = future.result(timeout)
+        except Exception:
+            plan = None
+        with self._lock:
+            if plan:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return plan
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "in_flight": len(self._inflight),
+                "started": self.started,
+                "skipped": self.skipped,
+                "hits": self.hits,
+                "misses": self.misses,
+                "discarded": self.discarded,
+            }
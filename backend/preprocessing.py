@@ -0,0 +1,129 @@
+"""Image decode + preprocessing for SkinDiseaseCNN.
+
+Produces the same input as
+
+    transforms.Compose([Resize((224, 224)), ToTensor(), Normalize([0.5] * 3, [0.5] * 3)])
+
+but builds everything once, asks the JPEG decoder for a DCT-scaled image close to
+the target size instead of decoding every pixel of a 12 MP phone photo, and
+normalizes in one vectorized pass straight into a (preallocated) tensor.
+Camera frames that are already in memory (OpenCV ndarrays) go through
+`from_array` without being encoded to a file first.
+"""
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+INPUT_SIZE = (224, 224)
+MEAN = (0.5, 0.5, 0.5)
+STD = (0.5, 0.5, 0.5)
+
+# File names the batch tools (score_images.py, quantize_model.py, /api/analyze/batch) treat as images.
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(50_000_000)))
+
+
+class ImageRejected(ValueError):
+    """The upload is not a decodable image."""
+
+
+class ImageTooLarge(ImageRejected):
+    """The upload exceeds the byte or pixel cap."""
+
+
+class ImagePreprocessor:
+    def __init__(self, size=INPUT_SIZE, mean=MEAN, std=STD,
+                 max_upload_bytes=MAX_UPLOAD_BYTES, max_pixels=MAX_IMAGE_PIXELS):
+        self.size = tuple(size)
+        self.max_upload_bytes = max_upload_bytes
+        self.max_pixels = max_pixels
+        # (x / 255 - mean) / std == x * scale + offset
+        std = np.asarray(std, dtype=np.float32)
+        self._scale = (1.0 / (255.0 * std)).reshape(3, 1, 1)
+        self._offset = (-np.asarray(mean, dtype=np.float32) / std).reshape(3, 1, 1)
+
+    # ------------------- Decode -------------------
+    def _read(self, source):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            data = bytes(source)
+        elif isinstance(source, (str, os.PathLike)):
+            if os.path.getsize(source) > self.max_upload_bytes:
+                raise ImageTooLarge(f"Image exceeds the {self.max_upload_bytes // (1024 * 1024)} MB upload limit")
+            return source
+        else:
+            # Flask FileStorage, Streamlit UploadedFile or any binary file object.
+            stream = getattr(source, "stream", source)
+            data = stream.read(self.max_upload_bytes + 1)
+        if len(data) > self.max_upload_bytes:
+            raise ImageTooLarge(f"Image exceeds the {self.max_upload_bytes // (1024 * 1024)} MB upload limit")
+        return io.BytesIO(data)
+
+    def decode(self, source):
+        """Decode `source` to an RGB PIL image of exactly `self.size`."""
+        try:
+            img = Image.open(self._read(source))
+            width, height = img.size
+            if width * height > self.max_pixels:
+                raise ImageTooLarge(f"Image has {width * height} pixels, the limit is {self.max_pixels}")
+            # JPEG only: decode at 1/2, 1/4 or 1/8 scale while staying >= the target size.
+            img.draft("RGB", self.size)
+            img = img.convert("RGB")
+            if img.size != self.size:
+                img = img.resize(self.size, Image.BILINEAR)
+            return img
+        except ImageRejected:
+            raise
+        except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as exc:
+            raise ImageRejected(f"Could not decode image: {exc}") from exc
+
+    # ------------------- Normalize -------------------
+    def normalize_into(self, rgb, out):
+        """Write normalized CHW float32 values of an HxWx3 uint8 array into `out`."""
+        target = out.numpy()
+        np.multiply(np.asarray(rgb).transpose(2, 0, 1), self._scale, out=target, casting="unsafe")
+        target += self._offset
+        return out
+
+    def resize_array(self, array):
+        """Resize an HxWx3 uint8 frame to `self.size`, keeping its channel order."""
+        img = Image.fromarray(np.ascontiguousarray(array))
+        # Integer box downscale first, the in-memory counterpart of the JPEG draft above.
+        factor = min(img.size[0] // self.size[0], img.size[1] // self.size[1])
+        if factor >= 2:
+            img = img.reduce(factor)
+        if img.size != self.size:
+            img = img.resize(self.size, Image.BILINEAR)
+        return np.asarray(img)
+
+    def array_into(self, array, out, bgr=False):
+        """Normalize an HxWx3 uint8 frame into `out`; bgr=True for OpenCV frames."""
+        resized = self.resize_array(array)
+        # Resizing is per channel, so the BGR -> RGB swap can be a view on the small image.
+        return self.normalize_into(resized[..., ::-1] if bgr else resized, out)
+
+    def from_array(self, array, bgr=False, out=None):
+        """Return a (1, 3, H, W) float32 tensor for an in-memory HxWx3 uint8 frame."""
+        if out is None:
+            out = self.new_batch(1)
+        self.array_into(array, out[0], bgr)
+        return out
+
+    def preprocess_into(self, source, batch, index):
+        """Decode `source` into row `index` of a preallocated (N, 3, H, W) batch tensor."""
+        return self.normalize_into(self.decode(source), batch[index])
+
+    def __call__(self, source, out=None):
+        """Return a (1, 3, H, W) float32 tensor for one image."""
+        if out is None:
+            out = self.new_batch(1)
+        self.normalize_into(self.decode(source), out[0])
+        return out
+
+    def new_batch(self, batch_size):
+        import torch  # deferred so importing the app does not pull in torch
+
+        return torch.empty((batch_size, 3, self.size[1], self.size[0]), dtype=torch.float32)
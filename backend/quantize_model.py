@@ -0,0 +1,121 @@
+"""Convert skin_disease_model.pth to a low-precision backend and check it against fp32.
+
+    python quantize_model.py convert --backend int8
+    python quantize_model.py parity --images path/to/reference_images --backend bf16 int8
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import torch
+
+from preprocessing import IMAGE_EXTENSIONS, ImagePreprocessor
+from skin_model import INFERENCE_BACKENDS, SkinDiseaseCNN, convert_model, converted_model_path, load_model, save_converted_model
+
+DEFAULT_MODEL_PATH = os.path.join("model", "skin_disease_model.pth")
+
+preprocessor = ImagePreprocessor()
+
+
+def serialized_size(model):
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def load_reference_images(image_dir):
+    paths = sorted(
+        os.path.join(image_dir, name) for name in os.listdir(image_dir)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    if not paths:
+        raise SystemExit(f"No reference images found in {image_dir}")
+    images = preprocessor.new_batch(len(paths))
+    for index, path in enumerate(paths):
+        preprocessor.preprocess_into(path, images, index)
+    return paths, images
+
+
+def run_model(model, images, batch_size):
+    probabilities = []
+    started = time.perf_counter()
+    with torch.no_grad():
+        for start in range(0, len(images), batch_size):
+            outputs = model(images[start:start + batch_size])
+            probabilities.append(torch.nn.functional.softmax(outputs.float(), dim=1))
+    return torch.cat(probabilities), time.perf_counter() - started
+
+
+# ------------------- Commands -------------------
+def convert(args):
+    model = SkinDiseaseCNN(num_classes=11)
+    model.load_state_dict(torch.load(args.model, map_location="cpu"))
+    fp32_size = serialized_size(model)
+    for backend in args.backend:
+        if backend == "fp32":
+            continue
+        converted = convert_model(_copy_weights(model), backend)
+        output = converted_model_path(args.model, backend)
+        save_converted_model(converted, backend, output)
+        print(f"{backend}: wrote {output} ({serialized_size(converted) / 1e6:.1f} MB, fp32 is {fp32_size / 1e6:.1f} MB)")
+
+
+def _copy_weights(model):
+    copy = SkinDiseaseCNN(num_classes=11)
+    copy.load_state_dict(model.state_dict())
+    return copy
+
+
+def parity(args):
+    paths, images = load_reference_images(args.images)
+    reference = load_model(args.model, "cpu", "fp32")
+    ref_probs, ref_time = run_model(reference, images, args.batch_size)
+    ref_top1 = ref_probs.argmax(dim=1)
+    print(f"fp32: {len(paths)} images, {ref_time * 1000 / len(paths):.2f} ms/image, "
+          f"{serialized_size(reference) / 1e6:.1f} MB weights")
+
+    failed = False
+    for backend in args.backend:
+        if backend == "fp32":
+            continue
+        model = load_model(args.model, "cpu", backend)
+        probs, elapsed = run_model(model, images, args.batch_size)
+        top1 = probs.argmax(dim=1)
+        agreement = (top1 == ref_top1).float().mean().item()
+        max_diff = (probs - ref_probs).abs().max().item()
+        print(f"{backend}: top-1 agreement {agreement:.2%}, max |dp| {max_diff:.4f}, "
+              f"{elapsed * 1000 / len(paths):.2f} ms/image ({ref_time / elapsed:.2f}x), "
+              f"{serialized_size(model) / 1e6:.1f} MB weights")
+        for path, expected, got in zip(paths, ref_top1.tolist(), top1.tolist()):
+            if expected != got:
+                print(f"  mismatch: {path} fp32={expected} {backend}={got}")
+        if agreement < args.min_agreement:
+            failed = True
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="fp32 state_dict to convert/compare against")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = commands.add_parser("convert", help="convert the fp32 model once and save the result")
+    convert_parser.add_argument("--backend", nargs="+", choices=INFERENCE_BACKENDS, default=["int8"])
+    convert_parser.set_defaults(func=convert)
+
+    parity_parser = commands.add_parser("parity", help="compare backend predictions with fp32 on reference images")
+    parity_parser.add_argument("--images", required=True, help="directory of reference images")
+    parity_parser.add_argument("--backend", nargs="+", choices=INFERENCE_BACKENDS, default=["bf16", "int8"])
+    parity_parser.add_argument("--batch-size", type=int, default=16)
+    parity_parser.add_argument("--min-agreement", type=float, default=0.99,
+                               help="fail if top-1 agreement with fp32 falls below this fraction")
+    parity_parser.set_defaults(func=parity)
+
+    args = parser.parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Prediction cache keyed by a perceptual hash of the decoded image.
+
+A re-uploaded photo decodes to the same 224x224 image and so to the same
+dHash (image_hash.py); a re-compressed or resized copy lands a few bits away.
+A lookup returns the prediction stored for a hash within `max_distance` bits
+(default 0: equal hashes only), without running the CNN.
+
+A 64-bit hash alone is not proof of the same image: low-texture, similarly lit
+skin close-ups collide. Every entry therefore keeps a small thumbnail of the
+decoded image, and a hit is only served when `same_image(stored, new)` (e.g.
+a mean-squared-error bound, image_hash.thumbnail_mse) confirms it.
+
+Near matches are found without scanning every entry: the 64-bit hash is split
+into max_distance + 1 bands, and two hashes within max_distance bits must agree
+exactly on at least one band (pigeonhole), so only entries sharing a band are
+compared.
+
+Entries are tagged with the model checksum. A lookup or store with a different
+checksum empties the cache, so predictions of old weights are never served.
+"""
+import threading
+from collections import OrderedDict
+
+from image_hash import HASH_SIZE, hamming
+
+HASH_BITS = HASH_SIZE * HASH_SIZE
+
+
+class PerceptualCache:
+    def __init__(self, max_entries=1024, max_distance=0, same_image=None, hash_bits=HASH_BITS):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        # same_image(stored_fingerprint, fingerprint) -> bool; None trusts the hash alone
+        self.same_image = same_image
+        bands = max_distance + 1
+        edges = [hash_bits * i // bands for i in range(bands + 1)]
+        self._bands = [(lo, (1 << (hi - lo)) - 1) for lo, hi in zip(edges, edges[1:])]
+        self._lock = threading.Lock()
+        self._model = None
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.rejected = 0
+        self._clear()
+
+    def _clear(self):
+        self._entries = OrderedDict()  # signature -> (prediction, fingerprint), least recently used first
+        self._index = [{} for _ in self._bands]  # band value -> set of signatures
+
+    def _keys(self, signature):
+        return [(signature >> lo) & mask for lo, mask in self._bands]
+
+    def _check_model(self, model):
+        if model != self._model:
+            if self._entries:
+                self.invalidations += 1
+            self._clear()
+            self._model = model
+
+    def _candidates(self, signature):
+        """(distance, signature) of the entries within max_distance bits, closest first."""
+        if self.max_distance <= 0:
+            return [(0, signature)] if signature in self._entries else []
+        found = set()
+        for index, key in zip(self._index, self._keys(signature)):
+            found.update(index.get(key, ()))
+        return sorted((d, c) for d, c in ((hamming(signature, c), c) for c in found) if d <= self.max_distance)
+
+    def get(self, signature, model, fingerprint=None):
+        """Cached prediction for a confirmed image within max_distance bits of `signature`, else None."""
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            self._check_model(model)
+            for distance, match in self._candidates(signature):
+                prediction, stored = self._entries[match]
+                if self.same_image is not None and not self.same_image(stored, fingerprint):
+                    self.rejected += 1
+                    continue
+                if distance == 0:
+                    self.hits += 1
+                else:
+                    self.near_hits += 1
+                self._entries.move_to_end(match)
+                return dict(prediction)
+            self.misses += 1
+            return None
+
+    def put(self, signature, prediction, model, fingerprint=None):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._check_model(model)
+            if signature not in self._entries:
+                for index, key in zip(self._index, self._keys(signature)):
+                    index.setdefault(key, set()).add(signature)
+            self._entries[signature] = (dict(prediction), fingerprint)
+            self._entries.move_to_end(signature)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                for index, key in zip(self._index, self._keys(evicted)):
+                    bucket = index[key]
+                    bucket.discard(evicted)
+                    if not bucket:
+                        del index[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "max_distance": self.max_distance,
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "rejected": self.rejected,  # hash matched, pixels did not
+                "hit_rate": round((self.hits + self.near_hits) / lookups, 3) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "model": self._model[:12] if self._model else None,
+            }
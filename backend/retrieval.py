@@ -0,0 +1,249 @@
+"""Local retrieval over the FAISS indexes shipped in pdfs/.
+
+    python retrieval.py search "psoriasis home remedies" [-k 5]
+    python retrieval.py build-digests         # writes pdfs/treatment_digests.json
+
+The indexes and chunk stores are loaded once per process (memory-mapped where possible)
+and queried with batched sentence-transformer embeddings. `treatment_plan`
+turns the retrieved chunks, or a precomputed per-class digest, into the same
+structured plan the Gemini treatment prompt asks for, without an LLM call.
+"""
+import argparse
+import json
+import os
+import re
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+from chunk_store import check_generation, load_chunks
+
+INDEX_DIR = os.getenv("RAG_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdfs"))
+# The shipped indexes hold 768-d vectors; all-mpnet-base-v2 is the likeliest model that
+# produced them, not a recorded fact. Retriever checks it at load (see check_encoder).
+EMBEDDING_MODEL = os.getenv("RAG_EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2")
+DIGEST_PATH = os.path.join(INDEX_DIR, "treatment_digests.json")
+
+CORPORA = ("skin_diseases", "remedies")
+
+# CLASS_NAMES uses short labels; the guides spell them out.
+DISEASE_ALIASES = {
+    "BCC": "Basal Cell Carcinoma",
+    "BKL": "Benign Keratosis-like Lesions",
+    "Warts": "Warts Molluscum and other Viral Infections",
+    "Tinea": "Tinea Ringworm Candidiasis and other Fungal Infections",
+    "Melanocytic Nevi": "Melanocytic Nevi (moles)",
+    "Seborrheic Keratoses": "Seborrheic Keratoses and other Benign Tumors",
+}
+
+SECTION_KEYWORDS = {
+    "Diagnosis": ("diagnos", "characteri", "biopsy", "dermoscop", "examination", "presents", "identified"),
+    "Symptoms": ("symptom", "itch", "rash", "red", "scal", "lesion", "patch", "plaque", "pain", "blister", "dry"),
+    "Causes": ("cause", "risk", "trigger", "due to", "associated with", "genetic", "exposure", "infection"),
+    "Treatments (Ordered)": ("treat", "remed", "cream", "ointment", "therapy", "apply", "topical", "oil",
+                             "medication", "ayurved", "steroid", "antifungal"),
+    "When to See a Doctor": ("doctor", "physician", "dermatologist", "seek", "worsen", "spread", "bleed",
+                             "persist", "consult", "urgent"),
+}
+SECTION_LIMITS = {"Diagnosis": 2, "Symptoms": 3, "Causes": 2, "Treatments (Ordered)": 4, "When to See a Doctor": 2}
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+
+
+# ------------------- Index Loading -------------------
+def _read_index(path):
+    import faiss
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        # Not every index type can be mapped; fall back to reading it into memory.
+        return faiss.read_index(path)
+
+
+class Retriever:
+    def __init__(self, index_dir=INDEX_DIR, model_name=EMBEDDING_MODEL, self_check=4):
+        from sentence_transformers import SentenceTransformer
+
+        self.encoder = SentenceTransformer(model_name)
+        self.indexes, self.chunks = {}, {}
+        for corpus in CORPORA:
+            stamp = check_generation(index_dir, corpus)
+            index = _read_index(os.path.join(index_dir, f"{corpus}_index.faiss"))
+            if index.d != self.encoder.get_sentence_embedding_dimension():
+                raise ValueError(
+                    f"{corpus} index has {index.d}-d vectors but {model_name} produces "
+                    f"{self.encoder.get_sentence_embedding_dimension()}-d embeddings"
+                )
+            chunks = load_chunks(index_dir, corpus)
+            # Checked on both sides of the load: a swap in between could pair old vectors with new text.
+            if check_generation(index_dir, corpus) != stamp:
+                raise ValueError(f"{corpus} index was replaced while it was being loaded")
+            self.indexes[corpus] = index
+            self.chunks[corpus] = chunks
+            self.check_encoder(corpus, self_check, model_name)
+
+    def check_encoder(self, corpus, samples, model_name):
+        """Re-embed a few stored chunks; each must come back as its own nearest neighbour.
+
+        Matching dimensions do not prove the index was built with `model_name`;
+        a different encoder returns unrelated chunks without any error.
+        """
+        chunks = self.chunks[corpus]
+        if not samples or not len(chunks):
+            return
+        ids = sorted({int(i) for i in np.linspace(0, len(chunks) - 1, num=min(samples, len(chunks)))})
+        texts = [chunks[i] for i in ids]
+        _, nearest = self.indexes[corpus].search(self.embed(texts), 1)
+        # Compared by text: a repeated chunk may legitimately win with another id.
+        misses = [i for i, text, row in zip(ids, texts, nearest)
+                  if not 0 <= row[0] < len(chunks) or chunks[row[0]] != text]
+        if misses:
+            raise ValueError(
+                f"{corpus} index was not built with {model_name}: chunks {misses} are not their own nearest "
+                f"neighbour; set RAG_EMBEDDING_MODEL to the encoder it was built with or rebuild it with ingest.py"
+            )
+
+    def embed(self, texts, batch_size=32):
+        return np.ascontiguousarray(
+            self.encoder.encode(list(texts), batch_size=batch_size, convert_to_numpy=True), dtype=np.float32
+        )
+
+    def search(self, queries, k=5, corpus="skin_diseases"):
+        """Return, for each query, a list of {"score", "text", "corpus"} for the top-k chunks."""
+        distances, ids = self.indexes[corpus].search(self.embed(queries), k)
+        chunks = self.chunks[corpus]
+        return [
+            [{"score": float(d), "text": chunks[i], "corpus": corpus} for d, i in zip(row_d, row_i) if 0 <= i < len(chunks)]
+            for row_d, row_i in zip(distances, ids)
+        ]
+
+    def retrieve_for_disease(self, disease, k=4):
+        name = DISEASE_ALIASES.get(disease, disease)
+        # One batched embedding call per corpus covers every aspect of the plan.
+        about = self.search([f"{name} diagnosis symptoms", f"{name} causes risk factors"], k, "skin_diseases")
+        care = self.search([f"{name} treatment medication", f"{name} home remedies ayurvedic"], k, "remedies")
+        seen, results = set(), []
+        for hits in about + care:
+            for hit in hits:
+                if hit["text"] not in seen:
+                    seen.add(hit["text"])
+                    results.append(hit)
+        return results
+
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+
+def get_retriever():
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                _retriever = Retriever()
+    return _retriever
+
+
+# ------------------- Treatment Plans Without an LLM -------------------
+def build_digest(disease, chunks):
+    """Pick the most relevant sentences from the retrieved chunks for each plan section."""
+    name_terms = re.findall(r"[a-z]{4,}", DISEASE_ALIASES.get(disease, disease).lower())
+    sentences = []
+    for chunk in chunks:
+        for sentence in _SENTENCE_SPLIT.split(" ".join(chunk["text"].split())):
+            if 30 <= len(sentence) <= 300:
+                sentences.append(sentence)
+
+    digest, used = {}, set()
+    for section, keywords in SECTION_KEYWORDS.items():
+        scored = []
+        for position, sentence in enumerate(sentences):
+            lower = sentence.lower()
+            score = sum(k in lower for k in keywords) * 2 + sum(t in lower for t in name_terms)
+            if score >= 2 and sentence not in used:
+                scored.append((-score, position, sentence))
+        picked = [s for _, _, s in sorted(scored)[:SECTION_LIMITS[section]]]
+        used.update(picked)
+        digest[section] = picked
+    return digest
+
+
+def format_digest(disease, digest):
+    lines = [f"**Disease:** {disease}", ""]
+    diagnosis = " ".join(digest.get("Diagnosis", [])) or "See a dermatologist for a confirmed diagnosis."
+    lines += [f"**Diagnosis:** {diagnosis}", ""]
+    for section in ("Symptoms", "Causes", "Treatments (Ordered)", "When to See a Doctor"):
+        lines.append(f"**{section}:**")
+        lines += [f"• {sentence}" for sentence in digest.get(section, [])] or ["• Consult a dermatologist."]
+        lines.append("")
+    return "\n".join(lines).strip()
+
+
+@lru_cache(maxsize=1)
+def load_digests(path=DIGEST_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _match_class(disease, names):
+    lower = disease.lower()
+    for name in names:
+        alias = DISEASE_ALIASES.get(name)
+        if name.lower() in lower or (alias and alias.lower() in lower) or (len(lower) >= 4 and lower in name.lower()):
+            return name
+    return None
+
+
+@lru_cache(maxsize=256)
+def treatment_plan(disease, use_digest=True):
+    """Structured treatment plan from the precomputed digest (if any) or live retrieval."""
+    if use_digest:
+        digests = load_digests()
+        match = _match_class(disease, digests)
+        if match:
+            return format_digest(disease, digests[match])
+    chunks = get_retriever().retrieve_for_disease(disease)
+    return format_digest(disease, build_digest(disease, chunks))
+
+
+def retrieved_context(disease, k=4, max_chars=4000):
+    """Retrieved chunk text to ground an LLM treatment prompt."""
+    text = "\n---\n".join(hit["text"] for hit in get_retriever().retrieve_for_disease(disease, k))
+    return text[:max_chars]
+
+
+# ------------------- CLI -------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    search_parser = commands.add_parser("search")
+    search_parser.add_argument("query", nargs="+")
+    search_parser.add_argument("-k", type=int, default=5)
+    search_parser.add_argument("--corpus", choices=CORPORA, default="skin_diseases")
+    commands.add_parser("build-digests")
+    args = parser.parse_args(argv)
+
+    retriever = get_retriever()
+    if args.command == "search":
+        for query, hits in zip(args.query, retriever.search(args.query, args.k, args.corpus)):
+            print(f"# {query}")
+            for hit in hits:
+                print(f"{hit['score']:.3f}  {hit['text'][:160]!r}")
+        return
+
+    from skin_model import CLASS_NAMES
+    digests = {
+        name: build_digest(name, retriever.retrieve_for_disease(name))
+        for name in CLASS_NAMES if name != "Unknown"
+    }
+    with open(DIGEST_PATH, "w") as f:
+        json.dump(digests, f, indent=2)
+    print(f"wrote {len(digests)} digests to {DIGEST_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""Score a directory of images with SkinDiseaseCNN and write every class probability.
+
+    python score_images.py archive/lesions --output scores/ [--workers 8 --batch-size 64]
+    python score_images.py archive/lesions --output scores.csv
+
+Images are decoded and resized in a pool of worker processes, one fixed-size
+batch per task, while the main process normalizes each finished batch and runs
+it through the model. Only a few batches are in flight at a time, so memory
+stays flat however large the directory is.
+
+Output has one row per image: path (relative to the image directory),
+predicted class, its score, error (for undecodable files) and one p_<class>
+column per entry of CLASS_NAMES. A directory output is a Parquet dataset
+(needs pyarrow) written as part-NNNNN.parquet files every --flush-every
+images; a .csv output is appended to. Rerunning the same command skips the
+images already in the output, so an interrupted run resumes where it stopped.
+"""
+import argparse
+import csv
+import glob
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from preprocessing import IMAGE_EXTENSIONS, ImagePreprocessor, ImageRejected
+
+DEFAULT_MODEL_PATH = os.path.join("model", "skin_disease_model.pth")
+
+
+def list_images(image_dir):
+    paths = []
+    for root, _, names in os.walk(image_dir):
+        paths.extend(os.path.relpath(os.path.join(root, name), image_dir)
+                     for name in names if name.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)
+
+
+# ------------------- Decode Workers -------------------
+_worker_preprocessor = None
+_worker_image_dir = None
+
+
+def _init_worker(image_dir):
+    global _worker_preprocessor, _worker_image_dir
+    _worker_preprocessor, _worker_image_dir = ImagePreprocessor(), image_dir
+
+
+def _decode_batch(paths):
+    """Decode `paths` into one (N, H, W, 3) uint8 array; a quarter of the float32 size to send back."""
+    width, height = _worker_preprocessor.size
+    images = np.zeros((len(paths), height, width, 3), dtype=np.uint8)
+    errors = [None] * len(paths)
+    for index, path in enumerate(paths):
+        try:
+            images[index] = np.asarray(_worker_preprocessor.decode(os.path.join(_worker_image_dir, path)))
+        except (ImageRejected, OSError) as exc:
+            errors[index] = str(exc)
+    return paths, images, errors
+
+
+# ------------------- Output -------------------
+class ParquetOutput:
+    """A directory of part-NNNNN.parquet files, each written atomically."""
+
+    def __init__(self, directory):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow (pip install pyarrow); or pass --output scores.csv") from None
+        self.pa, self.pq = pyarrow, pyarrow.parquet
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.parts = sorted(glob.glob(os.path.join(directory, "part-*.parquet")))
+
+    def done(self):
+        done = set()
+        for part in self.parts:
+            done.update(self.pq.read_table(part, columns=["path"]).column("path").to_pylist())
+        return done
+
+    def write(self, columns):
+        path = os.path.join(self.directory, f"part-{len(self.parts):05d}.parquet")
+        # Explicit types: a part without errors must not get a null-typed error column.
+        pa = self.pa
+        table = pa.table({name: pa.array(values, type=pa.string() if name in ("path", "predicted", "error")
+                                         else pa.float32()) for name, values in columns.items()})
+        self.pq.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        self.parts.append(path)
+
+
+class CSVOutput:
+    def __init__(self, path):
+        self.path = path
+
+    def done(self):
+        if not os.path.exists(self.path):
+            return set()
+        with open(self.path, newline="") as f:
+            return {row["path"] for row in csv.DictReader(f)}
+
+    def write(self, columns):
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new:
+                writer.writerow(list(columns))
+            writer.writerows(zip(*columns.values()))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+# ------------------- Scoring -------------------
+class Scorer:
+    def __init__(self, model, class_names, batch_size, device):
+        import torch
+
+        self.torch = torch
+        self.model = model
+        self.class_names = class_names
+        self.device = device
+        self.preprocessor = ImagePreprocessor()
+        self.batch = self.preprocessor.new_batch(batch_size)
+
+    def __call__(self, images, errors):
+        """Class probabilities for the decodable rows of `images`, as an (N, classes) float32 array."""
+        count = len(images)
+        for index in range(count):
+            if errors[index] is None:
+                self.preprocessor.normalize_into(images[index], self.batch[index])
+        with self.torch.inference_mode():
+            outputs = self.model(self.batch[:count].to(self.device))
+            return self.torch.nn.functional.softmax(outputs.float(), dim=1).cpu().numpy()
+
+
+def empty_columns(class_names):
+    columns = {"path": [], "predicted": [], "score": [], "error": []}
+    columns.update({f"p_{name}": [] for name in class_names})
+    return columns
+
+
+def add_rows(columns, class_names, paths, probabilities, errors):
+    for path, row, error in zip(paths, probabilities, errors):
+        columns["path"].append(path)
+        columns["error"].append(error)
+        if error is not None:
+            columns["predicted"].append(None)
+            columns["score"].append(None)
+            for name in class_names:
+                columns[f"p_{name}"].append(None)
+            continue
+        best = int(row.argmax())
+        columns["predicted"].append(class_names[best])
+        columns["score"].append(round(float(row[best]), 4))
+        for name, value in zip(class_names, row.tolist()):
+            columns[f"p_{name}"].append(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", help="directory of images (searched recursively)")
+    parser.add_argument("--output", required=True, help="Parquet dataset directory, or a .csv file")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--backend", default=os.getenv("MODEL_BACKEND", "fp32"), help="fp32, bf16 or int8")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help="decode processes (default: all cores but one)")
+    parser.add_argument("--torch-threads", type=int, help="intra-op threads for the forward pass")
+    parser.add_argument("--flush-every", type=int, default=4096, help="images per output write (resume granularity)")
+    args = parser.parse_args(argv)
+
+    import torch
+
+    from skin_model import CLASS_NAMES, load_model
+
+    output = CSVOutput(args.output) if args.output.lower().endswith(".csv") else ParquetOutput(args.output)
+    done = output.done()
+    todo = [path for path in list_images(args.images) if path not in done]
+    print(f"{len(done)} images already scored, {len(todo)} to go")
+    if not todo:
+        return
+
+    if args.torch_threads:
+        torch.set_num_threads(args.torch_threads)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = load_model(args.model, device, backend=args.backend, num_classes=len(CLASS_NAMES))
+    score = Scorer(model, CLASS_NAMES, args.batch_size, device)
+
+    batches = [todo[i:i + args.batch_size] for i in range(0, len(todo), args.batch_size)]
+    columns, pending = empty_columns(CLASS_NAMES), 0
+    scored = failed = 0
+    started = last_report = time.perf_counter()
+    with ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(args.images,)) as pool:
+        # A bounded window of decode tasks keeps every worker busy without queueing the whole directory.
+        window = deque(pool.submit(_decode_batch, batch) for batch in batches[:args.workers * 2])
+        next_batch = len(window)
+        while window:
+            paths, images, errors = window.popleft().result()
+            if next_batch < len(batches):
+                window.append(pool.submit(_decode_batch, batches[next_batch]))
+                next_batch += 1
+            add_rows(columns, CLASS_NAMES, paths, score(images, errors), errors)
+            failed += sum(error is not None for error in errors)
+            scored += len(paths)
+            pending += len(paths)
+            if pending >= args.flush_every or not window:
+                output.write(columns)
+                columns, pending = empty_columns(CLASS_NAMES), 0
+            now = time.perf_counter()
+            if now - last_report >= 10 or not window:
+                print(f"{scored}/{len(todo)} images, {failed} errors, {scored / (now - started):.1f} images/s",
+                      flush=True)
+                last_report = now
+
+    elapsed = time.perf_counter() - started
+    print(f"scored {scored} images in {elapsed:.1f}s ({scored / elapsed:.1f} images/s, "
+          f"{args.workers} decode workers, batch {args.batch_size}) -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""Server-side Flask sessions: the cookie carries only an opaque id.
+
+Session data is pickled, zlib-compressed when that pays off, and kept in a
+store. MemorySessionStore is a per-process LRU; SQLiteSessionStore is a local
+file shared by every worker on the box. TieredSessionStore puts the LRU in
+front of the file.
+
+The cookie value is "<id>.<version>". The version goes up on every write, so a
+worker whose LRU copy is older than the cookie reads the file instead. A request
+that does not change the session sends no Set-Cookie header and writes nothing.
+
+    app.session_interface = ServerSessionInterface(TieredSessionStore(
+        MemorySessionStore(ttl_seconds=86400), SQLiteSessionStore("cache/sessions.sqlite3", 86400)))
+"""
+import os
+import pickle
+import secrets
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+# Payloads below this size are stored uncompressed; zlib only pays off on the longer Gemini answers.
+_COMPRESS_MIN_BYTES = 256
+_RAW, _ZLIB = b"p", b"z"
+
+
+def dumps(data):
+    payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(payload) >= _COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(payload, 6)
+        if len(compressed) < len(payload):
+            return _ZLIB + compressed
+    return _RAW + payload
+
+
+def loads(blob):
+    # Only ever fed bytes this module wrote to a server-side store, never client input.
+    blob = bytes(blob)
+    payload = zlib.decompress(blob[1:]) if blob[:1] == _ZLIB else blob[1:]
+    return pickle.loads(payload)
+
+
+# ------------------- Stores -------------------
+class MemorySessionStore:
+    """Per-process LRU of serialized sessions with a TTL since the last write."""
+
+    def __init__(self, ttl_seconds=86400, max_entries=10000):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sid, version=None):
+        """(version, blob) for `sid`, or None if missing, expired, or older than `version`."""
+        with self._lock:
+            entry = self._data.get(sid)
+            if entry is None or entry[0] < time.time() or (version is not None and entry[1] < version):
+                if entry is not None and entry[0] < time.time():
+                    del self._data[sid]
+                self.misses += 1
+                return None
+            self._data.move_to_end(sid)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, sid, version, blob):
+        with self._lock:
+            self._data[sid] = (time.time() + self.ttl, version, blob)
+            self._data.move_to_end(sid)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class SQLiteSessionStore:
+    """Sessions in a local sqlite file (WAL), so every worker on the box sees them."""
+
+    # Expired rows are swept on roughly one write in this many.
+    SWEEP_EVERY = 200
+
+    def __init__(self, path, ttl_seconds=86400):
+        self.path = path
+        self.ttl = ttl_seconds
+        self._local = threading.local()
+        self._writes = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " sid TEXT PRIMARY KEY, version INTEGER NOT NULL, data BLOB NOT NULL, expires REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)")
+
+    def _connect(self):
+        # sqlite connections cannot be shared between threads (or across fork).
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, sid, version=None):
+        row = self._connect().execute(
+            "SELECT version, data FROM sessions WHERE sid = ? AND expires >= ?", (sid, time.time())
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put(self, sid, version, blob):
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (sid, version, data, expires) VALUES (?, ?, ?, ?)",
+            (sid, version, sqlite3.Binary(blob), now + self.ttl),
+        )
+        self._writes += 1
+        if self._writes % self.SWEEP_EVERY == 0:
+            conn.execute("DELETE FROM sessions WHERE expires < ?", (now,))
+
+    def delete(self, sid):
+        self._connect().execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def stats(self):
+        (entries,) = self._connect().execute(
+            "SELECT COUNT(*) FROM sessions WHERE expires >= ?", (time.time(),)
+        ).fetchone()
+        return {"entries": entries}
+
+
+class TieredSessionStore:
+    """Read through an in-process LRU to a shared store; writes go to both."""
+
+    def __init__(self, memory, shared):
+        self.memory = memory
+        self.shared = shared
+
+    def get(self, sid, version=None):
+        entry = self.memory.get(sid, version)
+        if entry is None:
+            entry = self.shared.get(sid, version)
+            if entry is not None:
+                self.memory.put(sid, entry[0], entry[1])
+        return entry
+
+    def put(self, sid, version, blob):
+        self.shared.put(sid, version, blob)
+        self.memory.put(sid, version, blob)
+
+    def delete(self, sid):
+        self.shared.delete(sid)
+        self.memory.delete(sid)
+
+    def stats(self):
+        return {"memory": self.memory.stats(), "shared": self.shared.stats()}
+
+
+# ------------------- Flask Integration -------------------
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, version=0):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.version = version
+        self.modified = False
+
+
+class ServerSessionInterface(SessionInterface):
+    """Flask session interface backed by one of the stores above."""
+
+    def __init__(self, store):
+        self.store = store
+
+    @staticmethod
+    def _parse_cookie(value):
+        sid, _, version = (value or "").partition(".")
+        if not sid or not version.isdigit():
+            return None, 0
+        return sid, int(version)
+
+    def open_session(self, app, request):
+        sid, version = self._parse_cookie(request.cookies.get(self.get_cookie_name(app)))
+        if sid is None:
+            return ServerSideSession()
+        entry = self.store.get(sid, version)
+        if entry is None:
+            return ServerSideSession()
+        try:
+            return ServerSideSession(loads(entry[1]), sid=sid, version=entry[0])
+        except Exception:
+            return ServerSideSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain, path = self.get_cookie_domain(app), self.get_cookie_path(app)
+        if not session:
+            if session.modified and session.sid:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not session.modified:
+            return
+
+        session.sid = session.sid or secrets.token_urlsafe(24)
+        session.version += 1
+        self.store.put(session.sid, session.version, dumps(dict(session)))
+        response.set_cookie(
+            name,
+            f"{session.sid}.{session.version}",
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+        response.vary.add("Cookie")
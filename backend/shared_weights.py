@@ -0,0 +1,132 @@
+"""Share SkinDiseaseCNN weights between gunicorn workers instead of copying them per process.
+
+Two modes are supported (MODEL_WEIGHTS_MODE):
+
+* ``preload``: load once in the gunicorn master (``preload_app``, see gunicorn.conf.py)
+  and let forked workers share the pages copy-on-write. Parameters are frozen and
+  the GC is frozen before fork so nothing writes to those pages afterwards.
+* ``mmap``: export the state_dict once to a flat, page-aligned weight file and map it
+  read-only in every process, so all workers share the kernel page cache.
+"""
+import json
+import os
+import struct
+import warnings
+
+import numpy as np
+import torch
+
+WEIGHTS_MODES = ("private", "preload", "mmap")
+
+_MAGIC = b"ADMW0001"
+_ALIGNMENT = 4096
+
+# bf16 has no numpy dtype, so it is stored as raw 16-bit words and re-viewed on load.
+_STORAGE_DTYPES = {
+    torch.float32: ("float32", np.float32),
+    torch.float16: ("float16", np.float16),
+    torch.bfloat16: ("bfloat16", np.int16),
+    torch.int64: ("int64", np.int64),
+}
+_TORCH_DTYPES = {name: dtype for dtype, (name, _) in _STORAGE_DTYPES.items()}
+_NUMPY_DTYPES = {name: np_dtype for _, (name, np_dtype) in _STORAGE_DTYPES.items()}
+
+
+def flat_weights_path(model_path):
+    """model/skin_disease_model.int8.pth -> model/skin_disease_model.int8.weights"""
+    return os.path.splitext(model_path)[0] + ".weights"
+
+
+# ------------------- Flat Weight File -------------------
+def export_flat_weights(state_dict, path):
+    """Write tensors back to back (page aligned) behind a small JSON header."""
+    entries, offset = [], 0
+    for name, tensor in state_dict.items():
+        if tensor.dtype not in _STORAGE_DTYPES:
+            raise ValueError(f"Cannot memory-map {name} with dtype {tensor.dtype}; use the fp32 or bf16 backend.")
+        nbytes = tensor.numel() * tensor.element_size()
+        entries.append({"name": name, "dtype": _STORAGE_DTYPES[tensor.dtype][0],
+                        "shape": list(tensor.shape), "offset": offset, "nbytes": nbytes})
+        offset += -(-nbytes // _ALIGNMENT) * _ALIGNMENT
+
+    header = json.dumps(entries).encode("utf-8")
+    data_start = -(-(len(_MAGIC) + 8 + len(header)) // _ALIGNMENT) * _ALIGNMENT
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(_MAGIC + struct.pack("<Q", len(header)) + header)
+        for entry, tensor in zip(entries, state_dict.values()):
+            f.seek(data_start + entry["offset"])
+            raw = tensor.detach().cpu().contiguous()
+            if raw.dtype == torch.bfloat16:
+                raw = raw.view(torch.int16)
+            f.write(raw.numpy().tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+def load_flat_weights(path):
+    """Map a flat weight file read-only and return a state_dict of tensors backed by it."""
+    with open(path, "rb") as f:
+        if f.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError(f"{path} is not a flat weight file")
+        (header_len,) = struct.unpack("<Q", f.read(8))
+        entries = json.loads(f.read(header_len))
+    data_start = -(-(len(_MAGIC) + 8 + header_len) // _ALIGNMENT) * _ALIGNMENT
+    mapped = np.memmap(path, dtype=np.uint8, mode="r")
+
+    state_dict = {}
+    with warnings.catch_warnings():
+        # torch warns that the arrays are not writable; read-only is the point.
+        warnings.simplefilter("ignore", UserWarning)
+        for entry in entries:
+            start = data_start + entry["offset"]
+            array = mapped[start:start + entry["nbytes"]].view(_NUMPY_DTYPES[entry["dtype"]]).reshape(entry["shape"])
+            tensor = torch.from_numpy(array)
+            if entry["dtype"] == "bfloat16":
+                tensor = tensor.view(torch.bfloat16)
+            state_dict[entry["name"]] = tensor
+    return state_dict
+
+
+def attach_shared_weights(model, state_dict):
+    """Point the model's parameters and buffers at the mapped tensors without copying."""
+    tensors = dict(model.named_parameters())
+    tensors.update(model.named_buffers())
+    missing = set(tensors) - set(state_dict)
+    if missing:
+        raise ValueError(f"Flat weight file is missing {sorted(missing)}")
+    for name, tensor in tensors.items():
+        tensor.data = state_dict[name]
+    return freeze_weights(model)
+
+
+def freeze_weights(model):
+    for param in model.parameters():
+        param.requires_grad_(False)
+    return model
+
+
+def prepare_for_fork():
+    """Call in the master right before forking workers (gunicorn pre_fork)."""
+    import gc
+    gc.collect()
+    # Keep the collector from touching (and so copying) objects inherited from the master.
+    gc.freeze()
+
+
+# ------------------- Memory Report -------------------
+def memory_report():
+    """Resident / shared / private memory of this process in MB (Linux only)."""
+    report = {"pid": os.getpid()}
+    for source in ("/proc/self/smaps_rollup", "/proc/self/status"):
+        try:
+            with open(source) as f:
+                lines = f.readlines()
+        except OSError:
+            continue
+        for line in lines:
+            key, _, value = line.partition(":")
+            if key in ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty", "VmRSS", "RssFile", "RssShmem"):
+                report[key.lower() + "_mb"] = round(int(value.split()[0]) / 1024.0, 1)
+        break
+    return report
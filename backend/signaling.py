@@ -0,0 +1,390 @@
+"""Socket.IO room events across workers and nodes, through a pluggable message queue.
+
+python-socketio keeps room membership in each process's memory, so with more
+than one worker a `signal` sent to a room only reaches the peers connected to
+the same worker. A pub/sub client manager fixes that: every emit is published
+to a channel, and every worker delivers it to its own members of the room.
+
+SIGNALING_QUEUE selects the manager (create_client_manager):
+
+    (unset)                  rooms stay in this process (single worker)
+    local://127.0.0.1:6380   LocalBrokerManager + `python signaling.py broker --port 6380`
+    redis://host:6379/0      python-socketio's RedisManager
+    amqp://host//            python-socketio's KombuManager
+
+The local broker is a small TCP fan-out server for one machine (several
+gunicorn workers, or a stand-in for Redis in development and benchmarks).
+Messages are pickled with protocol 5 like python-socketio's own managers, so
+binary signal payloads (bytes) cross the queue as-is, without base64 or JSON
+escaping. Every worker unpickles what the broker relays, so both sides must
+hold the shared secret SIGNALING_AUTHKEY: a connection has to pass
+multiprocessing.connection's HMAC challenge before a frame is read from it or
+sent to it.
+
+Every manager counts fan-out: messages published, local recipients per
+delivered message, and per-room totals for the signaling events (stats()).
+Socket.IO clients still need sticky sessions in front of several workers
+(or the websocket transport only).
+"""
+import argparse
+import os
+import pickle
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing import connection
+from urllib.parse import urlparse
+
+import socketio
+
+_SUBSCRIBE, _PUBLISH = b"S", b"P"
+
+
+# ------------------- Fan-Out Stats -------------------
+class FanoutStats:
+    """Totals for every emit, plus per-room counts for `events` (bounded to `max_rooms` rooms)."""
+
+    def __init__(self, events=("signal", "room_joined"), max_rooms=1000, on_deliver=None):
+        self.events = set(events)
+        self.max_rooms = max_rooms
+        # Optional on_deliver(recipients) hook, e.g. for a fan-out histogram.
+        self.on_deliver = on_deliver
+        self._lock = threading.Lock()
+        self._rooms = OrderedDict()  # room -> [published, deliveries, recipients]
+        self.published = 0
+        self.deliveries = 0
+        self.recipients = 0
+
+    def _room(self, event, room):
+        if event not in self.events or room is None:
+            return None
+        counts = self._rooms.get(room)
+        if counts is None:
+            counts = self._rooms[room] = [0, 0, 0]
+            while len(self._rooms) > self.max_rooms:
+                self._rooms.popitem(last=False)
+        self._rooms.move_to_end(room)
+        return counts
+
+    def publish(self, event, room):
+        with self._lock:
+            self.published += 1
+            counts = self._room(event, room)
+            if counts is not None:
+                counts[0] += 1
+
+    def deliver(self, event, room, recipients):
+        with self._lock:
+            self.deliveries += 1
+            self.recipients += recipients
+            counts = self._room(event, room)
+            if counts is not None:
+                counts[1] += 1
+                counts[2] += recipients
+        if self.on_deliver is not None:
+            try:
+                self.on_deliver(recipients)
+            except Exception:
+                pass
+
+    def stats(self, top=20):
+        with self._lock:
+            rooms = sorted(self._rooms.items(), key=lambda item: item[1][0], reverse=True)[:top]
+            return {
+                "published": self.published,
+                "deliveries": self.deliveries,
+                "recipients": self.recipients,
+                "mean_fanout": round(self.recipients / self.deliveries, 2) if self.deliveries else 0.0,
+                "rooms_tracked": len(self._rooms),
+                "top_rooms": [{"room": str(room), "published": p, "deliveries": d, "recipients": r}
+                              for room, (p, d, r) in rooms],
+            }
+
+
+def _local_recipients(manager, namespace, room, skip_sid):
+    skip = set(skip_sid) if isinstance(skip_sid, (list, tuple, set)) else {skip_sid}
+    try:
+        return sum(1 for sid, _ in manager.get_participants(namespace or "/", room) if sid not in skip)
+    except Exception:
+        return 0
+
+
+class CountingManager(socketio.Manager):
+    """The default in-process manager, with fan-out counts."""
+
+    fanout = None
+
+    def emit(self, event, data, namespace=None, room=None, skip_sid=None, callback=None, **kwargs):
+        room = kwargs.get("to", room)
+        if self.fanout is not None:
+            self.fanout.publish(event, room)
+            self.fanout.deliver(event, room, _local_recipients(self, namespace, room, skip_sid))
+        return super().emit(event, data, namespace=namespace, room=room, skip_sid=skip_sid, callback=callback,
+                            **{k: v for k, v in kwargs.items() if k != "to"})
+
+
+class _FanoutPubSubMixin:
+    """Counts publishes on emit and local recipients when a published message comes back."""
+
+    fanout = None
+
+    def emit(self, event, data, namespace=None, room=None, skip_sid=None, callback=None, **kwargs):
+        if self.fanout is not None:
+            self.fanout.publish(event, kwargs.get("to", room))
+        return super().emit(event, data, namespace=namespace, room=room, skip_sid=skip_sid, callback=callback,
+                            **kwargs)
+
+    def _handle_emit(self, message):
+        if self.fanout is not None:
+            room = message.get("room")
+            self.fanout.deliver(message.get("event"), room,
+                                _local_recipients(self, message.get("namespace"), room, message.get("skip_sid")))
+        return super()._handle_emit(message)
+
+
+# ------------------- Local Broker -------------------
+def signaling_authkey():
+    key = os.getenv("SIGNALING_AUTHKEY")
+    if not key:
+        raise RuntimeError("set SIGNALING_AUTHKEY (the same secret for the broker and every worker)")
+    return key.encode()
+
+
+def _no_delay(conn):
+    with socket.socket(fileno=os.dup(conn.fileno())) as sock:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+def _shutdown(sock):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class _Subscriber:
+    def __init__(self, conn):
+        self.conn = conn
+        self.send_lock = threading.Lock()
+        self.channels = set()
+
+    def send(self, payload):
+        with self.send_lock:
+            self.conn.send_bytes(payload)
+
+
+class LocalBroker:
+    """Relays every published frame to every subscriber of its channel (the publisher included)."""
+
+    def __init__(self, address=("127.0.0.1", 6380), authkey=None):
+        if not authkey:
+            raise ValueError("the signaling broker needs an authkey")
+        self.authkey = authkey
+        # Challenged on the connection's own thread, so a silent peer cannot hold up accept().
+        self._listener = connection.Listener(address, family="AF_INET")
+        self.address = self._listener.address
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self.messages_in = 0
+        self.messages_out = 0
+        self.bytes_in = 0
+        self.rejected = 0
+
+    def serve_forever(self):
+        while True:
+            try:
+                conn = self._listener.accept()
+            except ConnectionError:
+                continue
+            _no_delay(conn)
+            threading.Thread(target=self._handle, args=(conn,), name="broker-connection", daemon=True).start()
+
+    def close(self):
+        self._listener.close()
+
+    def _authenticate(self, conn, timeout=5.0):
+        # The server half of Listener(authkey=...)'s mutual challenge; a peer that stays
+        # silent is cut off after `timeout` seconds (shutdown unblocks the pending read).
+        with socket.socket(fileno=os.dup(conn.fileno())) as sock:
+            watchdog = threading.Timer(timeout, _shutdown, (sock,))
+            watchdog.start()
+            try:
+                connection.deliver_challenge(conn, self.authkey)
+                connection.answer_challenge(conn, self.authkey)
+                return True
+            except (connection.AuthenticationError, EOFError, OSError):
+                with self._lock:
+                    self.rejected += 1
+                conn.close()
+                return False
+            finally:
+                watchdog.cancel()
+
+    def _handle(self, conn):
+        if not self._authenticate(conn):
+            return
+        subscriber = _Subscriber(conn)
+        try:
+            while True:
+                frame = subscriber.conn.recv_bytes()
+                kind, body = frame[:1], frame[1:]
+                if kind == _SUBSCRIBE:
+                    channel = body.decode()
+                    subscriber.channels.add(channel)
+                    self.subscribe(channel, subscriber)
+                elif kind == _PUBLISH:
+                    (length,) = struct.unpack(">H", body[:2])
+                    self.publish(body[2:2 + length].decode(), body[2 + length:])
+        except (EOFError, OSError, struct.error):
+            pass
+        finally:
+            for channel in subscriber.channels:
+                self.unsubscribe(channel, subscriber)
+            subscriber.conn.close()
+
+    def subscribe(self, channel, subscriber):
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscriber)
+
+    def unsubscribe(self, channel, subscriber):
+        with self._lock:
+            self._subscribers.get(channel, set()).discard(subscriber)
+
+    def publish(self, channel, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+            self.messages_in += 1
+            self.bytes_in += len(payload)
+        for subscriber in subscribers:
+            try:
+                subscriber.send(payload)
+            except OSError:
+                self.unsubscribe(channel, subscriber)
+                continue
+            with self._lock:
+                self.messages_out += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": sum(len(s) for s in self._subscribers.values()),
+                "messages_in": self.messages_in,
+                "messages_out": self.messages_out,
+                "bytes_in": self.bytes_in,
+                "rejected": self.rejected,
+            }
+
+
+def broker_address(url):
+    parsed = urlparse(url)
+    return parsed.hostname or "127.0.0.1", parsed.port or 6380
+
+
+class LocalBrokerManager(_FanoutPubSubMixin, socketio.PubSubManager):
+    """python-socketio pub/sub manager backed by a LocalBroker."""
+
+    name = "localbroker"
+
+    def __init__(self, url="local://127.0.0.1:6380", channel="socketio", write_only=False, logger=None,
+                 authkey=None):
+        self.address = broker_address(url)
+        self.authkey = authkey or signaling_authkey()
+        self._publish_lock = threading.Lock()
+        self._publisher = None
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=5)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(None)
+        conn = connection.Connection(sock.detach())
+        try:
+            # The client half of Listener(authkey=...)'s mutual challenge, as connection.Client does it.
+            connection.answer_challenge(conn, self.authkey)
+            connection.deliver_challenge(conn, self.authkey)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def _publish(self, data):
+        channel = self.channel.encode()
+        frame = _PUBLISH + struct.pack(">H", len(channel)) + channel + pickle.dumps(data, protocol=5)
+        with self._publish_lock:
+            # One reconnect per message: a broker restart costs one retry, not a lost event.
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = self._connect()
+                    self._publisher.send_bytes(frame)
+                    return
+                except (OSError, EOFError, connection.AuthenticationError):
+                    if self._publisher is not None:
+                        self._publisher.close()
+                    self._publisher = None
+                    if attempt:
+                        raise
+
+    def _listen(self):
+        backoff = 0.1
+        while True:
+            try:
+                conn = self._connect()
+                conn.send_bytes(_SUBSCRIBE + self.channel.encode())
+                backoff = 0.1
+                while True:
+                    yield conn.recv_bytes()
+            except (EOFError, OSError, connection.AuthenticationError) as exc:
+                self._get_logger().warning("signaling broker %s:%s unavailable (%s), retrying",
+                                           *self.address, exc)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 5.0)
+
+
+def create_client_manager(url, fanout=None):
+    """A python-socketio client manager for SIGNALING_QUEUE `url`, counting into `fanout`."""
+    if not url:
+        manager = CountingManager()
+    elif url.startswith("local://"):
+        manager = LocalBrokerManager(url)
+    elif url.startswith(("redis://", "rediss://")):
+        manager = type("CountingRedisManager", (_FanoutPubSubMixin, socketio.RedisManager), {})(url)
+    else:
+        manager = type("CountingKombuManager", (_FanoutPubSubMixin, socketio.KombuManager), {})(url)
+    manager.fanout = fanout
+    return manager
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    broker = commands.add_parser("broker", help="run the local signaling broker")
+    broker.add_argument("--host", default="127.0.0.1")
+    broker.add_argument("--port", type=int, default=6380)
+    broker.add_argument("--stats-every", type=float, default=30.0, help="seconds between stats lines (0: never)")
+    args = parser.parse_args(argv)
+
+    try:
+        authkey = signaling_authkey()
+    except RuntimeError as exc:
+        raise SystemExit(str(exc)) from None
+    server = LocalBroker((args.host, args.port), authkey)
+    print(f"signaling broker on {args.host}:{args.port}", flush=True)
+    if args.stats_every > 0:
+        def report():
+            while True:
+                time.sleep(args.stats_every)
+                print(server.stats(), flush=True)
+        threading.Thread(target=report, name="broker-stats", daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import os
+
+import torch
+import torch.nn as nn
+
+from shared_weights import WEIGHTS_MODES, attach_shared_weights, export_flat_weights, flat_weights_path, freeze_weights, load_flat_weights
+
+
+# fp32 is the trained model as-is. bf16 halves weight memory; int8 dynamically
+# quantizes the Linear layers, which hold almost all of the ~51M parameters.
+INFERENCE_BACKENDS = ("fp32", "bf16", "int8")
+
+
+# ------------------- Class Labels -------------------
+CLASS_NAMES = [
+    "Unknown", "Eczema", "Warts", "Melanoma", "Atopic Dermatitis", 
+    "BCC", "Melanocytic Nevi", "BKL", "Psoriasis", "Seborrheic Keratoses", "Tinea"
+]
+
+
+# ------------------- CNN Model Definition -------------------
+class SkinDiseaseCNN(nn.Module):
+    def __init__(self, num_classes=11):
+        super(SkinDiseaseCNN, self).__init__()
+        self.conv_layers = nn.Sequential(
+            nn.Conv2d(3, 32, kernel_size=3, stride=1, padding=1),
+            nn.ReLU(),
+            nn.MaxPool2d(kernel_size=2, stride=2),
+            nn.Conv2d(32, 64, kernel_size=3, stride=1, padding=1),
+            nn.ReLU(),
+            nn.MaxPool2d(kernel_size=2, stride=2),
+            nn.Conv2d(64, 128, kernel_size=3, stride=1, padding=1),
+            nn.ReLU(),
+            nn.MaxPool2d(kernel_size=2, stride=2)
+        )
+        self.fc_layers = nn.Sequential(
+            nn.Flatten(),
+            nn.Linear(128 * 28 * 28, 512),
+            nn.ReLU(),
+            nn.Dropout(0.5),
+            nn.Linear(512, num_classes)
+        )
+
+    def forward(self, x):
+        x = self.conv_layers(x)
+        x = self.fc_layers(x)
+        return x
+
+
+class LowPrecisionModel(nn.Module):
+    """Run a reduced-precision model behind the fp32 interface the app expects."""
+
+    def __init__(self, model, dtype):
+        super(LowPrecisionModel, self).__init__()
+        self.model = model.to(dtype)
+        self.dtype = dtype
+
+    def forward(self, x):
+        return self.model(x.to(self.dtype)).float()
+
+
+# ------------------- Inference Backends -------------------
+def _check_backend(backend, device):
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Choose one of {', '.join(INFERENCE_BACKENDS)}.")
+    if backend == "int8" and torch.device(device).type != "cpu":
+        raise ValueError("The int8 backend uses dynamic quantization and only runs on CPU.")
+
+
+def convert_model(model, backend):
+    """Convert a loaded fp32 SkinDiseaseCNN to the requested backend."""
+    _check_backend(backend, "cpu")
+    model.eval()
+    if backend == "int8":
+        return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    if backend == "bf16":
+        return LowPrecisionModel(model, torch.bfloat16)
+    return model
+
+
+def converted_model_path(model_path, backend):
+    """model/skin_disease_model.pth -> model/skin_disease_model.int8.pth"""
+    root, ext = os.path.splitext(model_path)
+    return model_path if backend == "fp32" else f"{root}.{backend}{ext}"
+
+
+def save_converted_model(model, backend, output_path):
+    torch.save({"backend": backend, "state_dict": model.state_dict()}, output_path)
+
+
+def _load_mapped_model(model_path, device, backend, num_classes):
+    if backend == "int8" or torch.device(device).type != "cpu":
+        raise ValueError("Memory-mapped weights need the fp32 or bf16 backend on CPU; use 'preload' for int8.")
+    flat_path = flat_weights_path(converted_model_path(model_path, backend))
+    if not os.path.exists(flat_path) or os.path.getmtime(flat_path) < os.path.getmtime(model_path):
+        export_flat_weights(load_model(model_path, device, backend, num_classes).state_dict(), flat_path)
+    model = convert_model(SkinDiseaseCNN(num_classes=num_classes), backend)
+    attach_shared_weights(model, load_flat_weights(flat_path))
+    model.eval()
+    return model
+
+
+def load_model(model_path, device, backend="fp32", num_classes=11, weights_mode="private"):
+    """Load SkinDiseaseCNN for inference on the selected backend.
+
+    A pre-converted artifact next to `model_path` (see quantize_model.py) is used
+    when present; otherwise the fp32 weights are converted on load. With
+    weights_mode="mmap" the weights are mapped read-only from a flat file shared
+    by every process (see shared_weights.py).
+    """
+    _check_backend(backend, device)
+    if weights_mode not in WEIGHTS_MODES:
+        raise ValueError(f"Unknown weights mode '{weights_mode}'. Choose one of {', '.join(WEIGHTS_MODES)}.")
+    if weights_mode == "mmap":
+        return _load_mapped_model(model_path, device, backend, num_classes)
+    converted_path = converted_model_path(model_path, backend)
+    # A converted file older than the fp32 weights was made from a previous model.
+    if backend != "fp32" and os.path.exists(converted_path) and os.path.getmtime(converted_path) >= os.path.getmtime(model_path):
+        checkpoint = torch.load(converted_path, map_location=device)
+        if checkpoint.get("backend") != backend:
+            raise ValueError(f"{converted_path} holds a '{checkpoint.get('backend')}' model, expected '{backend}'.")
+        model = convert_model(SkinDiseaseCNN(num_classes=num_classes), backend)
+        model.load_state_dict(checkpoint["state_dict"])
+    else:
+        model = SkinDiseaseCNN(num_classes=num_classes)
+        model.load_state_dict(torch.load(model_path, map_location=device))
+        model = convert_model(model, backend)
+    model.to(device)
+    model.eval()
+    return freeze_weights(model)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The backend modules are imported top-level (`import places_client`), as app.py does.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
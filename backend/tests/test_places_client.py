@@ -0,0 +1,83 @@
+"""PlacesClient against the local Maps stand-in (benchmarks/fakes.py).
+
+    cd backend && python -m pytest tests
+"""
+import time
+
+import pytest
+
+from benchmarks.fakes import MapsStandIn
+from places_client import PlacesClient, geohash
+
+CATEGORIES = {"NGO": "NGO hospital", "Government": "skin government hospital", "Private": "skin private hospital"}
+NEARBY = "/maps/api/place/nearbysearch/json"
+DETAILS = "/maps/api/place/details/json"
+GEOCODE = "/maps/api/geocode/json"
+
+
+@pytest.fixture
+def maps():
+    with MapsStandIn(places_per_search=3) as stand_in:
+        yield stand_in
+
+
+def client(maps, **kwargs):
+    return PlacesClient("test-key", base_url=maps.base_url, **kwargs)
+
+
+def test_find_clinics_fans_out_concurrently():
+    latency = 0.2
+    with MapsStandIn(latency=latency, places_per_search=3) as maps:
+        places = client(maps, max_workers=16)
+        started = time.perf_counter()
+        clinics = places.find_clinics(18.52, 73.85, 20000, CATEGORIES)
+        elapsed = time.perf_counter() - started
+
+    assert len(clinics) == 9
+    assert {c["category"] for c in clinics} == set(CATEGORIES)
+    assert all(c["address"] == f"{c['place_id']} street" for c in clinics)
+    assert maps.requests == {NEARBY: 3, DETAILS: 9}
+    # 3 searches, then 9 details lookups: one round of each, not 12 sequential requests.
+    assert elapsed < 4 * latency
+
+
+def test_nearby_is_cached_per_geohash_cell(maps):
+    places = client(maps)
+    places.nearby(18.5204, 73.8567, 5000, "skin")
+    # A few metres away: same precision-6 cell, same radius and keyword.
+    assert geohash(18.5204, 73.8567) == geohash(18.5205, 73.8568)
+    places.nearby(18.5205, 73.8568, 5000, "skin")
+    assert maps.requests[NEARBY] == 1
+    assert places.stats()["nearby"]["hits"] == 1
+
+    places.nearby(18.5205, 73.8568, 10000, "skin")  # other radius
+    places.nearby(19.0760, 72.8777, 5000, "skin")  # other cell
+    assert maps.requests[NEARBY] == 3
+
+
+def test_cached_entries_expire_after_ttl(maps):
+    places = client(maps, cache_ttl=0.2)
+    places.find_clinics(18.52, 73.85, 20000, {"NGO": "NGO hospital"})
+    places.find_clinics(18.52, 73.85, 20000, {"NGO": "NGO hospital"})
+    assert maps.requests == {NEARBY: 1, DETAILS: 3}
+
+    time.sleep(0.3)
+    places.find_clinics(18.52, 73.85, 20000, {"NGO": "NGO hospital"})
+    assert maps.requests == {NEARBY: 2, DETAILS: 6}
+
+
+def test_geocode_caches_normalized_addresses(maps):
+    places = client(maps)
+    assert places.geocode("Pune,  India") == (18.52, 73.85)
+    assert places.geocode("pune, india") == (18.52, 73.85)
+    assert maps.requests[GEOCODE] == 1
+
+
+def test_geocode_failure_returns_none_and_is_not_cached(maps):
+    places = client(maps)
+    maps.geocode_status = "ZERO_RESULTS"
+    assert places.geocode("Atlantis") is None
+
+    maps.geocode_status = "OK"
+    assert places.geocode("Atlantis") == (18.52, 73.85)
+    assert maps.requests[GEOCODE] == 2